@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks (benchmark.py) - card_game primitives with regression gates
+
+Usage:
+    python benchmark.py                              # run and print a table
+    python benchmark.py --save bench_baseline.json   # store a JSON baseline
+    python benchmark.py --compare bench_baseline.json --threshold 0.25
+    python benchmark.py --against ../baseline-checkout --rounds 3
+
+In compare mode the script exits with status 1 if any primitive's best
+(minimum) per-call time got slower than the baseline by more than the
+threshold (0.25 = 25%) and by more than the noise floor (an absolute
+number of microseconds). The minimum is used because it is far less
+sensitive to scheduler noise than the median on shared machines.
+
+A saved baseline was measured under whatever load the machine had then,
+and that alone can move every primitive by tens of percent. --against
+avoids this: it takes a checkout of the baseline code (e.g. made with
+`git worktree add`) and runs its benchmark.py and this one in turns,
+in subprocesses, for --rounds rounds. Each side keeps its best minimum
+per benchmark, so both are measured under the same conditions. A
+benchmark that still looks regressed afterwards is run head to head
+again, up to --rechecks times. This is the mode to gate on.
+
+With --compare, noise only ever adds time, but a burst of it can still
+cover all of a benchmark's samples. So a benchmark that looks regressed
+is measured again, up to --rechecks more times, and keeps its best
+minimum; only one that stays over the threshold through every recheck
+fails the gate.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from card_game import GameState, Deck, Card, cultist_count_for
+
+# --- Configuration Constants ---
+PLAYER_COUNTS = [5, 15, 100]
+DEFAULT_REPEAT = 7          # Number of timing samples per benchmark
+DEFAULT_MIN_SAMPLE_TIME = 0.05  # Seconds each sample should run for (at least)
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_NOISE_FLOOR_US = 0.25   # Slowdowns smaller than this (absolute) never fail the gate
+DEFAULT_RECHECKS = 3        # Extra measurements of a benchmark that looks regressed
+DEFAULT_ROUNDS = 3          # Turns each tree gets with --against
+INITIAL_HAND_SIZE = 3       # Mirrors server.py
+
+
+def build_game(num_players, phase="Evening", seed=1234):
+    """Builds a started game with roles, hands and a few status effects, the way the server would."""
+    random.seed(seed)
+    gs = GameState()
+    gs.current_phase = "Lobby"
+    for i in range(num_players):
+        gs.add_player(f"player_P{i}", f"P{i}")
+
+    pids = list(gs.players.keys())
+    ccount = cultist_count_for(num_players)
+    for i, pid in enumerate(pids):
+        gs.set_player_role(pid, "Cultist" if i < ccount else "Villager")
+
+    for pid in gs.alive_players:
+        player = gs.players[pid]
+        for c in gs.deck.deal(INITIAL_HAND_SIZE):
+            player.add_card(c)
+        player.add_card(Card("Hand of Glory"))
+
+    # A realistic sprinkle of effects and pending actions
+    for i, pid in enumerate(pids[ccount:]):
+        player = gs.players[pid]
+        if i % 3 == 0:
+            player.apply_status_effect("silence", 1)
+        if i % 5 == 0:
+            player.apply_status_effect("delirium", 2)
+        if i % 7 == 0:
+            player.apply_status_effect("violent_delights_quest", {'expires_at_round': 2, 'completed': False})
+        if i % 4 == 0:
+            gs.pending_night_actions.append({
+                "target_id": pid, "effect_type": "silence", "source_id": pids[0],
+                "is_counterable": True, "is_countered": False,
+                "effect_data": {"duration": 1, "source_name": "P0", "target_name": player.name},
+            })
+
+    gs.current_phase = phase
+    gs.round_number = 1
+    return gs
+
+
+class _Quiet:
+    """Silences the print() calls inside card_game while timing."""
+    def write(self, _): pass
+    def flush(self): pass
+
+
+def measure(fn, setup=None, repeat=DEFAULT_REPEAT, min_sample_time=DEFAULT_MIN_SAMPLE_TIME):
+    """
+    Times fn(arg) where arg = setup() is rebuilt outside the timed region.
+    Returns per-call statistics in seconds.
+    """
+    make_arg = setup or (lambda: None)
+
+    # Calibrate how many calls fit into one sample
+    number = 1
+    while True:
+        elapsed = _run_sample(fn, make_arg, number)
+        if elapsed >= min_sample_time or number >= 100000:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_sample_time / elapsed) + 1))
+
+    samples = [_run_sample(fn, make_arg, number) / number for _ in range(repeat)]
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def _run_sample(fn, make_arg, number):
+    total = 0.0
+    perf = time.perf_counter
+    for _ in range(number):
+        arg = make_arg()
+        t0 = perf()
+        fn(arg)
+        total += perf() - t0
+    return total
+
+
+# --- Benchmark Definitions ---
+# Each entry: name -> function(num_players) returning (fn, setup)
+
+PHASE_CYCLE = ["Evening", "ApocalypseVote", "Night", "Morning", "Voting", "Dusk"]
+
+
+def _advance_phase_case(phase):
+    def factory(n):
+        # Rebuilding a whole game per call would dwarf the call itself, so a
+        # single game is rewound to the same starting point before every call.
+        gs = build_game(n, phase)
+        template_deck = list(gs.deck.cards)
+        template_actions = list(gs.pending_night_actions)
+        template_effects = {pid: dict(p.status_effects) for pid, p in gs.players.items()}
+
+        def setup():
+            gs.current_phase = phase
+            gs.round_number = 1
+            gs.apocalypse_vote_target = gs.alive_players[-1] if phase == "ApocalypseVote" else None
+            gs.deck.cards = list(template_deck)
+            gs.public_announcements = []
+            gs.pending_night_actions.clear()
+            for action in template_actions:
+                gs.pending_night_actions.append(action)
+            gs.status_expiry.clear()
+            for pid, p in gs.players.items():
+                del p.hand[INITIAL_HAND_SIZE + 1:]
+                p.status_effects.clear()
+                p.status_expiry_keys.clear()
+                for effect, data in template_effects[pid].items():
+                    p.apply_status_effect(effect, data)
+            return gs
+        return (lambda g: g.advance_phase()), setup
+    return factory
+
+
+def _deck_construction(n):
+    return (lambda _: Deck(is_dead_deck=False)), None
+
+
+def _deck_deal(n):
+    deck = Deck(is_dead_deck=False)
+    template = list(deck.cards)
+
+    def setup():
+        deck.cards = list(template)
+        return deck
+    return (lambda d: d.deal(n * INITIAL_HAND_SIZE)), setup
+
+
+def _player_to_dict(n):
+    gs = build_game(n)
+    players = list(gs.players.values())
+    return (lambda _: [p.to_dict(include_hand=True) for p in players]), None
+
+
+def _is_game_over(n):
+    gs = build_game(n)
+    return (lambda _: gs.is_game_over()), None
+
+
+def _public_state(n):
+    gs = build_game(n)
+    gs.cultist_kill_votes = {gs.alive_players[0]: gs.alive_players[-1]}
+    return (lambda _: gs.get_public_game_state()), None
+
+
+def _private_state_all(n):
+    gs = build_game(n)
+    pids = list(gs.players.keys())
+    return (lambda _: [gs.get_player_private_state(pid) for pid in pids]), None
+
+
+BENCHMARKS = {
+    "deck_construction": _deck_construction,
+    "deck_deal": _deck_deal,
+    "player_to_dict_all": _player_to_dict,
+    "is_game_over": _is_game_over,
+    "get_public_game_state": _public_state,
+    "get_player_private_state_all": _private_state_all,
+}
+for _phase in PHASE_CYCLE:
+    BENCHMARKS[f"advance_phase[{_phase}]"] = _advance_phase_case(_phase)
+
+
+def run_benchmark(name, n, repeat):
+    """Measures one benchmark at one player count, with card_game's output silenced."""
+    real_stdout = sys.stdout
+    sys.stdout = _Quiet()
+    try:
+        fn, setup = BENCHMARKS[name](n)
+        return measure(fn, setup, repeat=repeat)
+    finally:
+        sys.stdout = real_stdout
+
+
+def run_benchmarks(sizes, repeat, name_filter=None):
+    results = {}
+    for name in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        for n in sizes:
+            key = f"{name}[n={n}]"
+            results[key] = dict(run_benchmark(name, n, repeat), name=name, n=n)
+            print(f"  {key:<48} {results[key]['min'] * 1e6:>12.2f} us (median {results[key]['median'] * 1e6:.2f})")
+    return results
+
+
+def is_regression(base_min, cur_min, threshold, noise_floor):
+    return cur_min > base_min * (1 + threshold) and (cur_min - base_min) * 1e6 > noise_floor
+
+
+def recheck(current, baseline, threshold, noise_floor, rechecks, repeat):
+    """Measures each benchmark that looks regressed again, keeping its best minimum."""
+    for key, result in current.items():
+        base = baseline.get(key)
+        for attempt in range(rechecks):
+            if base is None or not is_regression(base["min"], result["min"], threshold, noise_floor):
+                break
+            again = run_benchmark(result["name"], result["n"], repeat)
+            print(f"  {key:<48} {again['min'] * 1e6:>12.2f} us (recheck {attempt + 1})")
+            result["min"] = min(result["min"], again["min"])
+
+
+def run_tree(tree, sizes, repeat, name_filter=None):
+    """Runs the benchmark.py in `tree` in a subprocess, so it times that tree's card_game."""
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "results.json")
+        cmd = [sys.executable, os.path.join(tree, "benchmark.py"), "--save", out,
+               "--repeat", str(repeat), "--sizes", *map(str, sizes)]
+        if name_filter:
+            cmd += ["--filter", name_filter]
+        subprocess.run(cmd, cwd=tree, check=True, stdout=subprocess.DEVNULL)
+        with open(out, encoding="utf-8") as f:
+            return json.load(f)["results"]
+
+
+def run_turns(against, baseline, current, sizes, repeat, name_filter, baseline_first):
+    """Runs both trees once, in the given order, keeping each side's best results."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    turns = [(against, baseline), (here, current)]
+    if not baseline_first:
+        turns.reverse()
+    for tree, best in turns:
+        for key, result in run_tree(tree, sizes, repeat, name_filter).items():
+            if key not in best or result["min"] < best[key]["min"]:
+                best[key] = result
+
+
+def run_interleaved(against, sizes, repeat, name_filter, rounds, threshold, noise_floor, rechecks):
+    """Alternates runs of the baseline tree and this one; returns each side's best results.
+
+    A benchmark that still looks regressed after the rounds gets up to
+    `rechecks` more head-to-head runs of just that benchmark.
+    """
+    baseline, current = {}, {}
+    for round_number in range(rounds):
+        run_turns(against, baseline, current, sizes, repeat, name_filter, round_number % 2 == 0)
+        print(f"[BENCH] Round {round_number + 1} of {rounds} done.")
+    for attempt in range(rechecks):
+        flagged = [key for key, result in current.items()
+                   if key in baseline and is_regression(baseline[key]["min"], result["min"], threshold, noise_floor)]
+        for key in flagged:
+            result = current[key]
+            run_turns(against, baseline, current, [result["n"]], repeat, result["name"], attempt % 2 == 1)
+            print(f"  {key:<48} {current[key]['min'] * 1e6:>12.2f} us vs {baseline[key]['min'] * 1e6:.2f} (recheck {attempt + 1})")
+    return baseline, current
+
+
+def compare(current, baseline, threshold, noise_floor=DEFAULT_NOISE_FLOOR_US):
+    """Returns a list of (key, baseline_min, current_min, ratio) for regressions."""
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for key, base in sorted(baseline.items()):
+        if key not in current:
+            continue
+        cur = current[key]["min"]
+        ratio = cur / base["min"] if base["min"] else float("inf")
+        flag = "  REGRESSION" if is_regression(base["min"], cur, threshold, noise_floor) else ""
+        print(f"{key:<48} {base['min'] * 1e6:>12.2f} {cur * 1e6:>12.2f} {(ratio - 1) * 100:>+7.1f}%{flag}")
+        if flag:
+            regressions.append((key, base["min"], cur, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="card_game.py micro-benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=PLAYER_COUNTS, help="player counts to benchmark")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timing samples per benchmark")
+    parser.add_argument("--filter", default=None, help="only run benchmarks whose name contains this text")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a JSON baseline and fail on regressions")
+    parser.add_argument("--against", metavar="DIR",
+                        help="checkout of the baseline code to run in turns with this one, failing on regressions")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="turns each tree gets with --against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--noise-floor", type=float, default=DEFAULT_NOISE_FLOOR_US,
+                        help="slowdowns smaller than this many microseconds never fail")
+    parser.add_argument("--rechecks", type=int, default=DEFAULT_RECHECKS,
+                        help="extra measurements of a benchmark that looks regressed")
+    args = parser.parse_args(argv)
+
+    if args.against:
+        print(f"[BENCH] Running card_game benchmarks for sizes {args.sizes}, in turns with {args.against}...")
+        baseline, results = run_interleaved(args.against, args.sizes, args.repeat, args.filter, args.rounds,
+                                            args.threshold, args.noise_floor, args.rechecks)
+        regressions = compare(results, baseline, args.threshold, args.noise_floor)
+        if regressions:
+            print(f"\n[BENCH] {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+        print(f"\n[BENCH] No regressions beyond {args.threshold:.0%}.")
+        return 0
+
+    print(f"[BENCH] Running card_game benchmarks for sizes {args.sizes}...")
+    results = run_benchmarks(args.sizes, args.repeat, args.filter)
+
+    if args.save:
+        payload = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": results,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+        print(f"[BENCH] Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        recheck(results, baseline, args.threshold, args.noise_floor, args.rechecks, args.repeat)
+        regressions = compare(results, baseline, args.threshold, args.noise_floor)
+        if regressions:
+            print(f"\n[BENCH] {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+        print(f"\n[BENCH] No regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
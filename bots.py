@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Bot Players (bots.py) - what a server-side bot seat does next
+
+server.py builds a view for each bot seat (see build_bot_view there): a plain
+snapshot of what that seat's player is allowed to see, plus the private messages
+it has not answered yet. decide(view, deadline) runs in the server's bot worker
+pool and returns the events to send as (event, data) pairs; the server runs them
+through the same Socket.IO handlers a browser's events go through, so bots can
+never do anything a player could not.
+
+decide() only spends optional effort (choosing a card to play) while there is
+time left before `deadline`. fallback(view) is the answer used when a decision
+misses its deadline anyway: it skips the optional parts and only does what keeps
+the game moving (pass, sleep, get ready, abstain).
+"""
+
+import random
+import time
+
+# --- Configuration Constants ---
+CARD_PLAY_CHANCE = 0.5 # How often a bot plays a card in an Evening it could play one in
+# Cards a bot may play: Evening cards with no sacrifice and a single simple target.
+PLAYABLE_TARGET_TYPES = ("self", "other_player")
+
+rng = random.Random() # Its own generator, so bot choices never shift the game's random sequence
+
+
+def decide(view, deadline):
+    """The events this bot sends now, as a list of (event, data). Empty means nothing to do."""
+    actions = respond_to_messages(view)
+    actions.extend(phase_actions(view, deadline))
+    return actions
+
+
+def fallback(view):
+    """decide() without the optional choices, for a bot whose decision ran out of time."""
+    actions = respond_to_messages(view)
+    actions.extend(phase_actions(view, None))
+    return actions
+
+
+def respond_to_messages(view):
+    """Answers the private prompts in view['messages'] that arrived since the last decision."""
+    actions = []
+    for _seq, event, payload in view["messages"]:
+        # A prompt can be older than this bot's seat, so each is checked against the current state.
+        if event == 'prompt_for_contract' and not view["has_contract"]:
+            key = payload.get('key')
+            accept = view["role"] == "Villager" and payload.get('target_type') == 'self'
+            actions.append(('contract_response', {"contract_key": key, "accepted": accept}))
+        elif event == 'prompt_resurrection_assist':
+            sacrifice = [] # Sabotage unless the bot is a Villager with cards to spare
+            if view["role"] == "Villager" and len(view["hand"]) >= 2:
+                sacrifice = [card["id"] for card in view["hand"][:2]]
+            actions.append(('submit_ritual_response', {"ritual_id": payload.get('ritual_id'), "sacrificed_card_ids": sacrifice}))
+        elif event == 'prompt_compulsion_resolution' and 'compelled' in view["status"] and view["phase"] == "Night":
+            actions.append(('compulsion_response', {"success": True}))
+        elif event == 'prompt_harbinger_kill' and 'harbinger_quest' in view["status"]:
+            targets = enemies(view) or view["others"]
+            if targets:
+                actions.append(('harbinger_kill', {"target_name": rng.choice(targets)}))
+    return actions
+
+
+def enemies(view):
+    """Living players this bot's side wants gone, as far as it knows."""
+    return [name for name in view["others"] if name not in view["teammates"]]
+
+
+def phase_actions(view, deadline):
+    phase = view["phase"]
+    alive = view["alive"]
+
+    if phase == "Lobby":
+        if view["needs_name"]:
+            return [('player_name_submit', {"name": view["bot_name"]})]
+        if view["desired_players"] and not view["lobby_ready"]:
+            return [('start_game_request', {})]
+        return []
+
+    if phase == "Evening":
+        if view["submitted_evening"] or not (alive or view["hand"]):
+            return []
+        card = choose_evening_card(view, deadline) if alive and deadline is not None else None
+        if card is None:
+            return [('submit_evening_cards', {"selected_card_ids": [], "sacrifice_card_ids": [], "card_targets": {}})]
+        card_id, target = card
+        return [('submit_evening_cards', {"selected_card_ids": [card_id], "sacrifice_card_ids": [], "card_targets": {card_id: [target]}})]
+
+    if phase == "Night":
+        actions = [] if view["asleep"] else [('toggle_sleep', {})]
+        if alive and view["role"] == "Cultist" and view["cultists_awake"]:
+            actions.extend(cultist_kill_actions(view))
+        return actions
+
+    if not alive:
+        return [] # The remaining phases only wait on the living
+
+    if phase == "Morning":
+        return [] if view["morning_ready"] else [('proceed_to_voting', {})]
+
+    if phase == "Voting":
+        sub_phase = view["sub_phase"]
+        if sub_phase == "Nomination" and not view["nominated"] and 'vote_restriction' not in view["status"]:
+            targets = enemies(view) or view["others"]
+            return [('nominate_player', {"targets": [rng.choice(targets)] if targets else []})]
+        if sub_phase == "Speaking" and not view["execution_ready"]:
+            return [('ready_for_execution_vote', {})]
+        if sub_phase == "Execution" and not view["has_voted"]:
+            status = view["status"]
+            if 'vote_restriction' in status or ('vote_block' in status and 'extra_vote' not in status):
+                return []
+            speakers = [name for name in view["speakers"] if name != view["name"]]
+            preferred = [name for name in speakers if name not in view["teammates"]]
+            if preferred:
+                return [('submit_execution_vote', {"target": rng.choice(preferred)})]
+            return [('abstain_execution_vote', {})]
+        return []
+
+    if phase == "ApocalypseVote":
+        if view["apocalypse_voted"] or view["apocalypse_target"] in (None, view["name"]):
+            return []
+        vote = "No" if view["apocalypse_target"] in view["teammates"] else rng.choice(["Yes", "No"])
+        return [('apocalypse_vote_submit', {"vote": vote})]
+
+    if phase == "Dusk":
+        return [] if view["dusk_ready"] else [('ready_for_evening', {})]
+
+    return []
+
+
+def cultist_kill_actions(view):
+    """Vote with the other Cultists (a new vote only if nobody has picked yet), then confirm."""
+    votes = view["kill_votes"]
+    my_vote = votes.get(view["name"])
+    others_votes = [target for voter, target in votes.items() if voter != view["name"]]
+    if others_votes:
+        wanted = max(sorted(set(others_votes)), key=others_votes.count)
+    elif my_vote:
+        wanted = my_vote
+    else:
+        # Every Cultist bot deciding from the same view picks the same victim, so bots
+        # thinking at the same time do not split the vote.
+        targets = sorted(enemies(view))
+        wanted = targets[view["round"] % len(targets)] if targets else None
+    if wanted is None:
+        return []
+    if my_vote != wanted:
+        return [('cultist_kill_vote', {"target_player_name": wanted})]
+    if view["kill_target"] == wanted:
+        return [('confirm_cultist_kill', {})]
+    return []
+
+
+def choose_evening_card(view, deadline):
+    """A (card_id, target_name) to play this Evening, or None. Stops looking at the deadline."""
+    if 'delirium' in view["status"] or rng.random() >= CARD_PLAY_CHANCE:
+        return None
+    candidates = []
+    for card in view["hand"]:
+        if time.monotonic() >= deadline:
+            break
+        if ("Evening" not in card["phases"] or card["sacrifice"] or
+                card["target_type"] not in PLAYABLE_TARGET_TYPES):
+            continue
+        if card["target_type"] == "self":
+            candidates.append((card["id"], view["name"]))
+        else:
+            targets = enemies(view)
+            if targets:
+                candidates.append((card["id"], rng.choice(targets)))
+    return rng.choice(candidates) if candidates else None
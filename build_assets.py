@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Client Asset Build (build_assets.py) - versioned, precompressed static files
+
+Usage:
+    python build_assets.py
+
+Splits the inline <style> and <script> out of templates/index.html into
+content-hashed files under static/dist/, writes gzip (and, if the `brotli`
+package is installed, brotli) copies of every file next to it, and writes an
+HTML shell that links to the hashed files. server.py serves whatever
+static/dist/manifest.json describes, and falls back to rendering the
+template directly when no build exists.
+
+Re-run this after editing templates/index.html.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:  # Optional: brotli copies are skipped without it
+    brotli = None
+
+# --- Configuration Constants ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_PATH = os.path.join(BASE_DIR, "templates", "index.html")
+DIST_DIR = os.path.join(BASE_DIR, "static", "dist")
+MANIFEST_NAME = "manifest.json"
+ASSET_URL_PREFIX = "/assets/"  # Must match the asset route in server.py
+HASH_LENGTH = 12
+
+# The first inline <style> block, and the inline <script> block (one without a src).
+STYLE_RE = re.compile(r"[ \t]*<style>(.*?)</style>[ \t]*\n?", re.S)
+SCRIPT_RE = re.compile(r"[ \t]*<script>(.*?)</script>[ \t]*\n?", re.S)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def write_variants(name, data):
+    """Writes name, name.gz and (if available) name.br into DIST_DIR."""
+    path = os.path.join(DIST_DIR, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+    sizes = [len(data), os.path.getsize(path + ".gz")]
+    if brotli is not None:
+        sizes.append(os.path.getsize(path + ".br"))
+    print(f"[BUILD] {name}: " + " / ".join(f"{s:,} B" for s in sizes))
+
+
+def build():
+    with open(TEMPLATE_PATH, encoding="utf-8") as f:
+        html = f.read()
+
+    style_match = STYLE_RE.search(html)
+    script_match = SCRIPT_RE.search(html)
+    if not style_match or not script_match:
+        print("[BUILD] Could not find the inline <style> and <script> blocks in the template.")
+        return 1
+
+    css = style_match.group(1).strip().encode("utf-8") + b"\n"
+    js = script_match.group(1).strip().encode("utf-8") + b"\n"
+    css_name = f"app.{content_hash(css)}.css"
+    js_name = f"app.{content_hash(js)}.js"
+
+    # Replace the later block first so the earlier match offsets stay valid.
+    blocks = sorted([
+        (style_match, f'  <link rel="stylesheet" href="{ASSET_URL_PREFIX}{css_name}">\n'),
+        (script_match, f'  <script src="{ASSET_URL_PREFIX}{js_name}"></script>\n'),
+    ], key=lambda item: item[0].start(), reverse=True)
+    shell = html
+    for match, replacement in blocks:
+        shell = shell[:match.start()] + replacement + shell[match.end():]
+    shell = shell.encode("utf-8")
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    # Hashed names change with their content, so old builds are just clutter.
+    for old in os.listdir(DIST_DIR):
+        os.remove(os.path.join(DIST_DIR, old))
+
+    write_variants(css_name, css)
+    write_variants(js_name, js)
+    write_variants("index.html", shell)
+
+    manifest = {
+        "css": css_name,
+        "js": js_name,
+        "html": "index.html",
+        "html_etag": content_hash(shell),
+        "encodings": ["br", "gzip"] if brotli is not None else ["gzip"],
+    }
+    with open(os.path.join(DIST_DIR, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[BUILD] Wrote {MANIFEST_NAME} to {DIST_DIR}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(build())
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 """Core Game Logic (card_game.py) - Deck Composition Update"""
 
+from collections import Counter
+import hashlib
+import heapq
+import json
 import random
+import string
 import time
 import uuid
 
@@ -35,6 +40,20 @@ DECK_COMPOSITION = {
     "Ghostly Silence": 50,
 }
 
+# How many Cultists assign_roles() deals (in server.py): the first row whose player
+# limit fits the game, as (up to this many players, Cultists). None means no limit.
+CULTIST_COUNTS = (
+    (8, 1),
+    (13, 2),
+    (None, 3),
+)
+
+def cultist_count_for(num_players):
+    for max_players, cultists in CULTIST_COUNTS:
+        if max_players is None or num_players <= max_players:
+            return cultists
+    return CULTIST_COUNTS[-1][1]
+
 
 
 CARD_DEFINITIONS = {
@@ -49,6 +68,13 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 2,
         "dead_card": False,
         "duration_rounds": 3,
+        "effect": {
+            "steps": [
+                {"op": "apply_status", "to": "self", "status": "mark_of_the_beast", "rounds": "card"},
+                {"op": "announce", "template": "{caster} was marked by the Beast, causing those who kill them to be publicly announced the Morning after their death!"},
+                {"op": "log", "template": "[CARD] {caster} is now Marked by the Beast for {rounds} rounds."},
+            ],
+        },
     },
     "Resurrection Ritual": {
         "name": "Resurrection Ritual",
@@ -85,6 +111,13 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 0,           # 
         "dead_card": False,
         "duration_rounds": 1,           # It lasts for 1 night's resolution
+        "effect": {
+            # Secret status effect; it has no entry in STATUS_UI_MAP in index.html, so it stays hidden.
+            "steps": [
+                {"op": "apply_status", "to": "self", "status": "hand_of_glory_protection", "rounds": 2},
+                {"op": "log", "template": "[EFFECT] {caster} secretly used Hand of Glory."},
+            ],
+        },
     },
     "Oh God, Please! Anything But This!": {
         "name": "Oh God, Please! Anything But This!",
@@ -97,6 +130,13 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 0,
         "dead_card": True,
         "duration_rounds": 1,
+        "effect": {
+            "requires": "alive_target",
+            "steps": [
+                {"op": "apply_status", "to": "target", "status": "eternal_winter", "rounds": "card"},
+                {"op": "announce", "template": "{caster} has cursed {target}, who must now sing 'All I Want for Christmas Is You' until sundown!"},
+            ],
+        },
     },
     "Compulsion": {
         "name": "Compulsion",
@@ -193,6 +233,13 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 2,
         "dead_card": False,
         "duration_rounds": 3,
+        "effect": {
+            "steps": [
+                {"op": "apply_status", "to": "self", "status": "immolated", "rounds": "card"},
+                {"op": "announce", "template": "{caster} burns with a holy fire! Anyone who plays a card against them will burst into flames, killing them within two rounds!"},
+                {"op": "log", "template": "[CARD] {caster} is now immolated for {rounds} rounds."},
+            ],
+        },
     },
     "Act of God": {
         "name": "Act of God",
@@ -205,6 +252,14 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 1,
         "dead_card": False,
         "duration_rounds": 0,
+        "effect": {
+            "requires": "target",
+            "steps": [
+                {"op": "queue_night_action", "to": "target", "action": "lose_all_cards", "counterable": True,
+                 "data": {"target_name": "target"}},
+                {"op": "log", "template": "[CARD] {caster} played Act of God on {target}. Effect is pending for Morning."},
+            ],
+        },
     },
     "Feed the Maggots": {
         "name": "Feed the Maggots",
@@ -253,6 +308,14 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 1,
         "dead_card": False,
         "duration_rounds": 2,
+        "effect": {
+            "requires": "target",
+            "steps": [
+                {"op": "queue_night_action", "to": "target", "action": "delirium", "counterable": True,
+                 "data": {"duration": "rounds", "target_name": "target"}},
+                {"op": "log", "template": "[CARD] {caster} played Delirium on {target}"},
+            ],
+        },
     },
     "Silver Tongue": {
         "name": "Silver Tongue",
@@ -277,6 +340,14 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 1,
         "dead_card": False,
         "duration_rounds": 1,
+        "effect": {
+            "requires": "target",
+            "steps": [
+                {"op": "queue_night_action", "to": "target", "action": "delirium", "counterable": True,
+                 "data": {"duration": "rounds", "target_name": "target"}},
+                {"op": "log", "template": "[CARD] {caster} played Delirium on {target}"},
+            ],
+        },
     },
     "Silence": {
         "name": "Silence",
@@ -289,6 +360,14 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 0,
         "dead_card": False,
         "duration_rounds": 1,
+        "effect": {
+            "requires": "target",
+            "steps": [
+                {"op": "queue_night_action", "to": "target", "action": "silence", "counterable": True,
+                 "data": {"duration": "rounds", "source_name": "caster", "target_name": "target"}},
+                {"op": "log", "template": "[CARD] {caster} played Silence on {target}"},
+            ],
+        },
     },
     "The Apocalypse": {
         "name": "The Apocalypse",
@@ -361,6 +440,14 @@ CARD_DEFINITIONS = {
         "sacrifice_cards": 0,
         "dead_card": True,
         "duration_rounds": 1,
+        "effect": {
+            "requires": "target",
+            "steps": [
+                {"op": "queue_night_action", "to": "target", "action": "silence", "counterable": True,
+                 "data": {"duration": "rounds", "source_name": "caster", "target_name": "target"}},
+                {"op": "log", "template": "[CARD] {caster} played Silence on {target}"},
+            ],
+        },
     },
     "Spectral Block": {
         "name": "Spectral Block",
@@ -376,12 +463,240 @@ CARD_DEFINITIONS = {
     },
 }
 
+# --- CARD EFFECT REGISTRY ---
+# Maps each "effect_type" used in CARD_DEFINITIONS to the callable that applies it.
+# The handlers themselves live in server.py (they need the connected clients) and
+# register with @register_effect("effect_type"). Dispatch is a single dict lookup,
+# so a card's cost no longer depends on where it sits in a long if/elif chain.
+EFFECT_HANDLERS = {}
+EFFECT_PRE_HOOKS = []   # Run in order before every handler; returning False cancels the effect.
+EFFECT_TIMINGS = {}     # effect_type -> {"calls": int, "total_seconds": float, "max_seconds": float}
+
+
+class EffectContext:
+    """Everything a card effect handler needs to know about a single card play."""
+    __slots__ = ("game_state", "player_id", "player", "card", "target", "targets", "sid")
+
+    def __init__(self, game_state, player_id, player, card, target=None, targets=None, sid=None):
+        self.game_state = game_state
+        self.player_id = player_id
+        self.player = player    # The Player who played the card
+        self.card = card        # The Card being played
+        self.target = target    # The first targeted Player (or None)
+        self.targets = targets  # The raw target data sent by the client
+        self.sid = sid          # The caster's socket id, if the play came from a client
+
+
+def register_effect(*effect_types):
+    """Decorator registering a handler(ctx) for one or more effect types."""
+    def decorator(handler):
+        for effect_type in effect_types:
+            if effect_type in EFFECT_HANDLERS:
+                raise ValueError(f"Effect '{effect_type}' already has a handler registered.")
+            EFFECT_HANDLERS[effect_type] = handler
+        return handler
+    return decorator
+
+
+def register_effect_pre_hook(hook):
+    """Decorator registering a hook(ctx) that runs before every card effect."""
+    EFFECT_PRE_HOOKS.append(hook)
+    return hook
+
+
+def dispatch_card_effect(ctx):
+    """Runs the pre-hooks and then the registered handler for ctx.card, timing the handler."""
+    for hook in EFFECT_PRE_HOOKS:
+        if hook(ctx) is False:
+            return None
+
+    effect_type = ctx.card.effect_type
+    handler = EFFECT_HANDLERS.get(effect_type)
+    if handler is None:
+        print(f"[CARD_EFFECT] No handler registered for effect '{effect_type}'.")
+        return None
+
+    start = time.perf_counter()
+    try:
+        return handler(ctx)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats = EFFECT_TIMINGS.get(effect_type)
+        if stats is None:
+            stats = EFFECT_TIMINGS[effect_type] = {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        stats["calls"] += 1
+        stats["total_seconds"] += elapsed
+        if elapsed > stats["max_seconds"]:
+            stats["max_seconds"] = elapsed
+
+
+def missing_effect_handlers():
+    """Returns the effect types used by CARD_DEFINITIONS that have no registered handler."""
+    return sorted({d["effect_type"] for d in CARD_DEFINITIONS.values()} - EFFECT_HANDLERS.keys())
+
+# --- DECLARATIVE CARD EFFECTS ---
+# Simple cards describe their behaviour with an "effect" spec instead of server code:
+#
+#   "effect": {
+#       "requires": "none" | "target" | "alive_target",   # Skip the effect if unmet
+#       "steps": [
+#           {"op": "apply_status", "to": "self"|"target", "status": "silence", "rounds": "card"|<int>},
+#           {"op": "queue_night_action", "to": "self"|"target", "action": "silence",
+#            "counterable": True, "data": {"duration": "rounds", "target_name": "target"}},
+#           {"op": "announce", "template": "{caster} silenced {target}!"},
+#           {"op": "log", "template": "[CARD] {caster} played Silence on {target}"},
+#       ],
+#   }
+#
+# Templates and "data" values may use the fields: caster, target, rounds.
+# Specs are validated once, at import time, and compiled into plain Python
+# functions (the same straight-line code a hand-written handler would contain),
+# which are registered in EFFECT_HANDLERS like any other handler.
+EFFECT_SPEC_FIELDS = ("caster", "target", "rounds")
+_EFFECT_SPEC_REQUIRES = ("none", "target", "alive_target")
+_EFFECT_SPEC_OPS = ("apply_status", "queue_night_action", "announce", "log")
+
+
+def _compile_template(card_name, template):
+    """Validates a template and returns it as f-string source code."""
+    if not isinstance(template, str):
+        raise ValueError(f"Card '{card_name}': effect templates must be strings.")
+    body = []
+    for literal, field, format_spec, conversion in string.Formatter().parse(template):
+        body.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if field not in EFFECT_SPEC_FIELDS or format_spec or conversion:
+            raise ValueError(f"Card '{card_name}': unsupported template field '{{{field}}}' in {template!r}.")
+        body.append("{" + field + "}")
+    return "f" + repr("".join(body))
+
+
+def _compile_step(card_name, step, requires):
+    """Validates one step and returns the source lines implementing it."""
+    op = step.get("op")
+    if op not in _EFFECT_SPEC_OPS:
+        raise ValueError(f"Card '{card_name}': unknown effect op '{op}'.")
+
+    if op == "announce":
+        return [f"game_state.public_announcements.append({_compile_template(card_name, step.get('template'))})"]
+    if op == "log":
+        return [f"print({_compile_template(card_name, step.get('template'))})"]
+
+    to = step.get("to")
+    if to not in ("self", "target"):
+        raise ValueError(f"Card '{card_name}': '{op}' needs \"to\" set to 'self' or 'target'.")
+    if to == "target" and requires == "none":
+        raise ValueError(f"Card '{card_name}': '{op}' on the target requires \"requires\": 'target' or 'alive_target'.")
+    who = "target_player" if to == "target" else "player"
+
+    if op == "apply_status":
+        status = step.get("status")
+        rounds = step.get("rounds", "card")
+        if not isinstance(status, str) or not status:
+            raise ValueError(f"Card '{card_name}': apply_status needs a \"status\" name.")
+        if rounds != "card" and (not isinstance(rounds, int) or isinstance(rounds, bool)):
+            raise ValueError(f"Card '{card_name}': apply_status \"rounds\" must be 'card' or an integer.")
+        rounds_src = "rounds" if rounds == "card" else repr(rounds)
+        return [f"{who}.apply_status_effect({status!r}, {rounds_src})"]
+
+    # queue_night_action
+    action_type = step.get("action")
+    counterable = step.get("counterable", True)
+    data_spec = step.get("data", {})
+    if not isinstance(action_type, str) or not action_type:
+        raise ValueError(f"Card '{card_name}': queue_night_action needs an \"action\" name.")
+    if not isinstance(counterable, bool):
+        raise ValueError(f"Card '{card_name}': queue_night_action \"counterable\" must be True or False.")
+    data_items = []
+    for key, field in data_spec.items():
+        if field not in EFFECT_SPEC_FIELDS:
+            raise ValueError(f"Card '{card_name}': unknown data field '{field}' for '{key}'.")
+        data_items.append(f"{key!r}: {field}")
+    return [
+        f"game_state.pending_night_actions.append({{ \"target_id\": {who}.player_id, "
+        f"\"effect_type\": {action_type!r}, \"source_id\": ctx.player_id, "
+        f"\"is_counterable\": {counterable!r}, \"is_countered\": False, "
+        f"\"effect_data\": {{{', '.join(data_items)}}} }})"
+    ]
+
+
+def compile_effect_spec(card_name, spec):
+    """Validates an "effect" spec and compiles it into a handler(ctx)."""
+    requires = spec.get("requires", "none")
+    if requires not in _EFFECT_SPEC_REQUIRES:
+        raise ValueError(f"Card '{card_name}': unknown \"requires\" value '{requires}'.")
+    steps = spec.get("steps")
+    if not steps:
+        raise ValueError(f"Card '{card_name}': an effect spec needs at least one step.")
+
+    body = []
+    for step in steps:
+        body.extend(_compile_step(card_name, step, requires))
+
+    lines = ["def handler(ctx):", "    target_player = ctx.target"]
+    if requires == "target":
+        lines.append("    if not target_player: return")
+    elif requires == "alive_target":
+        lines.append("    if not (target_player and target_player.is_alive): return")
+    lines += [
+        "    game_state = ctx.game_state",
+        "    player = ctx.player",
+        "    caster = player.name",
+        "    target = target_player.name if target_player else None",
+        "    rounds = ctx.card.duration_rounds",
+    ]
+    lines += ["    " + line for line in body]
+
+    namespace = {}
+    exec(compile("\n".join(lines), f"<effect spec: {card_name}>", "exec"), namespace)
+    handler = namespace["handler"]
+    handler.__name__ = f"_effect_spec_{CARD_DEFINITIONS.get(card_name, {}).get('effect_type', 'custom')}"
+    return handler
+
+
+def _compile_card_effects():
+    """Compiles every "effect" spec in CARD_DEFINITIONS and registers it by effect_type."""
+    specs_by_effect = {}
+    for card_name, definition in CARD_DEFINITIONS.items():
+        effect_type = definition["effect_type"]
+        spec = definition.get("effect")
+        if effect_type in specs_by_effect and specs_by_effect[effect_type][1] != spec:
+            other_card = specs_by_effect[effect_type][0]
+            raise ValueError(f"Cards '{other_card}' and '{card_name}' share effect '{effect_type}' but not its spec.")
+        specs_by_effect[effect_type] = (card_name, spec)
+
+    for effect_type, (card_name, spec) in specs_by_effect.items():
+        if spec is not None:
+            register_effect(effect_type)(compile_effect_spec(card_name, spec))
+
+
+_compile_card_effects()
+
+
+# --- Card Catalog ---
+# Clients receive every card's definition once, as CARD_CATALOG, and hands as
+# [card id, type index] pairs indexing its "cards" list. The version is a hash of
+# the catalog, so a browser keeps using its cached copy until a definition changes.
+CARD_TYPE_INDEX = {card_name: index for index, card_name in enumerate(CARD_DEFINITIONS)}
+
+def _build_card_catalog():
+    cards = []
+    for definition in CARD_DEFINITIONS.values():
+        card_data = dict(definition)
+        card_data.pop('effect', None) # Server-side behaviour spec, not for clients
+        cards.append(card_data)
+    encoded = json.dumps(cards, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return {"version": hashlib.sha256(encoded).hexdigest()[:16], "cards": cards}
+
+CARD_CATALOG = _build_card_catalog()
+
 
 class Card:
     def __init__(self, card_name):
         if card_name not in CARD_DEFINITIONS:
             raise ValueError(f"Card '{card_name}' not found in definitions.")
-        self.id = str(uuid.uuid4())
+        self.id = uuid.uuid4().hex[:12] # Unique within a game at a third of a full UUID's size
         self.name = card_name
         self.definition = CARD_DEFINITIONS[card_name]
         self.description = self.definition["description"]
@@ -396,16 +711,25 @@ class Card:
 
     def to_dict(self):
         card_data = self.definition.copy()
+        card_data.pop('effect', None) # Server-side behaviour spec, not for clients
         card_data['id'] = self.id
         return card_data
 
+    def to_ref(self):
+        """The compact [id, type index] form clients get; the rest is in CARD_CATALOG."""
+        return [self.id, CARD_TYPE_INDEX[self.name]]
+
     def __str__(self):
         return f"{self.name} ({self.id})"
 
+    def __deepcopy__(self, memo):
+        # A card never changes once made, so copies of a game (batch snapshots) share it
+        return self
+
     @staticmethod
     def from_dict(data):
         card = Card(data["name"])
-        card.id = data.get("id", str(uuid.uuid4()))
+        card.id = data.get("id", uuid.uuid4().hex[:12])
         return card
 
 
@@ -432,9 +756,453 @@ class Deck:
         self.cards.extend(cards_to_add)
         self.shuffle()
 
+    def __deepcopy__(self, memo):
+        # The cards are shared (see Card.__deepcopy__); a copy only needs their order
+        copied = Deck.__new__(Deck)
+        copied.cards = list(self.cards)
+        memo[id(self)] = copied
+        return copied
+
+
+class PendingNightActions:
+    """
+    The actions queued during Evening/Night that resolve at dawn.
+
+    Iterates like the list it replaces (in the order actions were queued), but
+    also keeps the actions indexed by effect type, plus a per-target index of
+    the counterable ones that the target gets to see. Inserting an action is
+    O(1), and counterable_for() and of_type() are direct lookups instead of a
+    scan of every action. Nothing is taken out before dawn, when
+    resolve_dawn_actions() clears the lot.
+
+    Actions are keyed by a sequence number.
+    """
+    def __init__(self, owner=None):
+        self._owner = owner              # GameState whose players see these actions
+        self._next_key = 0
+        self._actions = {}               # key -> action, in insertion order
+        self._counterable_by_target = {} # target_id -> {key: action}
+        self._by_type = {}               # effect_type -> {key: action}
+
+    def append(self, action):
+        key = self._next_key
+        self._next_key += 1
+        self._actions[key] = action
+        self._by_type.setdefault(action["effect_type"], {})[key] = action
+        if action["is_counterable"]:
+            self._counterable_by_target.setdefault(action["target_id"], {})[key] = action
+        self._touch(action)
+
+    def _touch(self, action):
+        if self._owner is not None:
+            self._owner.mark_changed("pending_night_actions")
+            if action["is_counterable"]: # Only counterable actions show up in the target's own view
+                self._owner.mark_private_dirty(action["target_id"])
+
+    def counterable_for(self, target_id):
+        return list(self._counterable_by_target.get(target_id, {}).values())
+
+    def of_type(self, effect_type):
+        return list(self._by_type.get(effect_type, {}).values())
+
+    def clear(self):
+        owner = self._owner
+        if owner is not None and self._actions:
+            owner.mark_changed("pending_night_actions")
+            for target_id in self._counterable_by_target:
+                owner.mark_private_dirty(target_id)
+        self._actions.clear()
+        self._counterable_by_target.clear()
+        self._by_type.clear()
+
+    def __iter__(self):
+        return iter(list(self._actions.values()))
+
+    def __len__(self):
+        return len(self._actions)
+
+    def __bool__(self):
+        return bool(self._actions)
+
+
+class StatusExpiryQueue:
+    """
+    Per-game index of timed status effects, keyed by when they lapse.
+
+    Integer-valued effects last a number of "sundowns" (each call to expire()),
+    and effects can also be set to lapse at the start of a given round. Only the
+    entries that are actually due are touched, so a phase transition costs
+    O(expiring effects) instead of O(players x effects).
+
+    The status_effects dict stays the source of truth: an entry whose effect was
+    removed or re-applied since it was scheduled is simply skipped when popped.
+
+    A dead player's sundown timers are paused (pause() at death, resume() on
+    revival): they keep the sundowns they had left, and only sundowns that pass
+    for the dead as well (expire(alive_only=False)) count them down meanwhile.
+    """
+    def __init__(self):
+        self.tick = 0            # Number of sundowns processed so far
+        self._by_tick = {}       # tick -> [(player, effect)]
+        self._by_round = {}      # round -> [(player, effect)]
+        self._round_heap = []    # Rounds present in _by_round, smallest first
+        self._paused = set()     # Dead players who may have paused timers
+
+    def schedule(self, player, effect, duration):
+        """The effect lapses after `duration` sundowns (at least one)."""
+        if not player.is_alive:
+            player.status_expiry_keys[effect] = ("paused", max(duration, 1))
+            self._paused.add(player)
+            return
+        expires_at = self.tick + max(duration, 1)
+        player.status_expiry_keys[effect] = ("tick", expires_at)
+        bucket = self._by_tick.get(expires_at)
+        if bucket is None:
+            bucket = self._by_tick[expires_at] = []
+        bucket.append((player, effect))
+
+    def schedule_for_round(self, player, effect, round_number):
+        """The effect lapses at the first expire_rounds() call for round_number or later."""
+        player.status_expiry_keys[effect] = ("round", round_number)
+        bucket = self._by_round.get(round_number)
+        if bucket is None:
+            bucket = self._by_round[round_number] = []
+            heapq.heappush(self._round_heap, round_number)
+        bucket.append((player, effect))
+
+    def expire(self, alive_only=False):
+        """
+        Processes one sundown and returns the (player, effect) pairs that lapsed. With
+        alive_only the sundown passes for the living only, and paused timers stay as they are.
+        """
+        self.tick += 1
+        due = [(player, effect) for player, effect in self._by_tick.pop(self.tick, ())
+               if player.status_expiry_keys.get(effect) == ("tick", self.tick)] # Else re-applied or paused
+        if not alive_only:
+            for player in list(self._paused):
+                for effect, key in list(player.status_expiry_keys.items()):
+                    if key[0] != "paused":
+                        continue
+                    if key[1] > 1:
+                        player.status_expiry_keys[effect] = ("paused", key[1] - 1)
+                    else:
+                        due.append((player, effect))
+        expired = []
+        for player, effect in due:
+            if player.status_expiry_keys.pop(effect, None) is None or effect not in player.status_effects:
+                continue # Listed twice, or removed since it was scheduled
+            del player.status_effects[effect]
+            expired.append((player, effect))
+            print(f"DEBUG: {player.name}'s '{effect}' effect has worn off.")
+        return expired
+
+    def pause(self, player):
+        """Called at a player's death: their sundown timers keep the sundowns they have left."""
+        for effect, key in list(player.status_expiry_keys.items()):
+            if key[0] == "tick" and effect in player.status_effects:
+                player.status_expiry_keys[effect] = ("paused", key[1] - self.tick)
+                self._paused.add(player)
+
+    def resume(self, player):
+        """Called when a player is revived: their paused timers run again from where they stopped."""
+        self._paused.discard(player)
+        for effect, key in list(player.status_expiry_keys.items()):
+            if key[0] == "paused":
+                if effect in player.status_effects:
+                    self.schedule(player, effect, key[1])
+                else:
+                    del player.status_expiry_keys[effect]
+
+    def expire_rounds(self, round_number):
+        """Removes and returns the (player, effect) pairs set to lapse by round_number."""
+        expired = []
+        while self._round_heap and self._round_heap[0] <= round_number:
+            due_round = heapq.heappop(self._round_heap)
+            for player, effect in self._by_round.pop(due_round, ()):
+                if player.status_expiry_keys.get(effect) != ("round", due_round) or effect not in player.status_effects:
+                    continue
+                del player.status_effects[effect]
+                del player.status_expiry_keys[effect]
+                expired.append((player, effect))
+        return expired
+
+    def clear(self):
+        self._by_tick.clear()
+        self._by_round.clear()
+        self._round_heap.clear()
+        self._paused.clear()
+
+
+# --- CHANGE TRACKING ---
+# GameState and Player record which of their client-visible attributes changed
+# since the last GameState.flush_changes(), in their own changed_fields set, so
+# the server can tell whether anything needs re-sending. Attribute writes are
+# not intercepted: scan_changes() compares each tracked attribute with the
+# value it held at the previous scan. List/dict/set values are swapped for the
+# containers below, which report their own in-place mutations. Only the top
+# level of a container is watched: code that edits a value nested inside one
+# must call mark_changed(field) itself.
+#
+# A player's private view also shows membership of the game's
+# dawn_active_players, which the player's own fields cannot reveal: change it
+# through GameState.set_dawn_active().
+#
+# Trade-off, measured with 15 players: reads and writes of game attributes
+# cost nothing extra, so advance_phase is no slower than before tracking.
+# The price is a Python call per container mutation, about 0.8 us per
+# Player.scan_changes() and about 20 us per GameState.flush_changes(), which
+# the server pays once per broadcast rather than once per write. Copies
+# (copy.deepcopy) and pickles rebuild the containers through __reduce_ex__
+# without reporting anything.
+
+class _TrackedContainer:
+    # Each subclass declares the slots: _owner (the object whose changed_fields
+    # gets the field name), _field, and _private (also set the owner's
+    # private_dirty, for a player's private view). Only an edit that changes the
+    # contents touches the owner: adding what is already there, removing what is
+    # not, or storing the same immutable value again is not a change.
+    __slots__ = ()
+
+    def _touch(self):
+        owner = self._owner
+        if owner is not None:
+            owner.changed_fields.add(self._field)
+            if self._private:
+                owner.private_dirty = True
+
+    def __reduce_ex__(self, protocol):
+        return type(self), (self._base(self), self._owner, self._field, self._private)
+
+
+# Storing one of these into a slot that already holds it is not a change. A container
+# stored again still counts: that is how an edit nested inside it is reported.
+_CONTAINER_TYPES = (list, dict, set)
+
+
+class _TrackedList(_TrackedContainer, list):
+    __slots__ = ("_owner", "_field", "_private")
+    _base = list
+
+    def __init__(self, iterable=(), owner=None, field=None, private=False):
+        list.__init__(self, iterable)
+        self._owner, self._field, self._private = owner, field, private
+
+    def append(self, item):
+        list.append(self, item)
+        owner = self._owner
+        if owner is not None:
+            owner.changed_fields.add(self._field)
+            if self._private:
+                owner.private_dirty = True
+
+    def pop(self, *args):
+        item = list.pop(self, *args)
+        self._touch()
+        return item
+
+    def extend(self, items):
+        size = len(self)
+        list.extend(self, items)
+        if len(self) != size:
+            self._touch()
+
+    def insert(self, index, item): list.insert(self, index, item); self._touch()
+    def remove(self, item): list.remove(self, item); self._touch()
+    def clear(self):
+        if self: # Clearing an empty container is not a change
+            list.clear(self)
+            self._touch()
+    def sort(self, *args, **kwargs): list.sort(self, *args, **kwargs); self._touch()
+    def reverse(self): list.reverse(self); self._touch()
+
+    def __setitem__(self, index, value):
+        if isinstance(index, int) and list.__getitem__(self, index) is value and not isinstance(value, _CONTAINER_TYPES):
+            return
+        list.__setitem__(self, index, value)
+        self._touch()
+
+    def __delitem__(self, index):
+        size = len(self)
+        list.__delitem__(self, index)
+        if len(self) != size:
+            self._touch()
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+
+_MISSING = object()
+
+
+class _TrackedDict(_TrackedContainer, dict):
+    __slots__ = ("_owner", "_field", "_private")
+    _base = dict
+
+    def __init__(self, mapping=(), owner=None, field=None, private=False):
+        dict.__init__(self, mapping)
+        self._owner, self._field, self._private = owner, field, private
+
+    def __setitem__(self, key, value):
+        if dict.get(self, key, _MISSING) is value and not isinstance(value, _CONTAINER_TYPES):
+            return
+        dict.__setitem__(self, key, value)
+        owner = self._owner
+        if owner is not None:
+            owner.changed_fields.add(self._field)
+            if self._private:
+                owner.private_dirty = True
+
+    def pop(self, *args):
+        size = len(self)
+        value = dict.pop(self, *args)
+        if len(self) != size:
+            self._touch()
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._touch()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return dict.__getitem__(self, key)
+        dict.__setitem__(self, key, default)
+        self._touch()
+        return default
+
+    def __delitem__(self, key): dict.__delitem__(self, key); self._touch()
+    def clear(self):
+        if self: # Clearing an empty container is not a change
+            dict.clear(self)
+            self._touch()
+    def update(self, *args, **kwargs): dict.update(self, *args, **kwargs); self._touch()
+
+
+class _TrackedSet(_TrackedContainer, set):
+    # Every edit but symmetric_difference_update only adds or only removes, so it
+    # changed the set exactly when it changed the set's size.
+    __slots__ = ("_owner", "_field", "_private")
+    _base = set
+
+    def __init__(self, iterable=(), owner=None, field=None, private=False):
+        set.__init__(self, iterable)
+        self._owner, self._field, self._private = owner, field, private
+
+    def add(self, item):
+        size = len(self)
+        set.add(self, item)
+        if len(self) != size:
+            self._touch()
+
+    def discard(self, item):
+        size = len(self)
+        set.discard(self, item)
+        if len(self) != size:
+            self._touch()
+
+    def pop(self):
+        item = set.pop(self)
+        self._touch()
+        return item
+
+    def remove(self, item): set.remove(self, item); self._touch()
+    def clear(self):
+        if self: # Clearing an empty container is not a change
+            set.clear(self)
+            self._touch()
+
+    def update(self, *others):
+        size = len(self)
+        set.update(self, *others)
+        if len(self) != size:
+            self._touch()
+
+    def difference_update(self, *others):
+        size = len(self)
+        set.difference_update(self, *others)
+        if len(self) != size:
+            self._touch()
+
+    def intersection_update(self, *others):
+        size = len(self)
+        set.intersection_update(self, *others)
+        if len(self) != size:
+            self._touch()
+
+    def symmetric_difference_update(self, other): set.symmetric_difference_update(self, other); self._touch()
+
+    def __ior__(self, other): self.update(other); return self
+    def __iand__(self, other): self.intersection_update(other); return self
+    def __isub__(self, other): self.difference_update(other); return self
+    def __ixor__(self, other): self.symmetric_difference_update(other); return self
+
+
+# Plain containers found in a tracked attribute are swapped for these.
+_TRACKED_TYPES = {list: _TrackedList, dict: _TrackedDict, set: _TrackedSet}
+_UNSET = object()
+
+
+def _scan_tracked_fields(owner, fields, private):
+    """
+    Adds to owner.changed_fields each of `fields` whose value is not the one seen at
+    the previous scan, wrapping newly assigned containers. Returns True if any of
+    the `private` fields changed.
+    """
+    attrs = owner.__dict__
+    seen = owner.seen_values
+    changed = owner.changed_fields
+    private_changed = False
+    for name in fields:
+        value = attrs[name]
+        old = seen.get(name, _UNSET)
+        if value is old:
+            continue
+        tracked_type = _TRACKED_TYPES.get(type(value))
+        if tracked_type is None and isinstance(value, _TrackedContainer) and value._owner is not owner:
+            tracked_type = _TRACKED_TYPES[value._base] # Moved over from another owner
+        if tracked_type is not None:
+            value = attrs[name] = tracked_type(value, owner, name, name in private)
+        elif value == old and type(value) is type(old):
+            seen[name] = value
+            continue
+        seen[name] = value
+        changed.add(name)
+        if name in private:
+            private_changed = True
+    return private_changed
+
+
+# Player attributes that appear in get_player_private_state(); a change to any
+# of them marks the player's cached private view as stale.
+PRIVATE_STATE_FIELDS = frozenset((
+    "player_id", "name", "role", "is_alive", "hand", "status_effects",
+    "is_asleep", "has_completed_dawn_action",
+))
+
+# Attributes some client sees: the private view and Player.to_dict() for players,
+# what PUBLIC_STATE_FIELDS reads for the game. Only these are tracked; the rest
+# (scores, contracts, logs, decks, bookkeeping) are plain attributes.
+PLAYER_TRACKED_FIELDS = PRIVATE_STATE_FIELDS | {"has_voted", "has_submitted_evening_cards"}
+GAME_TRACKED_FIELDS = frozenset((
+    "players", "alive_players", "dead_players", "current_phase", "round_number",
+    "global_status_effects", "public_announcements", "lobby_ready_players",
+    "evening_submitted_players", "night_asleep_players", "cultist_kill_votes",
+    "cultist_kill_target", "dawn_active_players", "dawn_completed_actions",
+    "morning_ready_players", "voting_sub_phase", "voting_nominations",
+    "nominated_speakers", "current_speaker_index", "voters_ready_for_execution",
+    "voting_final_votes", "voting_abstainers", "apocalypse_vote_target",
+    "apocalypse_votes", "dusk_ready_players", "last_phase_start_time",
+    "desired_players_count", "game_setup_completed",
+))
+
 
 class Player:
     def __init__(self, player_id, name):
+        self.changed_fields = set()      # Tracked fields modified since GameState.flush_changes()
+        self.seen_values = {}            # Tracked field -> value at the last scan_changes()
+        self.private_dirty = True        # Cleared by whoever caches this player's private state
         self.player_id = player_id
         self.name = name
         self.score = 0
@@ -449,9 +1217,24 @@ class Player:
         self.voted_for = None
         self.nominated_players = []
         self.has_completed_dawn_action = False
+        self.status_expiry = None        # The game's StatusExpiryQueue, set by GameState.add_player
+        self.status_expiry_keys = {}     # effect -> key it is scheduled under in status_expiry
+
+    def mark_changed(self, name):
+        """For in-place edits the tracking cannot see, e.g. a value nested inside status_effects."""
+        self.changed_fields.add(name)
+        if name in PRIVATE_STATE_FIELDS:
+            self.private_dirty = True
+
+    def scan_changes(self):
+        """Picks up tracked attributes assigned since the last scan (see CHANGE TRACKING)."""
+        if _scan_tracked_fields(self, PLAYER_TRACKED_FIELDS, PRIVATE_STATE_FIELDS):
+            self.private_dirty = True
 
     def add_card(self, card):
-        self.hand.append(card)
+        list.append(self.hand, card) # Reported inline: this runs for every card dealt
+        self.changed_fields.add("hand")
+        self.private_dirty = True
 
     def remove_card_by_id(self, card_id):
         for i, card in enumerate(self.hand):
@@ -465,24 +1248,20 @@ class Player:
                 return card
         return None
 
-    def apply_status_effect(self, effect_type, duration_or_data):
+    def apply_status_effect(self, effect_type, duration_or_data, expires_at_round=None):
+        """
+        An integer value is a duration in sundowns; anything else is effect data that
+        lasts until removed, or until `expires_at_round` if given.
+        """
         self.status_effects[effect_type] = duration_or_data
+        self.status_expiry_keys.pop(effect_type, None)
+        if self.status_expiry is not None:
+            if expires_at_round is not None:
+                self.status_expiry.schedule_for_round(self, effect_type, expires_at_round)
+            elif isinstance(duration_or_data, int):
+                self.status_expiry.schedule(self, effect_type, duration_or_data)
         print(f"{self.name} now has {effect_type} with data: {duration_or_data}.")
 
-    def decrement_status_effects(self):
-        effects_that_expired = []
-        effects_to_remove = []
-        for effect, data in self.status_effects.items():
-            if isinstance(data, int):
-                self.status_effects[effect] -= 1
-                if self.status_effects[effect] <= 0:
-                    effects_to_remove.append(effect)
-        for effect in effects_to_remove:
-            del self.status_effects[effect]
-            effects_that_expired.append(effect)
-            print(f"DEBUG: {self.name}'s '{effect}' effect has worn off.")
-        return effects_that_expired
-
     def to_dict(self, include_hand=False):
         data = {
             "player_id": self.player_id,
@@ -498,6 +1277,13 @@ class Player:
             data["hand"] = [card.to_dict() for card in self.hand]
         return data
 
+    def to_public_dict(self):
+        """to_dict() as other players see it: only the status effects in PUBLIC_STATUS_EFFECTS."""
+        data = self.to_dict()
+        data["status_effects"] = {effect: value for effect, value in self.status_effects.items()
+                                  if effect in PUBLIC_STATUS_EFFECTS}
+        return data
+
     @staticmethod
     def from_dict(data):
         player = Player(data["player_id"], data["name"])
@@ -514,17 +1300,25 @@ class Player:
 
 class GameState:
     def __init__(self):
+        self.changed_fields = set()   # Tracked fields modified since the last flush_changes()
+        self.seen_values = {}         # Tracked field -> value at the last scan_changes()
         self.players = {}
         self.alive_players = []
         self.dead_players = []
         self.deck = Deck(is_dead_deck=False)
         self.dead_deck = Deck(is_dead_deck=True)
+        self.status_expiry = StatusExpiryQueue()
         self.current_phase = "Starting"
         self.round_number = 0
         self.global_status_effects = {}
         self.public_announcements = []
         self.lobby_ready_players = set() # ADDED: Track ready players in lobby
         self.death_log = []
+        self.card_play_log = []           # One entry per apply_card_effect() call, for the game archive
+        self.started_at = None            # When the first Evening began
+        self.victory_summary = None       # Built once, by build_victory_summary(), when the game ends
+        self.alive_role_counts = Counter() # role -> number of living players with it
+        self.pending_conversions = Counter() # new_role -> queued doppelganger_transform actions
         self.active_rituals = {}
         self.game_scores = {}
 
@@ -532,9 +1326,9 @@ class GameState:
         self.night_asleep_players = set()
         self.cultist_kill_votes = {}
         self.cultist_kill_target = None
-        self.pending_night_actions = []
+        self.pending_night_actions = PendingNightActions(self)
         self.delayed_actions = []
-        self.dawn_active_players = set()
+        self.dawn_active_players = set() # Change through set_dawn_active(): it shows in the player's private view
         self.dawn_completed_actions = set()
 
         self.morning_ready_players = set()
@@ -558,18 +1352,115 @@ class GameState:
         self.desired_players_count = 0
         self.game_setup_completed = False
 
+    def mark_changed(self, name):
+        """For in-place edits the tracking cannot see, e.g. a value nested inside voting_nominations."""
+        self.changed_fields.add(name)
+
+    def scan_changes(self):
+        """Picks up tracked attributes of the game and its players assigned since the last scan."""
+        _scan_tracked_fields(self, GAME_TRACKED_FIELDS, ())
+        for player in self.players.values():
+            player.scan_changes()
+
+    def has_changes(self):
+        self.scan_changes()
+        return bool(self.changed_fields) or any(player.changed_fields for player in self.players.values())
+
+    def flush_changes(self):
+        """
+        Returns (changed_fields, changed_players) accumulated since the previous call and starts a
+        new change set. changed_players maps player_id -> set of that player's modified fields.
+        """
+        self.scan_changes()
+        fields, self.changed_fields = self.changed_fields, set()
+        players = {}
+        for player_id, player in self.players.items():
+            if player.changed_fields:
+                players[player_id], player.changed_fields = player.changed_fields, set()
+        return fields, players
+
     def add_player(self, player_id, name):
         if player_id not in self.players:
             player = Player(player_id, name)
+            player.status_expiry = self.status_expiry
             self.players[player_id] = player
             self.alive_players.append(player_id)
+            self.alive_role_counts[player.role] += 1
             print(f"Player {name} ({player_id}) joined.")
             return True
         return False
 
+    def remove_player(self, player_id):
+        player = self.players.pop(player_id, None)
+        if player is None:
+            return None
+        if player.is_alive:
+            self.alive_role_counts[player.role] -= 1
+        if player_id in self.alive_players:
+            self.alive_players.remove(player_id)
+        if player_id in self.dead_players:
+            self.dead_players.remove(player_id)
+        return player
+
+    # --- Role / life-state changes ---
+    # Everything that changes a player's role or is_alive goes through these so
+    # alive_role_counts stays in step and is_game_over() never has to recount.
+
+    def set_player_role(self, player_id, role):
+        player = self.players[player_id]
+        if player.is_alive:
+            self.alive_role_counts[player.role] -= 1
+            self.alive_role_counts[role] += 1
+        player.role = role
+
+    def mark_player_dead(self, player_id):
+        player = self.players[player_id]
+        if player.is_alive:
+            player.is_alive = False
+            self.alive_role_counts[player.role] -= 1
+            self.status_expiry.pause(player)
+        if player_id in self.alive_players:
+            self.alive_players.remove(player_id)
+        if player_id not in self.dead_players:
+            self.dead_players.append(player_id)
+
+    def mark_player_alive(self, player_id):
+        player = self.players[player_id]
+        if not player.is_alive:
+            player.is_alive = True
+            self.alive_role_counts[player.role] += 1
+            self.status_expiry.resume(player)
+        if player_id in self.dead_players:
+            self.dead_players.remove(player_id)
+        if player_id not in self.alive_players:
+            self.alive_players.append(player_id)
+
+    def add_delayed_action(self, action):
+        self.delayed_actions.append(action)
+        if action['type'] == 'doppelganger_transform':
+            self.pending_conversions[action['new_role']] += 1
+
+    def remove_delayed_action(self, action):
+        self.delayed_actions.remove(action)
+        if action['type'] == 'doppelganger_transform':
+            self.pending_conversions[action['new_role']] -= 1
+
     def get_player(self, player_id):
         return self.players.get(player_id)
 
+    def mark_private_dirty(self, player_id):
+        player = self.players.get(player_id)
+        if player is not None:
+            player.private_dirty = True
+
+    def set_dawn_active(self, player_id, active):
+        """Adds or removes player_id from dawn_active_players and refreshes their private view."""
+        if active:
+            self.dawn_active_players.add(player_id)
+        else:
+            self.dawn_active_players.discard(player_id)
+        self.mark_private_dirty(player_id)
+
     def get_player_by_name(self, player_name):
         for player in self.players.values():
             if player.name == player_name:
@@ -583,92 +1474,65 @@ class GameState:
         return [self.players[pid].name for pid in self.dead_players]
 
     def is_game_over(self):
-        num_villagers_alive = sum(1 for pid in self.alive_players if self.players[pid].role == "Villager")
-        num_cultists_alive = sum(1 for pid in self.alive_players if self.players[pid].role == "Cultist")
+        num_villagers_alive = self.alive_role_counts["Villager"]
+        num_cultists_alive = self.alive_role_counts["Cultist"]
 
         if num_cultists_alive == 0:
             # --- START OF FIX ---
             # Check if a Doppelgänger is about to become a Cultist.
             # If so, the game is NOT over yet!
-            pending_cultist_conversions = any(
-                action['type'] == 'doppelganger_transform' and action['new_role'] == 'Cultist'
-                for action in self.delayed_actions
-            )
-            
-            if pending_cultist_conversions:
+            if self.pending_conversions["Cultist"] > 0:
                 print("[GAME_OVER_CHECK] Game over averted: A Doppelgänger is pending conversion to Cultist.")
                 return False, None # The game is not over
             # --- END OF FIX ---
-            message = "All Cultists have been eliminated!"
-            
-            # Find all dead cultists in the log
-            cultist_deaths = [d for d in self.death_log if d['role'] == 'Cultist']
-            
-            death_summaries = []
-            for death in cultist_deaths:
-                # Clean up the 'source' text to be more readable
-                source_text = death['source'].lower()
-                if source_text in ['execution', 'voting']:
-                    source_text = 'by voting'
-                elif source_text == 'burning':
-                    source_text = 'by burning'
-                elif source_text == 'cultists':
-                    source_text = 'by Cultists'
-                elif source_text == 'harbinger of doom':
-                    source_text = 'by the Harbinger of Doom'
-                elif source_text == 'compulsion':
-                    source_text = 'by a failed Compulsion'
-                else:
-                    source_text = f"by {death['source']}" # Default for other sources
-                
-                summary = f"Player {death['name']} was killed {source_text} during Round {death['round']}."
-                death_summaries.append(summary)
-            
-            if death_summaries:
-                message += " " + " ".join(death_summaries)
-            
-            message += " Villagers win!"
-            #self.public_announcements.append(message)
             return True, "Villager"
         if num_villagers_alive <= num_cultists_alive:
-            # --- START OF FIX ---
-            message = "Cultists outnumber Villagers!"
-            
-            # Find all dead villagers in the log
-            villager_deaths = [d for d in self.death_log if d['role'] == 'Villager']
-            
-            death_summaries = []
-            for death in villager_deaths:
-                # Clean up the 'source' text to be more readable
-                source_text = death['source'].lower()
-                if source_text in ['execution', 'voting']:
-                    source_text = 'by voting'
-                elif source_text == 'burning':
-                    source_text = 'by burning'
-                elif source_text == 'cultists':
-                    source_text = 'by Cultists'
-                elif source_text == 'harbinger of doom':
-                    source_text = 'by the Harbinger of Doom'
-                elif source_text == 'compulsion':
-                    source_text = 'by a failed Compulsion'
-                else:
-                    source_text = f"by {death['source']}" # Default for other sources
-                
-                summary = f"Player {death['name']} was killed {source_text} during Round {death['round']}."
-                death_summaries.append(summary)
-            
-            if death_summaries:
-                message += " " + " ".join(death_summaries)
-            
-            message += " Cultists win!"
-            #self.public_announcements.append(message)
-            # --- END OF FIX ---
             return True, "Cultist"
 # --- START OF FIX ---
         # If neither win condition was met, the game is not over.
         return False, None
         # --- END OF FIX ---
 
+    def build_victory_summary(self, winner):
+        """
+        Builds (once) the end-of-game message listing how the losing side died.
+        Kept out of is_game_over(), which runs after every phase change.
+        """
+        if self.victory_summary is not None:
+            return self.victory_summary
+        if winner == "Villager":
+            message = "All Cultists have been eliminated!"
+            losing_role = "Cultist"
+        else:
+            message = "Cultists outnumber Villagers!"
+            losing_role = "Villager"
+
+        death_summaries = []
+        for death in self.death_log:
+            if death['role'] != losing_role:
+                continue
+            # Clean up the 'source' text to be more readable
+            source_text = death['source'].lower()
+            if source_text in ['execution', 'voting']:
+                source_text = 'by voting'
+            elif source_text == 'burning':
+                source_text = 'by burning'
+            elif source_text == 'cultists':
+                source_text = 'by Cultists'
+            elif source_text == 'harbinger of doom':
+                source_text = 'by the Harbinger of Doom'
+            elif source_text == 'compulsion':
+                source_text = 'by a failed Compulsion'
+            else:
+                source_text = f"by {death['source']}" # Default for other sources
+            death_summaries.append(f"Player {death['name']} was killed {source_text} during Round {death['round']}.")
+
+        if death_summaries:
+            message += " " + " ".join(death_summaries)
+        message += f" {winner}s win!"
+        self.victory_summary = message
+        return message
+
     def advance_phase(self):
         if self.current_phase != "Night" and self.current_phase != "GameOver" and self.current_phase != "Voting":
             self.public_announcements = []
@@ -697,8 +1561,7 @@ class GameState:
         elif self.current_phase == "ApocalypseVote":
             self.current_phase = "Night"
             self.public_announcements.append("The vote is over. Night has fallen. All players must now close their eyes and sleep. Once the bell tolls three times, the Cultists may open their eyes! Villagers may not open their eyes until they hear birds chirping.")
-            for pid in self.players:
-                self.players[pid].decrement_status_effects()
+            self.status_expiry.expire()
             for pid in self.players: self.players[pid].is_asleep = False
             self.night_asleep_players.clear()
             self.cultist_kill_votes.clear()
@@ -729,13 +1592,10 @@ class GameState:
             self.dusk_ready_players.clear()
         elif self.current_phase == "Dusk":
             print(f"\n[PHASE_DEBUG] Advancing from Dusk to Evening (Sundown Occurring in Round {self.round_number})")
-            for player in self.players.values():
-                if 'divine_protection' in player.status_effects:
-                    effect_data = player.status_effects['divine_protection']
-                    if isinstance(effect_data, dict) and effect_data.get('applied_in_round', -1) < self.round_number:
-                        del player.status_effects['divine_protection']
-                        self.public_announcements.append(f"The divine protection on {player.name} has faded with the setting sun.")
-                        print(f"[EFFECT] Divine Protection expired for {player.name} at the start of Evening, Round {self.round_number}")
+            for player, effect in self.status_expiry.expire_rounds(self.round_number):
+                if effect == 'divine_protection':
+                    self.public_announcements.append(f"The divine protection on {player.name} has faded with the setting sun.")
+                    print(f"[EFFECT] Divine Protection expired for {player.name} at the start of Evening, Round {self.round_number}")
             self.current_phase = "Evening"
             self.last_phase_start_time = time.time() 
             self.public_announcements.append("It is now Evening. Play your cards or click 'Confirm Cards' when you are done.")
@@ -749,68 +1609,150 @@ class GameState:
             self.current_phase = "GameOver"
             self.public_announcements.append(f"Game Over! {winner} win!")
 
-    def get_public_game_state(self):
-        # --- START OF FIX ---
-        
-        def get_safe_name(pid):
-            """Helper to get player name or return a placeholder if player disconnected."""
-            player = self.players.get(pid)
-            return player.name if player else f"Player({pid[:4]})"
-
-        cultist_votes_by_name = {
-            get_safe_name(voter_id): get_safe_name(target_id)
-            for voter_id, target_id in self.cultist_kill_votes.items()
-            # No need for 'if in self.players' here, get_safe_name handles it
-        }
-        
-        public_nominations = {}
-        for nominator_id, nominated_ids in self.voting_nominations.items():
-            nominator_name = get_safe_name(nominator_id)
-            nominated_names = [get_safe_name(nid) for nid in nominated_ids]
-            public_nominations[nominator_name] = nominated_names
-        
-        # Filter out disconnected players from these lists
-        safe_nominated_speakers = [pid for pid in self.nominated_speakers if pid in self.players]
-        
-        current_speaker_name = None
-        if (self.current_speaker_index != -1 and 
-            safe_nominated_speakers and 
-            self.current_speaker_index < len(safe_nominated_speakers)):
-            speaker_id = safe_nominated_speakers[self.current_speaker_index]
-            current_speaker_name = get_safe_name(speaker_id)
-
-        safe_final_votes = {
-            get_safe_name(voter_id): get_safe_name(target_id)
-            for voter_id, target_id in self.voting_final_votes.items()
-        }
+    def get_safe_name(self, pid):
+        """Player name, or a placeholder if the player disconnected."""
+        player = self.players.get(pid)
+        return player.name if player else f"Player({pid[:4]})"
+
+    def get_public_game_state(self, fields=None):
+        """
+        Builds the shared game state. `fields` limits it to those keys (see
+        PUBLIC_STATE_FIELDS and get_state_projection); by default every field is built.
+        """
+        if fields is None:
+            fields = PUBLIC_STATE_FIELDS
+        return {name: PUBLIC_STATE_FIELDS[name](self) for name in fields}
 
-        return {
-            "current_phase": self.current_phase, "round_number": self.round_number, "global_status_effects": self.global_status_effects, "public_announcements": self.public_announcements,
-            "lobby_ready_count": len(self.lobby_ready_players),
-            "lobby_ready_players": list(self.lobby_ready_players),
-            "evening_submitted_count": len(self.evening_submitted_players), "night_asleep_count": len(self.night_asleep_players), "morning_ready_count": len(self.morning_ready_players),
-            "voting_sub_phase": self.voting_sub_phase, "voting_nominations": public_nominations, 
-            "nominated_speakers": [get_safe_name(pid) for pid in safe_nominated_speakers],
-            "current_speaker": current_speaker_name,
-            "voters_ready_for_execution_count": len(self.voters_ready_for_execution), 
-            "voting_final_votes": safe_final_votes,
-            "voting_abstainers_count": len(self.voting_abstainers),
-            "dusk_ready_count": len(self.dusk_ready_players), 
-            "apocalypse_vote_target": get_safe_name(self.apocalypse_vote_target) if self.apocalypse_vote_target else None, 
-            "apocalypse_votes": self.apocalypse_votes,
-            "last_phase_start_time": self.last_phase_start_time, "dawn_active_players_count": len(self.dawn_active_players), "dawn_completed_actions_count": len(self.dawn_completed_actions),
-            "cultist_kill_votes": cultist_votes_by_name, 
-            "cultist_kill_target": get_safe_name(self.cultist_kill_target) if self.cultist_kill_target else None,
-        }
-        # --- END OF FIX ---
     def get_player_private_state(self, player_id):
         player = self.players[player_id]
         return {
-            "player_id": player.player_id, "name": player.name, "role": player.role, "is_alive": player.is_alive, "hand": [card.to_dict() for card in player.hand], "status_effects": player.status_effects,
+            "player_id": player.player_id, "name": player.name, "role": player.role, "is_alive": player.is_alive, "hand": [card.to_ref() for card in player.hand], "status_effects": client_status_effects(player.status_effects),
             "has_completed_dawn_action": player.has_completed_dawn_action, "is_dawn_active_player": player.player_id in self.dawn_active_players,
-            "pending_night_actions_for_player": [ action for action in self.pending_night_actions if action["target_id"] == player_id and action["is_counterable"] ]
+            "pending_night_actions_for_player": self.pending_night_actions.counterable_for(player_id)
         }
 
+# --- STATE PROJECTIONS ---
+# Builders for every key of the public game state. Who receives which keys is
+# decided by the projection tables below, so nobody is sent fields that are
+# irrelevant to the current phase or hidden from their side. Comprehensions are
+# skipped when their source is empty, the usual case.
+
+def _public_nominations(gs):
+    if not gs.voting_nominations:
+        return {}
+    return {
+        gs.get_safe_name(nominator_id): [gs.get_safe_name(nid) for nid in nominated_ids]
+        for nominator_id, nominated_ids in gs.voting_nominations.items()
+    }
+
+def _current_speaker(gs):
+    if gs.current_speaker_index == -1:
+        return None
+    # Filter out disconnected players
+    safe_nominated_speakers = [pid for pid in gs.nominated_speakers if pid in gs.players]
+    if gs.current_speaker_index < len(safe_nominated_speakers):
+        return gs.get_safe_name(safe_nominated_speakers[gs.current_speaker_index])
+    return None
+
+PUBLIC_STATE_FIELDS = {
+    "current_phase": lambda gs: gs.current_phase,
+    "round_number": lambda gs: gs.round_number,
+    "global_status_effects": lambda gs: gs.global_status_effects,
+    "public_announcements": lambda gs: gs.public_announcements,
+    "last_phase_start_time": lambda gs: gs.last_phase_start_time,
+    "desired_players_count": lambda gs: gs.desired_players_count,
+    "game_setup_completed": lambda gs: gs.game_setup_completed,
+    "lobby_ready_count": lambda gs: len(gs.lobby_ready_players),
+    "lobby_ready_players": lambda gs: list(gs.lobby_ready_players),
+    "evening_submitted_count": lambda gs: len(gs.evening_submitted_players),
+    "night_asleep_count": lambda gs: len(gs.night_asleep_players),
+    "morning_ready_count": lambda gs: len(gs.morning_ready_players),
+    "voting_sub_phase": lambda gs: gs.voting_sub_phase,
+    "voting_nominations": _public_nominations,
+    "nominated_speakers": lambda gs: [gs.get_safe_name(pid) for pid in gs.nominated_speakers if pid in gs.players] if gs.nominated_speakers else [],
+    "current_speaker": _current_speaker,
+    "voters_ready_for_execution_count": lambda gs: len(gs.voters_ready_for_execution),
+    "voting_final_votes": lambda gs: {gs.get_safe_name(v): gs.get_safe_name(t) for v, t in gs.voting_final_votes.items()} if gs.voting_final_votes else {},
+    "voting_abstainers_count": lambda gs: len(gs.voting_abstainers),
+    "dusk_ready_count": lambda gs: len(gs.dusk_ready_players),
+    "apocalypse_vote_target": lambda gs: gs.get_safe_name(gs.apocalypse_vote_target) if gs.apocalypse_vote_target else None,
+    "apocalypse_votes": lambda gs: gs.apocalypse_votes,
+    "dawn_active_players_count": lambda gs: len(gs.dawn_active_players),
+    "dawn_completed_actions_count": lambda gs: len(gs.dawn_completed_actions),
+    "cultist_kill_votes": lambda gs: {gs.get_safe_name(v): gs.get_safe_name(t) for v, t in gs.cultist_kill_votes.items()} if gs.cultist_kill_votes else {},
+    "cultist_kill_target": lambda gs: gs.get_safe_name(gs.cultist_kill_target) if gs.cultist_kill_target else None,
+}
+
+# Status effects anyone may see on a player: those the client shows on other
+# players' rows. The rest (Hand of Glory, a pending Doppelganger, the Mark of
+# the Beast, Violent Delights, Lazarus, a Cultist's compulsion, ...) only ever
+# reach the player through their private state.
+PUBLIC_STATUS_EFFECTS = frozenset((
+    "eternal_winter", "silence", "delirium", "vote_restriction", "immolated",
+    "burning", "divine_protection", "harbinger_quest",
+))
+
+# The effect data the client reads from a player's own status effects. Every
+# other effect is sent as its duration, or as 1 if it carries data: the client
+# only checks which effects are present.
+CLIENT_STATUS_EFFECT_FIELDS = {"harbinger_quest": ("execute_at_round",)}
+
+def client_status_effects(effects):
+    """A player's status effects in the compact form their private state carries."""
+    compact = {}
+    for effect, value in effects.items():
+        if isinstance(value, dict):
+            fields = CLIENT_STATUS_EFFECT_FIELDS.get(effect)
+            value = {field: value[field] for field in fields if field in value} if fields else 1
+        compact[effect] = value
+    return compact
+
+# Who is looking: living Cultists, living non-Cultists, the dead, and sockets with no player.
+STATE_AUDIENCES = ("cultist", "villager", "dead", "spectator")
+
+# Sent to every audience in every phase.
+PROJECTION_BASE_FIELDS = (
+    "current_phase", "round_number", "global_status_effects", "public_announcements", "last_phase_start_time",
+)
+
+# Extra fields each phase needs, for every audience.
+PROJECTION_PHASE_FIELDS = {
+    "Lobby": ("desired_players_count", "game_setup_completed", "lobby_ready_count", "lobby_ready_players"),
+    "Evening": ("evening_submitted_count",),
+    "ApocalypseVote": ("apocalypse_vote_target", "apocalypse_votes"),
+    "Night": ("night_asleep_count",),
+    "Morning": ("morning_ready_count", "dawn_active_players_count", "dawn_completed_actions_count"),
+    "Voting": ("voting_sub_phase", "voting_nominations", "nominated_speakers", "current_speaker",
+               "voters_ready_for_execution_count", "voting_final_votes", "voting_abstainers_count"),
+    "Dusk": ("dusk_ready_count",),
+}
+
+# Hidden information, only for the audience in the phase listed.
+PROJECTION_AUDIENCE_FIELDS = {
+    ("cultist", "Night"): ("cultist_kill_votes", "cultist_kill_target"),
+}
+
+_projection_cache = {}
+
+def get_state_projection(audience, phase):
+    """Returns the tuple of public state fields `audience` should receive during `phase`."""
+    key = (audience, phase)
+    fields = _projection_cache.get(key)
+    if fields is None:
+        fields = (PROJECTION_BASE_FIELDS + PROJECTION_PHASE_FIELDS.get(phase, ())
+                  + PROJECTION_AUDIENCE_FIELDS.get(key, ()))
+        _projection_cache[key] = fields
+    return fields
+
+def audience_for(player):
+    """Maps a player (or None for a socket without one) to its projection audience."""
+    if player is None:
+        return "spectator"
+    if not player.is_alive:
+        return "dead"
+    return "cultist" if player.role == "Cultist" else "villager"
+
+
 # --- CONTRACTS ---
 
 CONTRACT_DEFINITIONS = {
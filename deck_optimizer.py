@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""Deck Optimizer (deck_optimizer.py) - searches DECK_COMPOSITION and the cultist counts for balance
+
+Usage:
+    python deck_optimizer.py                                    # search with the defaults
+    python deck_optimizer.py --player-counts 5 8 12 --target-rounds 5 --iterations 200
+    python deck_optimizer.py --resume                           # carry on from the checkpoint
+
+A candidate is a deck composition plus a Cultist count for each player count. It is
+scored by playing all-bot games with it: the server's own game code, driven by the
+bots in bots.py, one game per task in a process pool across every core. The score
+is the average over player counts of how far the Cultists' win rate is from
+--target-win-rate, plus LENGTH_WEIGHT times how far the average game length (in
+rounds) is from --target-rounds, relative to it. Games that hit the time limit count
+as unfinished and add their share to the score. Lower is better.
+
+Every candidate is played with the same game seeds, so two candidates differ by
+their composition and not by luck of the draw. Games are played in batches of
+--batch-games per player count, and a candidate stops early once it is clearly
+worse than the best so far (its score less twice its standard error is still above
+the best's score).
+
+The search is a hill climb: each iteration moves one card count by CARD_STEP or one
+Cultist count by one, and keeps the change if the candidate beats the best. It stops
+after --iterations, or --patience iterations in a row without an improvement.
+
+Progress is checkpointed after every candidate, so an interrupted search picks up
+where it left off with --resume. The recommendation is written to --output as JSON
+and printed as DECK_COMPOSITION and CULTIST_COUNTS tables to paste into
+card_game.py.
+
+The bots follow simple rules (see bots.py), and the recommendation is only as good as
+their play: treat it as a starting point for playtesting, not a final answer.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+
+import bots
+import card_game
+
+# --- Configuration Constants ---
+DEFAULT_PLAYER_COUNTS = [5, 7, 9, 12, 15]
+DEFAULT_TARGET_WIN_RATE = 0.5   # Cultist wins per game
+DEFAULT_TARGET_ROUNDS = 4
+DEFAULT_BATCH_GAMES = 16        # Games per player count in each batch
+DEFAULT_MAX_BATCHES = 4         # A candidate that is never stopped early plays this many batches
+DEFAULT_ITERATIONS = 100
+DEFAULT_PATIENCE = 30
+DEFAULT_CHECKPOINT = "deck_optimizer_checkpoint.json"
+DEFAULT_OUTPUT = "recommended_composition.json"
+LENGTH_WEIGHT = 0.5             # Weight of the game length error against the win rate error
+CARD_STEP = 10                  # How far one move changes a card count
+MIN_CARD_COUNT = 10             # Counts are tuned, not cards removed: every card stays in the deck
+CULTIST_MOVE_CHANCE = 0.25      # Share of moves that change a Cultist count instead of a card count
+GAME_TIME_LIMIT_SECONDS = 30    # Wall time before a game counts as unfinished
+TICK_SECONDS = 0.005            # How long an idle game waits for commands before running its timers
+CHECKPOINT_VERSION = 1
+
+# Set in each worker process before it imports the server: no archive, no event files,
+# no takeover timers, one bot thread per process and timers that fire immediately.
+WORKER_ENVIRONMENT = {
+    "GAME_ARCHIVE_PATH": "",
+    "EVENT_EXPORT_DIR": "",
+    "BOT_TAKEOVER_SECONDS": "0",
+    "BOT_WORKERS": "1",
+    "BOT_ROOM_SPEEDUP": "1000000",
+}
+
+server = None # The server module, imported by init_worker() in each worker process
+
+
+# --- Playing Games (worker processes) ---
+def init_worker():
+    global server
+    os.environ.update(WORKER_ENVIRONMENT)
+    sys.stdout = open(os.devnull, "w") # The server narrates every move
+    import server as server_module
+    server = server_module
+
+
+def play_game(task):
+    """Plays one all-bot game. Returns (player count, winning side or None if unfinished, rounds)."""
+    deck, cultists, num_players, seed = task
+    card_game.DECK_COMPOSITION.clear()
+    card_game.DECK_COMPOSITION.update(deck)
+    card_game.CULTIST_COUNTS = ((None, cultists),)
+    random.seed(seed)
+    bots.rng.seed(seed)
+    try:
+        with contextlib.suppress(queue.Empty):
+            while True:
+                server.command_queue.get_nowait() # Leftovers of the previous game
+        server.reset_game()
+        server.game_state.desired_players_count = num_players
+        for _ in range(num_players):
+            server.seat_bot()
+        server.schedule_bot_turns()
+        deadline = time.monotonic() + GAME_TIME_LIMIT_SECONDS
+        while server.game_state.current_phase != "GameOver" and time.monotonic() < deadline:
+            try:
+                command = server.command_queue.get(timeout=TICK_SECONDS)
+            except queue.Empty:
+                server.game_tick()
+                continue
+            server.run_command_batch(command)
+    except Exception as e:
+        print(f"[OPTIMIZER] Game with seed {seed} failed: {e}", file=sys.stderr)
+        return num_players, None, 0
+    state = server.game_state
+    if state.current_phase != "GameOver":
+        return num_players, None, state.round_number
+    _over, winner = state.is_game_over()
+    return num_players, winner, state.round_number
+
+
+# --- Scoring ---
+def score_results(results, target_win_rate, target_rounds):
+    """(score, standard error, per player count metrics) for {player count: [(winner, rounds)]}."""
+    errors = []
+    variances = []
+    metrics = {}
+    for num_players, games in sorted(results.items()):
+        finished = [(winner, rounds) for winner, rounds in games if winner is not None]
+        unfinished = 1 - len(finished) / len(games)
+        if not finished:
+            errors.append(1 + LENGTH_WEIGHT + unfinished)
+            variances.append(0.0)
+            metrics[str(num_players)] = {"games": len(games), "cultist_win_rate": None,
+                                         "average_rounds": None, "unfinished": round(unfinished, 3)}
+            continue
+        wins = sum(1 for winner, _rounds in finished if winner == "Cultist") / len(finished)
+        rounds = [rounds for _winner, rounds in finished]
+        average_rounds = sum(rounds) / len(rounds)
+        rounds_variance = sum((r - average_rounds) ** 2 for r in rounds) / max(len(rounds) - 1, 1)
+        errors.append(abs(wins - target_win_rate)
+                      + LENGTH_WEIGHT * abs(average_rounds - target_rounds) / target_rounds
+                      + unfinished)
+        variances.append((wins * (1 - wins)
+                          + (LENGTH_WEIGHT / target_rounds) ** 2 * rounds_variance) / len(finished))
+        metrics[str(num_players)] = {"games": len(games), "cultist_win_rate": round(wins, 3),
+                                     "average_rounds": round(average_rounds, 2), "unfinished": round(unfinished, 3)}
+    score = sum(errors) / len(errors)
+    stderr = math.sqrt(sum(variances)) / len(variances)
+    return score, stderr, metrics
+
+
+def evaluate(pool, candidate, args, best_score):
+    """Plays a candidate's games batch by batch. Returns (score, metrics, stopped early)."""
+    results = {num_players: [] for num_players in args.player_counts}
+    score, metrics = float("inf"), {}
+    for batch in range(args.max_batches):
+        tasks = []
+        for num_players in args.player_counts:
+            for game in range(args.batch_games):
+                seed = args.seed + (batch * args.batch_games + game) * 1000 + num_players
+                tasks.append((candidate["deck"], candidate["cultists"][str(num_players)], num_players, seed))
+        for num_players, winner, rounds in pool.imap_unordered(play_game, tasks):
+            results[num_players].append((winner, rounds))
+        score, stderr, metrics = score_results(results, args.target_win_rate, args.target_rounds)
+        if best_score is not None and score - 2 * stderr > best_score:
+            return score, metrics, True
+    return score, metrics, False
+
+
+# --- Search ---
+def initial_candidate(player_counts):
+    return {
+        "deck": dict(card_game.DECK_COMPOSITION),
+        "cultists": {str(n): card_game.cultist_count_for(n) for n in player_counts},
+    }
+
+
+def neighbour(candidate, rng):
+    """A copy of candidate with one card count or one Cultist count moved. Returns (candidate, move)."""
+    deck = dict(candidate["deck"])
+    cultists = dict(candidate["cultists"])
+    while True:
+        if rng.random() < CULTIST_MOVE_CHANCE:
+            num_players = rng.choice(sorted(cultists, key=int))
+            count = cultists[num_players] + rng.choice((-1, 1))
+            if 1 <= count <= (int(num_players) - 1) // 2: # Villagers must start out ahead
+                cultists[num_players] = count
+                return {"deck": deck, "cultists": cultists}, f"Cultists at {num_players} players -> {count}"
+        else:
+            card_name = rng.choice(sorted(deck))
+            count = deck[card_name] + rng.choice((-CARD_STEP, CARD_STEP))
+            if count >= MIN_CARD_COUNT:
+                deck[card_name] = count
+                return {"deck": deck, "cultists": cultists}, f"{card_name} -> {count}"
+
+
+def cultist_count_rows(cultists):
+    """The CULTIST_COUNTS rows for {player count: Cultists}; counts in between take the next row up."""
+    rows = []
+    for num_players in sorted(cultists, key=int):
+        if rows and rows[-1][1] == cultists[num_players]:
+            rows[-1] = (int(num_players), cultists[num_players])
+        else:
+            rows.append((int(num_players), cultists[num_players]))
+    rows[-1] = (None, rows[-1][1])
+    return rows
+
+
+# --- Checkpoints ---
+def save_checkpoint(path, checkpoint):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path) # Never leaves a half-written checkpoint behind
+
+
+def load_checkpoint(path, args):
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is from another version of the optimizer")
+    if checkpoint["settings"] != search_settings(args):
+        raise ValueError(f"{path} was made with different settings: {checkpoint['settings']}")
+    return checkpoint
+
+
+def search_settings(args):
+    """The arguments a checkpoint's scores depend on; resuming with others would compare apples and pears."""
+    return {
+        "player_counts": args.player_counts,
+        "target_win_rate": args.target_win_rate,
+        "target_rounds": args.target_rounds,
+        "batch_games": args.batch_games,
+        "max_batches": args.max_batches,
+        "seed": args.seed,
+    }
+
+
+def rng_state_to_json(state):
+    version, internal, gauss = state
+    return [version, list(internal), gauss]
+
+
+def rng_state_from_json(state):
+    version, internal, gauss = state
+    return version, tuple(internal), gauss
+
+
+# --- Output ---
+def print_recommendation(best):
+    print(f"\n[OPTIMIZER] Best score {best['score']:.4f}")
+    print(f"{'Players':>8} {'Cultists':>9} {'Cultist wins':>13} {'Avg rounds':>11} {'Unfinished':>11}")
+    for num_players, metrics in sorted(best["metrics"].items(), key=lambda item: int(item[0])):
+        win_rate = metrics["cultist_win_rate"]
+        rounds = metrics["average_rounds"]
+        print(f"{num_players:>8} {best['cultists'][num_players]:>9} "
+              f"{'-' if win_rate is None else f'{win_rate:.0%}':>13} "
+              f"{'-' if rounds is None else f'{rounds:.2f}':>11} {metrics['unfinished']:>11.0%}")
+    print("\nDECK_COMPOSITION = {")
+    for card_name, count in best["deck"].items():
+        print(f"    {json.dumps(card_name, ensure_ascii=False)}: {count},")
+    print("}\n\nCULTIST_COUNTS = (")
+    for max_players, cultists in cultist_count_rows(best["cultists"]):
+        print(f"    ({max_players}, {cultists}),")
+    print(")")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Searches DECK_COMPOSITION and the cultist counts for balanced games")
+    parser.add_argument("--player-counts", type=int, nargs="+", default=DEFAULT_PLAYER_COUNTS, help="player counts to balance for")
+    parser.add_argument("--target-win-rate", type=float, default=DEFAULT_TARGET_WIN_RATE, help="wanted share of games the Cultists win")
+    parser.add_argument("--target-rounds", type=float, default=DEFAULT_TARGET_ROUNDS, help="wanted average game length in rounds")
+    parser.add_argument("--batch-games", type=int, default=DEFAULT_BATCH_GAMES, help="games per player count in each batch")
+    parser.add_argument("--max-batches", type=int, default=DEFAULT_MAX_BATCHES, help="batches a candidate plays unless stopped early")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="candidates to try after the starting one")
+    parser.add_argument("--patience", type=int, default=DEFAULT_PATIENCE, help="stop after this many candidates in a row without an improvement")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="game processes to run in parallel")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the game seeds and the search")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="where progress is saved after every candidate")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where the recommended composition is written as JSON")
+    args = parser.parse_args(argv)
+    for num_players in args.player_counts:
+        if num_players < 3:
+            parser.error("player counts must be at least 3")
+
+    rng = random.Random(args.seed)
+    if args.resume:
+        try:
+            checkpoint = load_checkpoint(args.checkpoint, args)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[OPTIMIZER] Cannot resume: {e}")
+            return 1
+        rng.setstate(rng_state_from_json(checkpoint["rng_state"]))
+        print(f"[OPTIMIZER] Resuming at iteration {checkpoint['iteration']} (best score {checkpoint['best']['score']:.4f}).")
+    else:
+        checkpoint = {"version": CHECKPOINT_VERSION, "settings": search_settings(args),
+                      "iteration": 0, "since_improvement": 0, "best": None, "history": []}
+
+    print(f"[OPTIMIZER] Playing games for {args.player_counts} players on {args.workers} worker(s)...")
+    with multiprocessing.Pool(args.workers, initializer=init_worker) as pool:
+        if checkpoint["best"] is None:
+            best = initial_candidate(args.player_counts)
+            started = time.perf_counter()
+            best["score"], best["metrics"], _stopped = evaluate(pool, best, args, None)
+            print(f"[OPTIMIZER] Starting composition scores {best['score']:.4f} ({time.perf_counter() - started:.1f}s).")
+            checkpoint["best"] = best
+            checkpoint["rng_state"] = rng_state_to_json(rng.getstate())
+            save_checkpoint(args.checkpoint, checkpoint)
+
+        while checkpoint["iteration"] < args.iterations and checkpoint["since_improvement"] < args.patience:
+            best = checkpoint["best"]
+            candidate, move = neighbour(best, rng)
+            started = time.perf_counter()
+            score, metrics, stopped = evaluate(pool, candidate, args, best["score"])
+            checkpoint["iteration"] += 1
+            improved = not stopped and score < best["score"]
+            if improved:
+                candidate["score"], candidate["metrics"] = score, metrics
+                checkpoint["best"] = candidate
+                checkpoint["since_improvement"] = 0
+            else:
+                checkpoint["since_improvement"] += 1
+            checkpoint["history"].append({"iteration": checkpoint["iteration"], "move": move,
+                                          "score": round(score, 4), "stopped_early": stopped, "improved": improved})
+            checkpoint["rng_state"] = rng_state_to_json(rng.getstate())
+            save_checkpoint(args.checkpoint, checkpoint)
+            outcome = "new best" if improved else ("stopped early" if stopped else "no better")
+            print(f"[OPTIMIZER] {checkpoint['iteration']:>4}: {move}: {score:.4f}, {outcome} "
+                  f"({time.perf_counter() - started:.1f}s)")
+
+    best = checkpoint["best"]
+    recommendation = {
+        "score": best["score"],
+        "settings": search_settings(args),
+        "deck_composition": best["deck"],
+        "cultist_counts": cultist_count_rows(best["cultists"]),
+        "metrics": best["metrics"],
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(recommendation, f, indent=2, ensure_ascii=False)
+    print(f"[OPTIMIZER] Recommendation written to {args.output}")
+    print_recommendation(best)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
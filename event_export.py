@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Event Export (event_export.py) - game events streamed to rotating gzip NDJSON files
+
+server.py calls EventExporter.export() with one plain dict per game event (phase
+changes, card plays, votes, deaths, contract outcomes). export() never blocks:
+records go into a bounded queue, and when the queue is full the record is dropped
+and counted instead. A writer thread encodes the records and appends them, one JSON
+object per line, to a gzip file under the export directory. Under eventlet or gevent
+that thread is a green one, so the file work goes through the run_blocking callable
+server.py passes in, which runs it on a real OS thread.
+
+Files are rotated when they reach max_file_bytes (uncompressed) or are older than
+max_file_seconds. A file is written as "<name>.ndjson.gz.part" and renamed to
+"<name>.ndjson.gz" when it is closed, so anything matching *.ndjson.gz is complete
+and safe to load. Drops since the previous file are recorded at the top of the next
+one as {"type": "export_dropped", "counts": {event type: dropped}}.
+
+Every record carries "type", "t" (Unix time), "game_id" and "round". A game's end
+can be resolved more than once (several deaths at the same time), so the last
+"game_end" and "contract" records of a game_id are the final ones.
+
+The files are meant to be collected and analysed elsewhere; nothing in the server
+reads them back.
+"""
+
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+# --- Configuration Constants ---
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_FILE_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_FILE_SECONDS = 3600
+COMPRESS_LEVEL = 5           # Most of gzip's size win at a fraction of level 9's CPU
+IDLE_CHECK_SECONDS = 5       # How often an idle writer checks whether its file is due for rotation
+MAX_WRITE_BATCH = 500        # Most queued records written per run_blocking() call
+
+
+class EventExporter:
+    def __init__(self, directory, queue_size=DEFAULT_QUEUE_SIZE,
+                 max_file_bytes=DEFAULT_MAX_FILE_BYTES, max_file_seconds=DEFAULT_MAX_FILE_SECONDS,
+                 run_blocking=None):
+        self.directory = directory
+        # run_blocking(fn, *args) runs fn off the event loop and returns its result
+        self.run_blocking = run_blocking or (lambda fn, *args: fn(*args))
+        self.max_file_bytes = max_file_bytes
+        self.max_file_seconds = max_file_seconds
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.dropped = Counter()   # event type -> records dropped since the writer last took them
+        self.dropped_lock = threading.Lock()
+        self.unwritten_drops = Counter() # The writer's own: drops not yet recorded in a file
+        self.thread = None
+        self.file = None
+        self.file_path = None
+        self.file_opened_at = 0.0
+        self.file_bytes = 0
+        self.file_index = 0
+
+    def start(self):
+        if self.thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.thread = threading.Thread(target=self._writer, name="event-export", daemon=True)
+            self.thread.start()
+
+    def export(self, record):
+        """Queues one event record (a JSON-serialisable dict with a 'type'). Never blocks."""
+        try:
+            self.pending.put_nowait(record)
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped[record.get('type', 'unknown')] += 1
+
+    def close(self):
+        """Writes everything still queued, closes the current file and stops the writer."""
+        if self.thread is not None:
+            self.pending.put(None) # Blocks only if the queue is full, which the writer is draining
+            self.thread.join()
+            self.thread = None
+
+    def _writer(self):
+        while True:
+            try:
+                records = [self.pending.get(timeout=IDLE_CHECK_SECONDS)]
+            except queue.Empty:
+                records = []
+            while records and records[-1] is not None and len(records) < MAX_WRITE_BATCH:
+                try:
+                    records.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            # The drop counts are taken here, on the writer's own side of run_blocking, so
+            # the OS thread never touches a lock the exporting threads also hold.
+            with self.dropped_lock:
+                dropped, self.dropped = self.dropped, Counter()
+            if not self.run_blocking(self._write_records, records, dropped):
+                return
+
+    def _write_records(self, records, dropped):
+        """Writes a run of queued records, rotating the file as it goes. False once the stop marker (None) is reached."""
+        self.unwritten_drops.update(dropped)
+        for record in records or [False]:
+            if self.file is not None and (self.file_bytes >= self.max_file_bytes or
+                                          time.time() - self.file_opened_at >= self.max_file_seconds):
+                self._close_file()
+            if record is None:
+                self._close_file()
+                return False
+            if record is False:
+                continue
+            try:
+                if self.file is None:
+                    self._open_file()
+                line = (json.dumps(record, separators=(',', ':'), default=str) + "\n").encode('utf-8')
+                self.file.write(line)
+                self.file_bytes += len(line)
+            except (OSError, TypeError, ValueError) as e:
+                self.unwritten_drops[record.get('type', 'unknown')] += 1
+                print(f"[EXPORT] Could not write a '{record.get('type')}' event: {e}")
+        return True
+
+    def _open_file(self):
+        self.file_index += 1
+        name = time.strftime("events-%Y%m%d-%H%M%S", time.gmtime()) + f"-{os.getpid()}-{self.file_index}.ndjson.gz"
+        self.file_path = os.path.join(self.directory, name)
+        self.file = gzip.open(self.file_path + ".part", "wb", compresslevel=COMPRESS_LEVEL)
+        self.file_opened_at = time.time()
+        self.file_bytes = 0
+        counts = dict(self.unwritten_drops)
+        self.unwritten_drops.clear()
+        if counts:
+            print(f"[EXPORT] Dropped {sum(counts.values())} event(s) while the queue was full: {counts}")
+            line = json.dumps({"type": "export_dropped", "t": time.time(), "counts": counts}) + "\n"
+            self.file.write(line.encode('utf-8'))
+
+    def _close_file(self):
+        if self.file is None:
+            return
+        try:
+            self.file.close()
+            os.replace(self.file_path + ".part", self.file_path)
+            print(f"[EXPORT] Finished {os.path.basename(self.file_path)} ({self.file_bytes:,} bytes before compression).")
+        except OSError as e:
+            print(f"[EXPORT] Could not finish {self.file_path}: {e}")
+        self.file = None
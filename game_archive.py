@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""Game Archive (game_archive.py) - finished games kept in a local SQLite database
+
+server.py hands every finished game to GameArchive.submit() as a plain record
+(see snapshot_game). A single writer thread owns the database connection; it
+takes records off a queue and writes whatever has piled up in one transaction,
+so game handlers never wait on the disk. Under eventlet or gevent that thread is
+a green one, so the database work itself goes through the run_blocking callable
+server.py passes in, which runs it on a real OS thread.
+
+Re-submitting a game_id replaces that game's rows, which keeps the archive right
+when a game's end is resolved more than once (several deaths at the same time).
+An empty path turns the archive off: submit() drops records and reads find nothing.
+
+History queries go through the indexes on game_players(player_name) and
+games(ended_at), e.g.:
+
+    SELECT g.ended_at, g.winner, p.role, p.total_points
+    FROM game_players p JOIN games g ON g.game_id = p.game_id
+    WHERE p.player_name = ? ORDER BY g.ended_at DESC;
+
+Cumulative player statistics live in the player_*_stats tables. They are never
+recomputed from history: each game's rows are added to them in the transaction
+that writes the game (and subtracted first if the game is being replaced), so
+reading them costs the same however many games are archived.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from card_game import CONTRACT_DEFINITIONS
+
+# --- Configuration Constants ---
+MAX_WRITE_BATCH = 50  # Most records written in one transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id      TEXT PRIMARY KEY,
+    started_at   REAL,
+    ended_at     REAL NOT NULL,
+    winner       TEXT,
+    rounds       INTEGER NOT NULL,
+    player_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS game_players (
+    game_id         TEXT NOT NULL REFERENCES games(game_id),
+    player_name     TEXT NOT NULL,
+    player_id       TEXT NOT NULL,
+    role            TEXT,
+    survived        INTEGER NOT NULL,
+    contract_key    TEXT,
+    contract_status TEXT,
+    contract_json   TEXT,
+    team_points     INTEGER NOT NULL DEFAULT 0,
+    contract_points INTEGER NOT NULL DEFAULT 0,
+    total_points    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (game_id, player_name)
+);
+CREATE TABLE IF NOT EXISTS deaths (
+    game_id     TEXT NOT NULL REFERENCES games(game_id),
+    seq         INTEGER NOT NULL,
+    player_name TEXT NOT NULL,
+    role        TEXT,
+    source      TEXT,
+    round       INTEGER,
+    PRIMARY KEY (game_id, seq)
+);
+CREATE TABLE IF NOT EXISTS card_plays (
+    game_id      TEXT NOT NULL REFERENCES games(game_id),
+    seq          INTEGER NOT NULL,
+    round        INTEGER,
+    phase        TEXT,
+    player_name  TEXT NOT NULL,
+    card_name    TEXT NOT NULL,
+    effect_type  TEXT,
+    targets_json TEXT,
+    PRIMARY KEY (game_id, seq)
+);
+CREATE TABLE IF NOT EXISTS player_stats (
+    player_name  TEXT PRIMARY KEY,
+    games_played INTEGER NOT NULL DEFAULT 0,
+    wins         INTEGER NOT NULL DEFAULT 0,
+    total_points INTEGER NOT NULL DEFAULT 0,
+    deaths       INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS player_role_stats (
+    player_name TEXT NOT NULL,
+    role        TEXT NOT NULL,
+    games       INTEGER NOT NULL DEFAULT 0,
+    wins        INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_name, role)
+);
+CREATE TABLE IF NOT EXISTS player_contract_stats (
+    player_name  TEXT NOT NULL,
+    contract_key TEXT NOT NULL,
+    offered      INTEGER NOT NULL DEFAULT 0,
+    signed       INTEGER NOT NULL DEFAULT 0,
+    succeeded    INTEGER NOT NULL DEFAULT 0,
+    failed       INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_name, contract_key)
+);
+CREATE TABLE IF NOT EXISTS player_death_stats (
+    player_name TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    deaths      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_name, source)
+);
+CREATE INDEX IF NOT EXISTS idx_games_ended_at ON games(ended_at);
+CREATE INDEX IF NOT EXISTS idx_game_players_name ON game_players(player_name, game_id);
+CREATE INDEX IF NOT EXISTS idx_deaths_player_name ON deaths(player_name);
+CREATE INDEX IF NOT EXISTS idx_card_plays_player_name ON card_plays(player_name);
+CREATE INDEX IF NOT EXISTS idx_player_stats_points ON player_stats(total_points DESC);
+"""
+
+# Each statement adds (sign = 1) or removes (sign = -1) one archived game's contribution
+# to the statistics tables. Parameters: sign, game_id.
+AGGREGATE_STATEMENTS = (
+    """INSERT INTO player_stats (player_name, games_played, wins, total_points, deaths)
+       SELECT p.player_name, :sign, :sign * (p.role = g.winner), :sign * p.total_points,
+              :sign * (SELECT COUNT(*) FROM deaths d WHERE d.game_id = p.game_id AND d.player_name = p.player_name)
+       FROM game_players p JOIN games g ON g.game_id = p.game_id WHERE p.game_id = :game_id
+       ON CONFLICT (player_name) DO UPDATE SET
+           games_played = games_played + excluded.games_played, wins = wins + excluded.wins,
+           total_points = total_points + excluded.total_points, deaths = deaths + excluded.deaths""",
+    """INSERT INTO player_role_stats (player_name, role, games, wins)
+       SELECT p.player_name, p.role, :sign, :sign * (p.role = g.winner)
+       FROM game_players p JOIN games g ON g.game_id = p.game_id WHERE p.game_id = :game_id AND p.role IS NOT NULL
+       ON CONFLICT (player_name, role) DO UPDATE SET games = games + excluded.games, wins = wins + excluded.wins""",
+    """INSERT INTO player_contract_stats (player_name, contract_key, offered, signed, succeeded, failed)
+       SELECT player_name, contract_key, :sign, :sign * (contract_status = 'active'),
+              :sign * (contract_points > 0), :sign * (contract_points < 0)
+       FROM game_players WHERE game_id = :game_id AND contract_key IS NOT NULL
+       ON CONFLICT (player_name, contract_key) DO UPDATE SET
+           offered = offered + excluded.offered, signed = signed + excluded.signed,
+           succeeded = succeeded + excluded.succeeded, failed = failed + excluded.failed""",
+    """INSERT INTO player_death_stats (player_name, source, deaths)
+       SELECT player_name, COALESCE(source, 'Unknown'), :sign * COUNT(*)
+       FROM deaths WHERE game_id = :game_id GROUP BY player_name, COALESCE(source, 'Unknown')
+       ON CONFLICT (player_name, source) DO UPDATE SET deaths = deaths + excluded.deaths""",
+)
+
+ARCHIVE_TABLES = ("card_plays", "deaths", "game_players", "games") # Children first
+
+
+def snapshot_game(game_id, game_state, winner_role):
+    """
+    Copies what the archive keeps out of game_state into plain data, so the writer
+    thread never touches live game objects.
+    """
+    players = []
+    for p in game_state.players.values():
+        if not p or not p.name:
+            continue
+        contract = p.contract or {}
+        scores = game_state.game_scores.get(p.name, {})
+        players.append({
+            "player_name": p.name,
+            "player_id": p.player_id,
+            "role": p.role,
+            "survived": bool(p.is_alive),
+            "contract_key": contract.get('key'),
+            "contract_status": contract.get('status'),
+            "contract_json": json.dumps(dict(contract), default=str) if contract else None,
+            "team_points": scores.get('team', 0),
+            "contract_points": scores.get('contract', 0),
+            "total_points": scores.get('total', 0),
+        })
+    return {
+        "game_id": game_id,
+        "started_at": game_state.started_at,
+        "ended_at": time.time(),
+        "winner": winner_role,
+        "rounds": game_state.round_number,
+        "players": players,
+        "deaths": [dict(death) for death in game_state.death_log],
+        "card_plays": [dict(play) for play in game_state.card_play_log],
+    }
+
+
+class GameArchive:
+    def __init__(self, path, run_blocking=None):
+        self.path = path
+        # run_blocking(fn, *args) runs fn off the event loop and returns its result
+        self.run_blocking = run_blocking or (lambda fn, *args: fn(*args))
+        self.pending = queue.Queue()
+        self.thread = None
+        self.version = 0 # Goes up after every committed batch; readers key their caches on it
+
+    def start(self):
+        """Starts the writer thread. Records submitted before this wait in the queue."""
+        if self.thread is None and self.path:
+            self.thread = threading.Thread(target=self._writer, name="game-archive", daemon=True)
+            self.thread.start()
+
+    def submit(self, record):
+        """Queues a snapshot_game() record for writing. Never blocks."""
+        if self.path:
+            self.pending.put(record)
+
+    def close(self):
+        """Writes everything still queued, then stops the writer thread."""
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _connect(self):
+        # run_blocking may use a different OS thread each call; only this writer uses the
+        # connection, one call at a time, so sharing it across threads is safe.
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _writer(self):
+        conn = self.run_blocking(self._connect)
+        stopping = False
+        while not stopping:
+            batch = [self.pending.get()]
+            while len(batch) < MAX_WRITE_BATCH:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [record for record in batch if record is not None]
+            if not batch:
+                continue
+            # Nothing a record does may end this thread: a failed batch is retried one game
+            # at a time, so only the games that fail on their own are dropped.
+            try:
+                self.run_blocking(self._write_batch, conn, batch)
+            except Exception as e:
+                print(f"[ARCHIVE] Could not write {len(batch)} game(s) together ({e!r}); retrying one at a time.")
+                for record in batch:
+                    try:
+                        self.run_blocking(self._write_batch, conn, [record])
+                    except Exception as e:
+                        game_id = record.get("game_id") if isinstance(record, dict) else None
+                        print(f"[ARCHIVE] Dropped game {game_id}: {e!r}")
+        self.run_blocking(conn.close)
+
+    def _write_batch(self, conn, batch):
+        with conn: # One transaction for the whole batch
+            for record in batch:
+                self._write_game(conn, record)
+        self.version += 1
+        print(f"[ARCHIVE] Wrote {len(batch)} game(s) to {self.path}.")
+
+    @staticmethod
+    def _write_game(conn, record):
+        game_id = record["game_id"]
+        if conn.execute("SELECT 1 FROM games WHERE game_id = ?", (game_id,)).fetchone():
+            GameArchive._apply_aggregates(conn, game_id, -1) # Take the old copy back out of the statistics
+        for table in ARCHIVE_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE game_id = ?", (game_id,))
+        conn.execute(
+            "INSERT INTO games (game_id, started_at, ended_at, winner, rounds, player_count) VALUES (?, ?, ?, ?, ?, ?)",
+            (game_id, record["started_at"], record["ended_at"], record["winner"], record["rounds"], len(record["players"])))
+        conn.executemany(
+            "INSERT INTO game_players (game_id, player_name, player_id, role, survived, contract_key, contract_status, "
+            "contract_json, team_points, contract_points, total_points) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(game_id, p["player_name"], p["player_id"], p["role"], int(p["survived"]), p["contract_key"],
+              p["contract_status"], p["contract_json"], p["team_points"], p["contract_points"], p["total_points"])
+             for p in record["players"]])
+        conn.executemany(
+            "INSERT INTO deaths (game_id, seq, player_name, role, source, round) VALUES (?, ?, ?, ?, ?, ?)",
+            [(game_id, seq, d.get('name'), d.get('role'), d.get('source'), d.get('round'))
+             for seq, d in enumerate(record["deaths"])])
+        conn.executemany(
+            "INSERT INTO card_plays (game_id, seq, round, phase, player_name, card_name, effect_type, targets_json) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(game_id, seq, c.get('round'), c.get('phase'), c.get('player'), c.get('card'), c.get('effect_type'),
+              json.dumps(c.get('targets'), default=str))
+             for seq, c in enumerate(record["card_plays"])])
+        GameArchive._apply_aggregates(conn, game_id, 1)
+
+    @staticmethod
+    def _apply_aggregates(conn, game_id, sign):
+        for statement in AGGREGATE_STATEMENTS:
+            conn.execute(statement, {"sign": sign, "game_id": game_id})
+
+    # --- Reads (any thread) ---
+    def _read_connection(self):
+        """A read-only connection of the caller's own, or None if nothing has been archived yet."""
+        if not self.path:
+            return None
+        try:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        except sqlite3.OperationalError:
+            return None
+
+    def read_leaderboard(self, limit):
+        """The players with the most total points, best first."""
+        conn = self._read_connection()
+        if conn is None:
+            return []
+        try:
+            rows = conn.execute(
+                "SELECT player_name, games_played, wins, total_points, deaths FROM player_stats WHERE games_played > 0 "
+                "ORDER BY total_points DESC LIMIT ?", (limit,)).fetchall()
+        except sqlite3.OperationalError: # The writer has not created the schema yet
+            return []
+        finally:
+            conn.close()
+        return [{
+            "name": name,
+            "games_played": games,
+            "wins": wins,
+            "total_points": points,
+            "average_score": round(points / games, 2) if games else 0,
+            "deaths": deaths,
+        } for name, games, wins, points, deaths in rows]
+
+    def read_player_stats(self, player_name):
+        """One player's cumulative statistics, or None if they have no archived games."""
+        conn = self._read_connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT games_played, wins, total_points, deaths FROM player_stats WHERE player_name = ?",
+                (player_name,)).fetchone()
+            if row is None or not row[0]:
+                return None
+            roles = conn.execute(
+                "SELECT role, games, wins FROM player_role_stats WHERE player_name = ?", (player_name,)).fetchall()
+            contracts = dict((key, counts) for key, *counts in conn.execute(
+                "SELECT contract_key, offered, signed, succeeded, failed FROM player_contract_stats "
+                "WHERE player_name = ?", (player_name,)))
+            deaths = conn.execute(
+                "SELECT source, deaths FROM player_death_stats WHERE player_name = ? AND deaths > 0",
+                (player_name,)).fetchall()
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            conn.close()
+
+        games, wins, points, death_count = row
+        contract_stats = {}
+        for key, definition in CONTRACT_DEFINITIONS.items():
+            offered, signed, succeeded, failed = contracts.get(key, (0, 0, 0, 0))
+            contract_stats[key] = {
+                "name": definition.get('name', key),
+                "offered": offered,
+                "signed": signed,
+                "succeeded": succeeded,
+                "failed": failed,
+            }
+        return {
+            "name": player_name,
+            "games_played": games,
+            "wins": wins,
+            "total_points": points,
+            "average_score": round(points / games, 2),
+            "deaths": death_count,
+            "wins_by_role": {role: {"games": g, "wins": w} for role, g, w in roles if g},
+            "contracts": contract_stats,
+            "deaths_by_source": dict(deaths),
+        }
@@ -1,24 +1,121 @@
 # -*- coding: utf-8 -*-
 """Game Server (server.py) - Voting System Update"""
 import os
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit, join_room, leave_room
+
+# --- Async Server Mode ---
+# ASYNC_MODE picks the server the app runs on:
+#   threading - Werkzeug development server (the default, no extra packages)
+#   eventlet  - green threads + eventlet's WSGI server, for thousands of websockets
+#   gevent    - green threads + gevent's WSGI server (install gevent-websocket for websockets)
+# The green-thread modes have to monkey-patch the standard library before
+# anything else (Flask included) is imported.
+ASYNC_MODES = ("threading", "eventlet", "gevent")
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'threading').lower()
+if ASYNC_MODE not in ASYNC_MODES:
+    raise SystemExit(f"ASYNC_MODE must be one of {', '.join(ASYNC_MODES)}, not '{ASYNC_MODE}'.")
+if ASYNC_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+    from eventlet import tpool
+elif ASYNC_MODE == "gevent":
+    import gevent
+    from gevent import monkey
+    monkey.patch_all()
+
+def run_blocking(fn, *args):
+    """
+    Runs fn(*args) on a real OS thread and returns its result. Once patched, threading.Thread
+    and ThreadPoolExecutor only make green threads, which run on the event loop, so disk and
+    CPU work in them (SQLite commits, gzip, bot decisions) would stall every socket. In the
+    green-thread modes this hands fn to the event loop's pool of OS threads and yields until
+    it is done; under threading, where the caller already is an OS thread, it just calls fn.
+    """
+    if ASYNC_MODE == "eventlet":
+        return tpool.execute(fn, *args)
+    if ASYNC_MODE == "gevent":
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+from flask import Flask, Response, abort, render_template, request
+import flask_socketio
+from flask_socketio import SocketIO, join_room, leave_room
+import copy
+import functools
+import gzip
+import hashlib
+import json
+import mimetypes
+import pickle
+import queue
 import random
 import time
+import traceback
 import uuid
-from collections import defaultdict, Counter
+from collections import defaultdict, deque, Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from card_game import GameState, Card, Player, CARD_DEFINITIONS, CONTRACT_DEFINITIONS
+from card_game import (GameState, Card, Player, CARD_DEFINITIONS, CONTRACT_DEFINITIONS,
+                       EffectContext, register_effect, register_effect_pre_hook,
+                       dispatch_card_effect, missing_effect_handlers, EFFECT_TIMINGS,
+                       get_state_projection, audience_for, cultist_count_for, CARD_CATALOG)
+from game_archive import GameArchive, snapshot_game
+from event_export import EventExporter
+import bots
 
 # --- Flask & SocketIO Setup ---
+# Both ways of emitting go through these wrappers so handle_batch can hold a batch's
+# messages back until it knows whether the batch commits.
+class GameSocketIO(SocketIO):
+    def emit(self, event, *args, **kwargs):
+        if is_bot_sid(kwargs.get('room', kwargs.get('to'))):
+            return # Bots read the game directly; there is no socket behind a bot SID
+        if held_emits is not None:
+            held_emits.append((super().emit, event, args, kwargs))
+        else:
+            super().emit(event, *args, **kwargs)
+
+def emit(event, *args, **kwargs):
+    """flask_socketio.emit, held back while a batch is running."""
+    room = kwargs.get('room', kwargs.get('to'))
+    if is_bot_sid(room if room is not None or kwargs.get('broadcast') else request.sid):
+        return
+    if held_emits is not None:
+        held_emits.append((flask_socketio.emit, event, args, kwargs))
+    else:
+        flask_socketio.emit(event, *args, **kwargs)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key_here'
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = GameSocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
 
 # --- Global Game State ---
 game_state = None
 clients = {}             # Maps SID -> player_id
 player_name_to_id = {}   # Maps player name -> player_id
+private_state_cache = {} # Maps player_id -> last private state payload built for them
+private_state_sent = {}  # Maps SID -> private state payload last emitted to it
+public_state_cache = None # (connected player_ids, {projection fields: payload}) from the last broadcast
+spectators = set()       # SIDs watching the game from the spectator room
+sid_rooms = {}           # Maps SID -> role rooms (ROLE_ROOMS) it is currently in
+spectator_feed_pending = False  # The game changed since the spectator room was last updated
+spectator_feed_last_sent = 0.0
+command_queue = queue.Queue()   # Game commands waiting for the command worker
+broadcast_deferred = False      # True while the worker runs a batch; broadcasts wait for its end
+broadcast_requested = False     # A command in the current batch asked for a broadcast
+game_tick_pending = False       # A game_tick is already queued
+held_emits = None               # Emits held back while handle_batch runs, as (send, event, args, kwargs)
+rate_buckets = {}               # Maps SID -> {event: [tokens, last refill time]}
+dropped_events = Counter()      # Maps (SID, event) -> events refused by the rate limit since the last report
+player_outbox = {}              # Maps player_id -> deque of recent private messages, as (seq, event, payload)
+game_id = None                  # Names the current game's file if it is evicted
+last_activity = 0.0             # When a client last sent the current game a command
+game_over_since = None          # When the current game was first seen in GameOver
+evicted_games = OrderedDict()   # Maps game_id -> player_ids of a game evicted to disk, least recently used first
+bot_seats = {}                  # Maps bot SID -> that bot's decision state (see seat_bot)
+disconnected_since = {}         # Maps player_id -> when the game in progress first noticed them gone
+cultists_woken = None           # (game_id, round) the Cultists were last woken up for their kill vote
+server_started_at = time.time() # Start of the period the card effect timings cover
+bot_pool = None                 # Executor the bot decisions run in (see make_bot_pool), created on first use
 
 # --- Configuration Constants ---
 INITIAL_HAND_SIZE = 3
@@ -28,30 +125,403 @@ VOTING_SPEAKER_TIMER_SECONDS = 30
 VOTING_EXECUTION_TIMER_SECONDS = 30
 NIGHT_SLEEP_DELAY_SECONDS = 4
 ANNOUNCEMENT_DELAY_SECONDS = 5 # How long to show vote results
+SPECTATOR_ROOM = "spectators"
+# Role rooms let group messages go out as one emit. Kept in sync by sync_player_rooms().
+ROOM_CULTISTS = "cultists"   # Living Cultists
+ROOM_VILLAGERS = "villagers" # Living non-Cultists
+ROOM_DEAD = "dead"
+ROOM_ALIVE = "alive"
+ROOM_LOBBY = "lobby"         # Players not dealt a role yet
+ROLE_ROOMS = (ROOM_CULTISTS, ROOM_VILLAGERS, ROOM_DEAD, ROOM_ALIVE, ROOM_LOBBY)
+# The projection audience (see audience_for) of every player in each room. Together these
+# rooms hold each player's sockets exactly once, so broadcasts go out as one emit per room.
+ROOM_AUDIENCES = {ROOM_CULTISTS: "cultist", ROOM_VILLAGERS: "villager", ROOM_DEAD: "dead", ROOM_LOBBY: "villager"}
+# Spectators get at most one update per interval, however busy the game is.
+SPECTATOR_UPDATE_INTERVAL_SECONDS = float(os.environ.get('SPECTATOR_UPDATE_INTERVAL_SECONDS', 1.0))
+MAX_COMMAND_BATCH = 64  # Most commands the worker runs before it broadcasts
+MAX_BATCH_COMMANDS = 20 # Most commands one client 'batch' event may carry
+# Per-connection token buckets, as (events per second, burst). Events over the limit are
+# dropped before they reach the command queue. connect/disconnect are never limited.
+EVENT_RATE_LIMITS = {
+    'toggle_sleep': (2, 4),
+    'cultist_kill_vote': (2, 5),
+    'start_game_request': (0.5, 2),
+    'set_desired_player_count': (0.5, 2),
+    'player_name_submit': (1, 3),
+    'reset_game_request': (0.1, 1),
+    'batch': (2, 4),
+}
+DEFAULT_EVENT_RATE_LIMIT = (5, 10)
+PLAYER_OUTBOX_SIZE = 50 # Private messages kept per player for replay after a reconnect
+# Abandoned games are moved out of memory into EVICTED_GAME_DIR and brought back if one of
+# their players reconnects while the server is idle in an empty Lobby.
+GAME_IDLE_TIMEOUT_SECONDS = float(os.environ.get('GAME_IDLE_TIMEOUT_SECONDS', 3600))
+GAME_OVER_RETENTION_SECONDS = float(os.environ.get('GAME_OVER_RETENTION_SECONDS', 600))
+EVICTED_GAME_DIR = os.environ.get('EVICTED_GAME_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'evicted_games'))
+MAX_EVICTED_GAMES = int(os.environ.get('MAX_EVICTED_GAMES', 100)) # Oldest files are deleted beyond this
+UNLIMITED_EVENTS = ('connect', 'disconnect')
+# Server-side bots fill empty lobby seats on request and take over the seats of players who
+# stay away mid-game, so the people still playing are not left waiting on them.
+BOT_SID_PREFIX = "bot:"
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', 2)) # Decision threads under threading; see BlockingCallExecutor
+BOT_THINK_BUDGET_SECONDS = float(os.environ.get('BOT_THINK_BUDGET_SECONDS', 0.5)) # Past this a bot plays its fallback move
+BOT_TAKEOVER_SECONDS = float(os.environ.get('BOT_TAKEOVER_SECONDS', 60)) # 0 turns takeover off
+BOT_ROOM_SPEEDUP = float(os.environ.get('BOT_ROOM_SPEEDUP', 10)) # Timer speed-up while only bots are playing
+# An empty GAME_ARCHIVE_PATH turns the archive off (deck_optimizer.py's games are not kept).
+GAME_ARCHIVE_PATH = os.environ.get('GAME_ARCHIVE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_archive.sqlite3'))
+game_archive = GameArchive(GAME_ARCHIVE_PATH, run_blocking) # Finished games; written by its own thread, started in __main__
+LEADERBOARD_SIZE = 10
+STATS_CACHE_SIZE = 256 # Most player statistics responses kept in stats_cache
+STATS_CACHE_CONTROL = "public, max-age=15"
+# Game events are streamed to rotating gzip NDJSON files for offline analysis; an empty
+# EVENT_EXPORT_DIR turns the export off.
+EVENT_EXPORT_DIR = os.environ.get('EVENT_EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'event_export'))
+EVENT_EXPORT_QUEUE_SIZE = int(os.environ.get('EVENT_EXPORT_QUEUE_SIZE', 10000)) # Events past this are dropped, not waited on
+EVENT_EXPORT_MAX_FILE_BYTES = int(os.environ.get('EVENT_EXPORT_MAX_FILE_BYTES', 64 * 1024 * 1024))
+EVENT_EXPORT_MAX_FILE_SECONDS = float(os.environ.get('EVENT_EXPORT_MAX_FILE_SECONDS', 3600))
+event_exporter = (EventExporter(EVENT_EXPORT_DIR, EVENT_EXPORT_QUEUE_SIZE, EVENT_EXPORT_MAX_FILE_BYTES,
+                                EVENT_EXPORT_MAX_FILE_SECONDS, run_blocking) if EVENT_EXPORT_DIR else None)
 
 def reset_game():
     """Resets the entire game state to its initial condition."""
-    global game_state, clients, player_name_to_id
+    global game_state, clients, player_name_to_id, public_state_cache, game_id, last_activity, game_over_since
     game_state = GameState()
+    game_id = uuid.uuid4().hex[:12]
+    last_activity = time.time()
+    game_over_since = None
+    public_state_cache = None
+    private_state_cache.clear()
+    private_state_sent.clear()
+    player_outbox.clear()
+    bot_seats.clear()
+    disconnected_since.clear()
     game_state.desired_players_count = 0
     game_state.game_setup_completed = False
     game_state.current_phase = "Lobby"
+    for sid in list(sid_rooms):
+        clear_sid_rooms(sid)
     clients.clear()
     player_name_to_id.clear()
     print("[RESET] Game state reset to Lobby phase.")
 
+# --- Idle Game Eviction ---
+def evicted_game_path(evicted_id):
+    return os.path.join(EVICTED_GAME_DIR, f"{evicted_id}.pickle.gz")
+
+def evicted_index_path(evicted_id):
+    """The small JSON file next to an evicted game naming its players, read at startup."""
+    return os.path.join(EVICTED_GAME_DIR, f"{evicted_id}.players.json")
+
+def remove_evicted_files(evicted_id):
+    for path in (evicted_game_path(evicted_id), evicted_index_path(evicted_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def trim_evicted_games():
+    """Deletes the least recently evicted games beyond MAX_EVICTED_GAMES."""
+    while len(evicted_games) > MAX_EVICTED_GAMES:
+        oldest_id, _ = evicted_games.popitem(last=False)
+        remove_evicted_files(oldest_id)
+
+def load_evicted_games():
+    """
+    Rebuilds evicted_games from EVICTED_GAME_DIR after a restart, oldest eviction first,
+    so the games on disk can still be restored and still count towards MAX_EVICTED_GAMES.
+    A game without a readable index is read once to rebuild it; one that cannot be read
+    at all could never be restored, so it is deleted.
+    """
+    if not os.path.isdir(EVICTED_GAME_DIR):
+        return
+    found = []
+    for name in os.listdir(EVICTED_GAME_DIR):
+        if not name.endswith(".pickle.gz"):
+            continue
+        evicted_id = name[:-len(".pickle.gz")]
+        try:
+            with open(evicted_index_path(evicted_id), encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            try:
+                with gzip.open(evicted_game_path(evicted_id), "rb") as f:
+                    saved = pickle.load(f)
+                index = {"evicted_at": saved["evicted_at"], "player_ids": list(saved["game_state"].players)}
+            except Exception as e:
+                print(f"[EVICT] Deleting unreadable evicted game {evicted_id}: {e!r}")
+                remove_evicted_files(evicted_id)
+                continue
+        found.append((index["evicted_at"], evicted_id, set(index["player_ids"])))
+    for _, evicted_id, player_ids in sorted(found):
+        evicted_games[evicted_id] = player_ids
+    trim_evicted_games()
+    if evicted_games:
+        print(f"[EVICT] {len(evicted_games)} evicted game(s) on disk can be restored.")
+
+def evict_stale_game():
+    """
+    Frees the current game once it is past its retention timeout: a finished game after
+    GAME_OVER_RETENTION_SECONDS, and a game nobody is connected to after
+    GAME_IDLE_TIMEOUT_SECONDS without commands (that one is kept on disk).
+    """
+    global game_over_since
+    if not game_state.players:
+        return # An empty Lobby holds nothing worth keeping
+    now = time.time()
+    if game_state.current_phase == "GameOver":
+        if game_over_since is None:
+            game_over_since = now
+        if now - game_over_since >= GAME_OVER_RETENTION_SECONDS:
+            print(f"[EVICT] Game {game_id} finished {int(now - game_over_since)}s ago; clearing it for a new game.")
+            socketio.emit('game_has_reset', {"message": "The game is over. Reloading for a new game..."})
+            reset_game()
+    elif not human_clients() and now - last_activity >= GAME_IDLE_TIMEOUT_SECONDS:
+        evict_game()
+
+def evict_game():
+    """Writes the current game to EVICTED_GAME_DIR, then frees it by resetting to an empty Lobby."""
+    os.makedirs(EVICTED_GAME_DIR, exist_ok=True)
+    path = evicted_game_path(game_id)
+    evicted_at = time.time()
+    saved = {
+        "game_id": game_id,
+        "evicted_at": evicted_at,
+        "game_state": game_state,
+        "player_name_to_id": player_name_to_id,
+        "player_outbox": player_outbox,
+        # Which seats bots were minding; their in-flight decisions are not worth keeping
+        "bot_seats": {clients[sid]: {"name": seat["name"], "handled_seq": seat["handled_seq"]}
+                      for sid, seat in bot_seats.items() if sid in clients},
+    }
+    with gzip.open(path + ".tmp", "wb") as f:
+        pickle.dump(saved, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    index_path = evicted_index_path(game_id)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"evicted_at": evicted_at, "player_ids": list(game_state.players)}, f)
+    os.replace(index_path + ".tmp", index_path)
+    evicted_games[game_id] = set(game_state.players)
+    trim_evicted_games()
+    print(f"[EVICT] Game {game_id} ({len(game_state.players)} players) was abandoned; moved to {path}.")
+    reset_game()
+
+def rehydrate_game(pid):
+    """
+    If pid belongs to an evicted game and nobody is using the server, makes that game the
+    current one again. Timers resume where they stopped. Returns True if the game was restored.
+    """
+    global game_state, public_state_cache, game_id, last_activity, game_over_since
+    if game_state.players:
+        return False # Never replace a game people are in
+    evicted_id = next((g for g, player_ids in evicted_games.items() if pid in player_ids), None)
+    if evicted_id is None:
+        return False
+    del evicted_games[evicted_id]
+    try:
+        with gzip.open(evicted_game_path(evicted_id), "rb") as f:
+            saved = pickle.load(f)
+    except Exception as e: # Also a file written by an older version whose classes have changed
+        print(f"[EVICT] Could not restore game {evicted_id}: {e!r}")
+        return False
+    finally:
+        remove_evicted_files(evicted_id)
+
+    game_state = saved["game_state"]
+    game_state.last_phase_start_time += time.time() - saved["evicted_at"]
+    player_name_to_id.clear()
+    player_name_to_id.update(saved["player_name_to_id"])
+    player_outbox.clear()
+    player_outbox.update(saved["player_outbox"])
+    public_state_cache = None
+    private_state_cache.clear()
+    game_id = evicted_id
+    last_activity = time.time()
+    game_over_since = None
+    for bot_pid, seat in saved.get("bot_seats", {}).items():
+        if bot_pid != pid and bot_pid in game_state.players: # The returning player takes their own seat back
+            bot_seats[seat_bot(bot_pid)].update(seat)
+    print(f"[EVICT] Restored game {evicted_id} ({len(game_state.players)} players) for returning player {pid}.")
+    return True
+
+def after_commit(label, fn, *args):
+    """
+    Calls fn(*args) now or, while handle_batch runs, holds it back with the batch's emits so
+    it only happens if the batch commits. For side effects outside game_state (exports,
+    the archive, timers) that a rollback could not undo.
+    """
+    if held_emits is not None:
+        held_emits.append((lambda _label, *held_args: fn(*held_args), label, args, {}))
+    else:
+        fn(*args)
+
+# --- Event Export ---
+def export_event(event_type, **fields):
+    """
+    Sends one game event to the exporter. During a batch it is held back with the batch's
+    emits, so the events of a rolled-back batch are never exported.
+    """
+    if event_exporter is None:
+        return
+    record = {"type": event_type, "t": time.time(), "game_id": game_id, "round": game_state.round_number, **fields}
+    after_commit(event_type, event_exporter.export, record)
+
+# --- Game Command Queue ---
+# The game is owned by one command worker. Socket.IO handlers marked @game_command only
+# queue their event; the worker runs the queued commands one at a time, so no two of them
+# ever interleave mid-mutation, and broadcasts asked for during a batch go out once at its
+# end. Timers (game_loop, heartbeat_checker) and delayed follow-ups (schedule_command)
+# queue commands too, instead of touching the game from their own thread.
+
+def game_command(handler):
+    """Makes a Socket.IO handler queue its event and run on the command worker."""
+    @functools.wraps(handler)
+    def enqueue_event(*args):
+        sid = request.sid
+        event = request.event["message"]
+        if event == 'disconnect':
+            rate_buckets.pop(sid, None)
+        elif not admit_event(sid, event):
+            return
+        enqueue_command(handler, *args, sid=sid, namespace=request.namespace)
+    return enqueue_event
+
+def admit_event(sid, event):
+    """Token-bucket check for one incoming event from sid; False means drop it."""
+    if event in UNLIMITED_EVENTS:
+        return True
+    rate, burst = EVENT_RATE_LIMITS.get(event, DEFAULT_EVENT_RATE_LIMIT)
+    now = time.monotonic()
+    buckets = rate_buckets.setdefault(sid, {})
+    bucket = buckets.get(event)
+    if bucket is None:
+        bucket = buckets[event] = [burst, now]
+    tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    if tokens < 1:
+        bucket[0] = tokens
+        if not dropped_events[(sid, event)]:
+            print(f"[RATE_LIMIT] {sid} is sending '{event}' too fast; dropping the excess.")
+        dropped_events[(sid, event)] += 1
+        return False
+    bucket[0] = tokens - 1
+    return True
+
+def report_dropped_events():
+    """Logs and resets the rate-limit drop counters."""
+    if not dropped_events:
+        return
+    total = sum(dropped_events.values())
+    worst = ", ".join(f"{event} from {sid} x{count}" for (sid, event), count in dropped_events.most_common(5))
+    print(f"[RATE_LIMIT] Dropped {total} event(s) since the last report. Most: {worst}")
+    dropped_events.clear()
+
+def enqueue_command(fn, *args, sid=None, namespace='/'):
+    command_queue.put((fn, args, sid, namespace))
+
+def run_command(fn, args, sid, namespace):
+    """Runs one command in a request context for its sid, so emit() and join_room() work as in a handler."""
+    global last_activity
+    phase_before = (game_id, game_state.current_phase, game_state.round_number)
+    with app.test_request_context('/'):
+        request.sid = sid
+        request.namespace = namespace
+        try:
+            fn(*args)
+        except Exception:
+            print(f"[COMMAND] {fn.__name__} failed:")
+            traceback.print_exc()
+    # Every phase change (advance_phase, or a direct jump such as GameOver) happens inside a command.
+    if (game_id, game_state.current_phase, game_state.round_number) != phase_before and phase_before[0] == game_id:
+        export_event('phase', phase=game_state.current_phase, previous_phase=phase_before[1],
+                     alive=len(game_state.alive_players))
+    if sid is not None and not is_bot_sid(sid): # Only people count as activity, not timer ticks or bots
+        last_activity = time.time()
+
+def run_command_batch(first):
+    """Runs `first` plus whatever else is already queued (up to MAX_COMMAND_BATCH), then broadcasts once."""
+    global broadcast_deferred, broadcast_requested
+    batch = [first]
+    while len(batch) < MAX_COMMAND_BATCH:
+        try:
+            batch.append(command_queue.get_nowait())
+        except queue.Empty:
+            break
+    broadcast_deferred = True
+    try:
+        for command in batch:
+            run_command(*command)
+    finally:
+        broadcast_deferred = False
+    if broadcast_requested:
+        broadcast_requested = False
+        try:
+            broadcast_game_state()
+        except Exception:
+            print("[COMMAND] Broadcast after a batch failed:")
+            traceback.print_exc()
+    if bot_seats:
+        try:
+            schedule_bot_turns()
+        except Exception:
+            print("[BOT] Scheduling bot turns failed:")
+            traceback.print_exc()
+
+def command_worker():
+    """The single consumer of command_queue. Nothing a batch raises may end it."""
+    while True:
+        first = command_queue.get()
+        try:
+            run_command_batch(first)
+        except Exception:
+            print("[COMMAND] Command batch failed:")
+            traceback.print_exc()
+
+def schedule_command(delay, fn, *args):
+    """
+    Queues fn(*args) after `delay` seconds, unless the game has left the phase and round it
+    was scheduled in. The game is named by game_id rather than the GameState object, which
+    a rolled-back batch replaces; a timer started by a rolled-back batch never starts.
+    """
+    scheduled_in = (game_id, game_state.current_phase, game_state.round_number)
+    delay /= game_speed()
+    def wait_then_enqueue():
+        socketio.sleep(delay)
+        enqueue_command(run_if_still_current, scheduled_in, fn, *args)
+    after_commit(fn.__name__, socketio.start_background_task, wait_then_enqueue)
+
+def run_if_still_current(scheduled_in, fn, *args):
+    scheduled_game_id, phase, round_number = scheduled_in
+    if scheduled_game_id != game_id or phase != game_state.current_phase or round_number != game_state.round_number:
+        print(f"[COMMAND] Dropping delayed {fn.__name__}: the game has moved on.")
+        return
+    fn(*args)
+
+def advance_phase_and_broadcast():
+    game_state.advance_phase()
+    broadcast_game_state()
+
 # --- Socket.IO Event Handlers ---
 
 @socketio.on('connect')
+@game_command
 def handle_connect(auth):
     """Handles new client connections with improved reconnection logic."""
     sid = request.sid
     print(f"[CONNECT] SID={sid} auth={auth}")
 
+    # The card catalog goes first so the hands sent after it can be read. A client that
+    # already holds this version (cached in localStorage) is not sent it again.
+    if not auth or auth.get('card_catalog_version') != CARD_CATALOG["version"]:
+        emit('card_catalog', CARD_CATALOG, room=sid)
+
     # 1) Try to reconnect existing player
     pid = None
+    last_seq = None
     if auth:
         requested = auth.get('player_id')
+        last_seq = auth.get('last_seq')
+        if requested and requested not in game_state.players:
+            rehydrate_game(requested) # Brings their game back if it was evicted while they were away
         if requested and requested in game_state.players:
             pid = requested
             print(f"[RECONNECT] Player {game_state.players[pid].name} reconnecting...")
@@ -62,9 +532,11 @@ def handle_connect(auth):
         if old_sid and old_sid != sid:
             # Remove old SID mapping
             clients.pop(old_sid, None)
+            clear_sid_rooms(old_sid)
             print(f"[RECONNECT] Removed stale SID {old_sid} for {pid}")
         
         clients[sid] = pid
+        sync_sid_rooms(sid)
         join_room(sid)
         
         player = game_state.players[pid]
@@ -75,19 +547,18 @@ def handle_connect(auth):
             "round": game_state.round_number
         }, room=sid)
 
-        # Explicitly send private state immediately after reconnection
-        private_state = game_state.get_player_private_state(pid)
-        private_state["is_asleep"] = player.is_asleep
-        socketio.emit('private_player_state', private_state, room=sid)
-        print(f"[RECONNECT] Sent private state to {player.name}: {len(player.hand)} cards")
-        
+        # Catch this client up (state + the private messages it missed). Everyone else only
+        # needs the player lists that show them back; their private states are unchanged.
+        replayed = send_resume_state(sid, pid, last_seq)
+        print(f"[RECONNECT] Resumed {player.name}: {len(player.hand)} cards, {replayed} missed message(s) replayed")
         broadcast_game_state()
         return
 
     # 2) Handle new connections during active game
     if game_state.current_phase != "Lobby":
-        # Check if there are any disconnected players (in game_state.players but not in clients)
-        connected_pids = set(clients.values())
+        # Check if there are any disconnected players (in game_state.players but not in clients).
+        # A seat a bot is minding still counts as free: its player can take it back.
+        connected_pids = {p_id for s, p_id in clients.items() if not is_bot_sid(s)}
         disconnected_players = [
             p for p_id, p in game_state.players.items() 
             if p_id not in connected_pids
@@ -107,6 +578,7 @@ def handle_connect(auth):
             emit('game_in_progress', {
                 "message": "Game in progress. All players are connected. You are observing."
             }, room=sid)
+            join_spectators(sid)
         return
 
     # 3) New player joining lobby
@@ -115,6 +587,7 @@ def handle_connect(auth):
         temp_id = f"temp_player_{sid}"
         game_state.add_player(temp_id, f"Host")
         clients[sid] = temp_id
+        sync_sid_rooms(sid)
         join_room(sid)
         
         emit('initial_connect', {"player_id": temp_id}, room=sid)
@@ -139,6 +612,7 @@ def handle_connect(auth):
         )
         game_state.add_player(temp_id, f"Guest_{guest_num}")
         clients[sid] = temp_id
+        sync_sid_rooms(sid)
         join_room(sid)
         
         emit('initial_connect', {"player_id": temp_id}, room=sid)
@@ -147,6 +621,7 @@ def handle_connect(auth):
     broadcast_game_state()
 
 @socketio.on('reconnect_as_player')
+@game_command
 def handle_reconnect_as_player(data):
     """Handles manual reconnection when player selects from list."""
     sid = request.sid
@@ -155,14 +630,21 @@ def handle_reconnect_as_player(data):
     if not selected_pid or selected_pid not in game_state.players:
         emit('error', {"message": "Invalid player selection."}, room=sid)
         return
+
+    if sid in spectators:
+        # A watcher taking over a disconnected seat stops being a spectator.
+        spectators.discard(sid)
+        leave_room(SPECTATOR_ROOM)
     
     # Check if player is already connected from another session
     old_sid = next((s for s, p_id in clients.items() if p_id == selected_pid), None)
     if old_sid and old_sid != sid:
         clients.pop(old_sid, None)
+        clear_sid_rooms(old_sid)
         print(f"[RECONNECT] Removed stale SID {old_sid} for {selected_pid}")
     
     clients[sid] = selected_pid
+    sync_sid_rooms(sid)
     player = game_state.players[selected_pid]
     
     # Store the player_id in their client's localStorage
@@ -173,24 +655,24 @@ def handle_reconnect_as_player(data):
         "round": game_state.round_number
     }, room=sid)
 
-    # Explicitly send private state immediately after reconnection
-    private_state = game_state.get_player_private_state(selected_pid)
-    private_state["is_asleep"] = player.is_asleep
-    socketio.emit('private_player_state', private_state, room=sid)
-    print(f"[RECONNECT] Sent private state to {player.name}: {len(player.hand)} cards")
-    
-    
+    # Catch this client up, then show everyone else that the player is back (see handle_connect).
+    replayed = send_resume_state(sid, selected_pid, data.get('last_seq'))
+    print(f"[RECONNECT] Resumed {player.name}: {len(player.hand)} cards, {replayed} missed message(s) replayed")
     broadcast_game_state()
 
 @socketio.on('disconnect')
+@game_command
 def handle_disconnect(reason=None):
     """Handles client disconnection and cleans up."""
     sid = request.sid
     print(f"[DISCONNECT] SID={sid}")
+    spectators.discard(sid)
     if sid not in clients:
         return
 
     pid = clients.pop(sid) # Always remove the sid-pid mapping
+    sid_rooms.pop(sid, None) # Socket.IO drops a disconnected SID from its rooms itself
+    private_state_sent.pop(sid, None)
     player = game_state.get_player(pid)
     
     if not player:
@@ -200,11 +682,7 @@ def handle_disconnect(reason=None):
     # If the game is in the Lobby, it's safe to fully remove the player.
     if game_state.current_phase == "Lobby":
         print(f"[DISCONNECT] Removing player: {player.name} ({pid}) from Lobby.")
-        game_state.players.pop(pid, None)
-        if pid in game_state.alive_players:
-            game_state.alive_players.remove(pid)
-        if pid in game_state.dead_players:
-            game_state.dead_players.remove(pid)
+        game_state.remove_player(pid)
         player_name_to_id.pop(player.name, None)
 
         # Clean up all game-state lists
@@ -212,7 +690,7 @@ def handle_disconnect(reason=None):
         game_state.evening_submitted_players.discard(pid)
         game_state.night_asleep_players.discard(pid)
         game_state.cultist_kill_votes.pop(pid, None)
-        game_state.dawn_active_players.discard(pid)
+        game_state.set_dawn_active(pid, False)
         game_state.dawn_completed_actions.discard(pid)
         game_state.morning_ready_players.discard(pid)
         game_state.voting_nominations.pop(pid, None)
@@ -243,6 +721,7 @@ def handle_disconnect(reason=None):
 
 
 @socketio.on('set_desired_player_count')
+@game_command
 def handle_set_desired_player_count(data):
     """Handles host setting total number of players."""
     sid = request.sid
@@ -267,6 +746,7 @@ def handle_set_desired_player_count(data):
     broadcast_game_state()
 
 @socketio.on('player_name_submit')
+@game_command
 def handle_player_name_submit(data):
     """Handles player submitting their name."""
     sid = request.sid
@@ -300,6 +780,7 @@ def handle_player_name_submit(data):
     broadcast_game_state()
 
 @socketio.on('start_game_request')
+@game_command
 def handle_start_game_request(data=None):
     """MODIFIED: Handles a player clicking the 'Ready' button in the lobby."""
     sid = request.sid
@@ -323,6 +804,7 @@ def handle_start_game_request(data=None):
         start_game_logic()
 
 @socketio.on('submit_evening_cards')
+@game_command
 def handle_submit_evening_cards(data):
     """Handles Evening phase card submissions."""
     sid = request.sid
@@ -334,7 +816,7 @@ def handle_submit_evening_cards(data):
     if 'harbinger_quest' in player.status_effects:
         quest_data = player.status_effects['harbinger_quest']
         if game_state.round_number >= quest_data['execute_at_round']:
-            emit('prompt_harbinger_kill', room=sid)
+            send_to_player(pid, 'prompt_harbinger_kill')
             return
 
     if game_state.current_phase not in ["Evening", "Dusk"]:
@@ -409,24 +891,23 @@ def handle_submit_evening_cards(data):
         # --- START OF FIX ---
         # The logic to check for burn deaths now lives here, on the server,
         # right before the phase advances.
-        players_to_kill_from_burn = []
-        for p_id, p_obj in game_state.players.items():
-            if p_obj.is_alive:
-                expired_effects = p_obj.decrement_status_effects()
-                if 'burning' in expired_effects:
-                    players_to_kill_from_burn.append((p_id, p_obj.name))
+        # Only the effects that lapse this sundown come out of the expiry queue.
+        players_to_kill_from_burn = [
+            (p_obj.player_id, p_obj.name)
+            for p_obj, effect in game_state.status_expiry.expire(alive_only=True)
+            if effect == 'burning'
+        ]
         
         for p_id, p_name in players_to_kill_from_burn:
             game_state.public_announcements.append(f"{p_name} succumbed to their burns and died!")
             kill_player(p_id, "Burning")
         # --- END OF FIX ---
 
-        socketio.sleep(4)
-
-        game_state.advance_phase()
-        broadcast_game_state()
+        # The pause before the phase advances is a delayed command, so the queue keeps moving meanwhile.
+        schedule_command(4, advance_phase_and_broadcast)
 
 @socketio.on('play_special_card')
+@game_command
 def handle_play_special_card(data):
     sid = request.sid
     pid = clients.get(sid)
@@ -458,6 +939,7 @@ def handle_play_special_card(data):
         broadcast_game_state()
 
 @socketio.on('toggle_sleep')
+@game_command
 def handle_toggle_sleep(data=None):
     """Toggle sleep/wake during Night."""
     sid = request.sid
@@ -477,6 +959,7 @@ def handle_toggle_sleep(data=None):
     check_night_sleep_progress()
 
 @socketio.on('compulsion_response')
+@game_command
 def handle_compulsion_response(data):
     sid = request.sid
     pid = clients.get(sid)
@@ -518,6 +1001,7 @@ def handle_compulsion_response(data):
 
 
 @socketio.on('cultist_kill_vote')
+@game_command
 def handle_cultist_kill_vote(data):
     """Handles Cultist kill voting."""
     sid = request.sid
@@ -533,6 +1017,7 @@ def handle_cultist_kill_vote(data):
             emit('error', {"message": "Invalid target."}, room=sid)
             return
         game_state.cultist_kill_votes[pid] = tplayer.player_id
+        export_event('vote', kind='cultist_kill', voter=player.name, target=tplayer.name)
         emit('action_confirmed', {"message": f"Voted to kill {target_name}."}, room=sid)
         check_cultist_kill_consensus()
         broadcast_game_state()
@@ -540,6 +1025,7 @@ def handle_cultist_kill_vote(data):
         emit('error', {"message": "Not allowed."}, room=sid)
 
 @socketio.on('confirm_cultist_kill')
+@game_command
 def handle_confirm_cultist_kill(data=None):
     """Handles the final confirmation from Cultists to kill their target."""
     sid = request.sid
@@ -560,6 +1046,7 @@ def handle_confirm_cultist_kill(data=None):
             quest_data = cultist_player.status_effects['violent_delights_quest']
             if not quest_data.get('completed'):
                 quest_data['completed'] = True
+                cultist_player.mark_changed('status_effects')
                 print(f"[QUEST] {cultist_player.name} completed Violent Delights via cult kill.")
 
     kill_action = {
@@ -589,6 +1076,7 @@ def handle_confirm_cultist_kill(data=None):
         broadcast_game_state()
 
 @socketio.on('harbinger_kill')
+@game_command
 def handle_harbinger_kill(data):
     """Handles the kill submission from Harbinger of Doom."""
     sid = request.sid
@@ -632,6 +1120,7 @@ def handle_harbinger_kill(data):
     broadcast_game_state()
 
 @socketio.on('proceed_to_voting')
+@game_command
 def handle_proceed_to_voting(data=None):
     """Handles players ready in Morning."""
     sid = request.sid
@@ -652,6 +1141,7 @@ def handle_proceed_to_voting(data=None):
             broadcast_game_state()
 
 @socketio.on('apocalypse_vote_submit')
+@game_command
 def handle_apocalypse_vote_submit(data):
     """Handles players submitting their vote for The Apocalypse."""
     sid = request.sid
@@ -668,6 +1158,7 @@ def handle_apocalypse_vote_submit(data):
         return
 
     game_state.apocalypse_votes[pid] = vote
+    export_event('vote', kind='apocalypse', voter=player.name, target=game_state.get_safe_name(game_state.apocalypse_vote_target), vote=vote)
     print(f"[APOCALYPSE] {player.name} voted {vote}.")
 
     eligible_voters = [p_id for p_id in game_state.alive_players if p_id != game_state.apocalypse_vote_target]
@@ -679,6 +1170,7 @@ def handle_apocalypse_vote_submit(data):
     broadcast_game_state()
 
 @socketio.on('nominate_player')
+@game_command
 def handle_nominate_player(data):
     sid = request.sid
     pid = clients.get(sid)
@@ -702,10 +1194,12 @@ def handle_nominate_player(data):
             target_ids.append(target_player.player_id)
 
     game_state.voting_nominations[pid] = target_ids
+    export_event('vote', kind='nomination', voter=player.name, targets=[game_state.players[tid].name for tid in target_ids])
     print(f"[VOTE] {game_state.players[pid].name} nominated: {[game_state.players[tid].name for tid in target_ids]}")
     broadcast_game_state()
 
 @socketio.on('ready_for_execution_vote')
+@game_command
 def handle_ready_for_execution_vote(data=None):
     sid = request.sid
     pid = clients.get(sid)
@@ -722,6 +1216,7 @@ def handle_ready_for_execution_vote(data=None):
         broadcast_game_state()
 
 @socketio.on('submit_execution_vote')
+@game_command
 def handle_submit_execution_vote(data):
     sid = request.sid
     pid = clients.get(sid)
@@ -743,11 +1238,13 @@ def handle_submit_execution_vote(data):
 
     player.has_voted = True
     game_state.voting_final_votes[pid] = target_player.player_id
+    export_event('vote', kind='execution', voter=player.name, target=target_player.name)
     broadcast_game_state()
 
     check_execution_vote_completion()
 
 @socketio.on('abstain_execution_vote')
+@game_command
 def handle_abstain_execution_vote(data=None):
     sid = request.sid
     pid = clients.get(sid)
@@ -763,11 +1260,13 @@ def handle_abstain_execution_vote(data=None):
 
     player.has_voted = True
     game_state.voting_abstainers.add(pid)
+    export_event('vote', kind='execution', voter=player.name, target=None)
     broadcast_game_state()
 
     check_execution_vote_completion()
 
 @socketio.on('ready_for_evening')
+@game_command
 def handle_ready_for_evening(data=None):
     sid = request.sid
     pid = clients.get(sid)
@@ -783,6 +1282,7 @@ def handle_ready_for_evening(data=None):
         broadcast_game_state()
 
 @socketio.on('play_voting_card')
+@game_command
 def handle_play_voting_card(data):
     sid = request.sid
     pid = clients.get(sid)
@@ -824,6 +1324,7 @@ def handle_play_voting_card(data):
     broadcast_game_state()
 
 @socketio.on('play_any_phase_card')
+@game_command
 def handle_play_any_phase_card(data):
     sid = request.sid
     pid = clients.get(sid)
@@ -869,14 +1370,11 @@ def handle_play_any_phase_card(data):
         emit('action_confirmed', {"message": "You averted The Apocalypse!"}, room=sid)
         broadcast_game_state()
         
-        # 2. Pause so players can read the announcement
-        socketio.sleep(ANNOUNCEMENT_DELAY_SECONDS) 
-
-        # 3. NOW advance the phase (which will clear the announcement)
-        game_state.advance_phase()
-        
-        # 4. Broadcast the new 'Night' phase state
-        broadcast_game_state()
+        # 2. Pause so players can read the announcement, then
+        # 3. advance the phase (which will clear the announcement) and
+        # 4. broadcast the new 'Night' phase state.
+        # Skipped if the vote timer already moved the game on during the pause.
+        schedule_command(ANNOUNCEMENT_DELAY_SECONDS, advance_phase_and_broadcast)
         return # Skip the rest of the function
         
         # Manually advance the phase to Night (which is what resolve_apocalypse_vote would do)
@@ -910,6 +1408,7 @@ def handle_play_any_phase_card(data):
     apply_card_effect(pid, card, targets.get(card.id), sid)
 
 @socketio.on('submit_ritual_response')
+@game_command
 def handle_submit_ritual_response(data):
     """Handles an assistant's response to the Resurrection Ritual."""
     sid = request.sid
@@ -993,11 +1492,8 @@ def resolve_ritual(ritual_id):
         increment_contract_avoid(target_player.player_id)
         
         # Resurrect the player
-        target.is_alive = True
-        if target.player_id in game_state.dead_players:
-            game_state.dead_players.remove(target.player_id)
-        if target.player_id not in game_state.alive_players:
-            game_state.alive_players.append(target.player_id)
+        game_state.mark_player_alive(target.player_id)
+        sync_player_rooms(target.player_id)
             
         # Clear their hand and deal a new one (as per your rules)
         target.hand.clear()
@@ -1028,6 +1524,7 @@ def resolve_ritual(ritual_id):
 
 # --- ADD THIS NEW FUNCTION BELOW ---
 @socketio.on('reset_game_request')
+@game_command
 def handle_reset_game_request(data=None):
     """Handles a client request to reset the entire game."""
     sid = request.sid
@@ -1043,6 +1540,7 @@ def handle_reset_game_request(data=None):
 # --- END OF NEW FUNCTION ---
 
 @socketio.on('contract_response')
+@game_command
 def handle_contract_response(data):
     """Handles a player accepting or rejecting a contract."""
     sid = request.sid
@@ -1110,6 +1608,320 @@ def handle_contract_response(data):
         print(f"[CONTRACT] Cultist {player.name} tried to accept '{contract_key}', was auto-rejected.")
         emit('action_confirmed', {"message": "The contract crumbles to dust. You cannot accept it."}, room=sid)
 
+# --- Batched Commands ---
+# A 'batch' event carries an ordered list of {"event", "data"} commands. They are applied
+# all-or-nothing and answered with a single 'batch_result' and a single state broadcast.
+BATCH_HANDLERS = {
+    'submit_evening_cards': handle_submit_evening_cards,
+    'play_special_card': handle_play_special_card,
+    'toggle_sleep': handle_toggle_sleep,
+    'compulsion_response': handle_compulsion_response,
+    'cultist_kill_vote': handle_cultist_kill_vote,
+    'confirm_cultist_kill': handle_confirm_cultist_kill,
+    'harbinger_kill': handle_harbinger_kill,
+    'proceed_to_voting': handle_proceed_to_voting,
+    'apocalypse_vote_submit': handle_apocalypse_vote_submit,
+    'nominate_player': handle_nominate_player,
+    'ready_for_execution_vote': handle_ready_for_execution_vote,
+    'submit_execution_vote': handle_submit_execution_vote,
+    'abstain_execution_vote': handle_abstain_execution_vote,
+    'ready_for_evening': handle_ready_for_evening,
+    'play_voting_card': handle_play_voting_card,
+    'play_any_phase_card': handle_play_any_phase_card,
+    'submit_ritual_response': handle_submit_ritual_response,
+    'contract_response': handle_contract_response,
+}
+
+@socketio.on('batch')
+@game_command
+def handle_batch(data):
+    """
+    Runs each command's handler in order against the live game, holding back every emit.
+    If a handler raises or sends the client an 'error', the game is put back exactly as it
+    was and nothing held back is sent. Otherwise the held emits go out (minus the
+    per-command 'action_confirmed' notes, which batch_result replaces). Every command is
+    charged to its event's rate limit first; if one is refused, nothing runs.
+    """
+    global game_state, held_emits, public_state_cache, broadcast_requested
+    sid = request.sid
+    commands = (data or {}).get('commands')
+    if not isinstance(commands, list) or not 0 < len(commands) <= MAX_BATCH_COMMANDS:
+        emit('batch_result', {"ok": False, "failed_index": None, "message": f"A batch must carry 1 to {MAX_BATCH_COMMANDS} commands."}, room=sid)
+        return
+    for index, command in enumerate(commands):
+        event = command.get('event') if isinstance(command, dict) else None
+        if event in BATCH_HANDLERS and not admit_event(sid, event):
+            emit('batch_result', {"ok": False, "failed_index": index, "message": f"'{event}' is being sent too fast."}, room=sid)
+            return
+
+    snapshot = copy.deepcopy(game_state)
+    broadcast_was_requested = broadcast_requested # Earlier commands in this worker batch may want one
+    failure = None
+    held_emits = []
+    try:
+        for index, command in enumerate(commands):
+            event = command.get('event') if isinstance(command, dict) else None
+            handler = BATCH_HANDLERS.get(event)
+            if handler is None:
+                failure = (index, f"'{event}' cannot be sent in a batch.")
+                break
+            already_held = len(held_emits)
+            try:
+                handler.__wrapped__(command.get('data') or {})
+            except Exception as e:
+                traceback.print_exc()
+                failure = (index, f"'{event}' failed: {e}")
+                break
+            error = next((args[0].get('message') for _, sent, args, _ in held_emits[already_held:]
+                          if sent == 'error' and args and isinstance(args[0], dict)), None)
+            if error:
+                failure = (index, error)
+                break
+    finally:
+        batch_emits, held_emits = held_emits, None
+
+    if failure:
+        index, message = failure
+        # Roll back: the snapshot becomes the game, and everything derived from the
+        # discarded state (caches, room membership) is rebuilt from it.
+        game_state = snapshot
+        public_state_cache = None
+        private_state_cache.clear()
+        private_state_sent.clear()
+        for client_sid in list(clients):
+            sync_sid_rooms(client_sid)
+        broadcast_requested = broadcast_was_requested
+        print(f"[BATCH] Rejected batch of {len(commands)} from {sid} at command {index}: {message}")
+        emit('batch_result', {"ok": False, "failed_index": index, "message": message}, room=sid)
+        return
+
+    for send, event, args, kwargs in batch_emits:
+        if event == 'action_confirmed' and kwargs.get('room', sid) == sid:
+            continue
+        send(event, *args, **kwargs)
+    emit('batch_result', {"ok": True, "applied": len(commands)}, room=sid)
+    broadcast_game_state()
+
+# --- Bot Players ---
+# A bot is a seat in `clients` under a made-up SID starting with BOT_SID_PREFIX. Nothing is
+# ever sent to it; instead, after each command batch, schedule_bot_turns() builds every bot
+# a view of the game and, if that view changed, asks bots.decide() what to do in bot_pool.
+# The answer comes back through the command queue and is run through the same handlers
+# as a browser's events, with the bot's SID as request.sid.
+BOT_HANDLERS = dict(BATCH_HANDLERS,
+                    player_name_submit=handle_player_name_submit,
+                    start_game_request=handle_start_game_request)
+
+def is_bot_sid(sid):
+    return isinstance(sid, str) and sid.startswith(BOT_SID_PREFIX)
+
+def human_clients():
+    return [sid for sid in clients if not is_bot_sid(sid)]
+
+def game_speed():
+    """
+    How many times faster than normal the timers run: BOT_ROOM_SPEEDUP once a bot holds
+    every seat. A seat whose player is merely disconnected still counts as a person's.
+    """
+    if not bot_seats or not game_state.game_setup_completed:
+        return 1
+    bot_pids = {clients.get(sid) for sid in bot_seats}
+    if all(pid in bot_pids for pid in game_state.players):
+        return BOT_ROOM_SPEEDUP
+    return 1
+
+def seat_bot(pid=None):
+    """Puts a new bot in charge of pid, or of a new Lobby seat if pid is None. Returns its SID."""
+    sid = f"{BOT_SID_PREFIX}{uuid.uuid4().hex[:8]}"
+    taken = set(player_name_to_id) | {seat["name"] for seat in bot_seats.values()}
+    number = 1
+    while f"Bot {number}" in taken:
+        number += 1
+    if pid is None:
+        pid = f"temp_player_{sid}"
+        guest_num = 1 + sum(1 for p in game_state.players.values() if p.name.startswith("Guest_"))
+        game_state.add_player(pid, f"Guest_{guest_num}") # The bot names itself like anyone else
+    clients[sid] = pid
+    bot_seats[sid] = {
+        "name": f"Bot {number}",  # Used if the bot has to name itself in the Lobby
+        "view": None,             # The view of its last decision
+        "future": None,           # The decision being worked out, if any
+        "deadline": 0.0,
+        "token": 0,               # Bumped to disown a decision that ran out of time
+        "handled_seq": 0,         # Outbox messages up to this one have been answered
+    }
+    return sid
+
+def seat_bots_for_absent_players():
+    """Hands seats whose players have been gone BOT_TAKEOVER_SECONDS to bots, while people are still playing."""
+    if BOT_TAKEOVER_SECONDS <= 0 or game_state.current_phase == "GameOver":
+        return
+    if not human_clients():
+        return # Nobody is waiting on the absent players; idle eviction keeps the game for their return
+    now = time.time()
+    connected_pids = set(clients.values())
+    for pid, player in list(game_state.players.items()):
+        if pid in connected_pids:
+            disconnected_since.pop(pid, None)
+            continue
+        if now - disconnected_since.setdefault(pid, now) >= BOT_TAKEOVER_SECONDS:
+            disconnected_since.pop(pid)
+            seat_bot(pid)
+            game_state.public_announcements.append(f"{player.name} has been away too long. A bot will play for them until they return.")
+            print(f"[BOT] A bot took over {player.name}'s seat.")
+            broadcast_game_state()
+
+def build_bot_view(sid, seat, pid):
+    """The plain-data view bots.decide() works from: only what this seat's player could know."""
+    player = game_state.players[pid]
+    is_cultist = player.role == "Cultist"
+    others = [game_state.players[p].name for p in game_state.alive_players if p != pid and p in game_state.players]
+    teammates = ([game_state.players[p].name for p in game_state.alive_players
+                  if p != pid and p in game_state.players and game_state.players[p].role == "Cultist"]
+                 if is_cultist else [])
+    apocalypse_target = game_state.get_player(game_state.apocalypse_vote_target) if game_state.apocalypse_vote_target else None
+    return {
+        "phase": game_state.current_phase,
+        "sub_phase": game_state.voting_sub_phase,
+        "round": game_state.round_number,
+        "name": player.name,
+        "bot_name": seat["name"],
+        "needs_name": pid.startswith("temp_player_"),
+        "desired_players": game_state.desired_players_count,
+        "role": player.role,
+        "alive": player.is_alive,
+        "asleep": player.is_asleep,
+        "status": sorted(player.status_effects),
+        "has_contract": player.contract is not None,
+        "hand": [{"id": c.id, "name": c.name, "target_type": c.target_type,
+                  "phases": list(c.phase_restriction), "sacrifice": c.sacrifice_cards} for c in player.hand],
+        "submitted_evening": player.has_submitted_evening_cards,
+        "has_voted": player.has_voted,
+        "lobby_ready": pid in game_state.lobby_ready_players,
+        "morning_ready": pid in game_state.morning_ready_players,
+        "dusk_ready": pid in game_state.dusk_ready_players,
+        "nominated": pid in game_state.voting_nominations,
+        "execution_ready": pid in game_state.voters_ready_for_execution,
+        "apocalypse_voted": pid in game_state.apocalypse_votes,
+        "apocalypse_target": apocalypse_target.name if apocalypse_target else None,
+        "others": others,
+        "teammates": teammates,
+        "speakers": [game_state.get_safe_name(p) for p in game_state.nominated_speakers],
+        "cultists_awake": cultists_woken == (game_id, game_state.round_number),
+        "kill_votes": ({game_state.get_safe_name(voter): game_state.get_safe_name(target)
+                        for voter, target in game_state.cultist_kill_votes.items()} if is_cultist else {}),
+        "kill_target": (game_state.get_safe_name(game_state.cultist_kill_target)
+                        if is_cultist and game_state.cultist_kill_target else None),
+        "messages": [(seq, event, dict(payload)) for seq, event, payload in player_outbox.get(pid, ())
+                     if seq > seat["handled_seq"]],
+    }
+
+class BlockingCallExecutor:
+    """
+    ThreadPoolExecutor.submit() for the green-thread modes: each call runs through
+    run_blocking() on the event loop's OS threads, so that pool's size (not BOT_WORKERS)
+    bounds how many bots think at once.
+    """
+    def submit(self, fn, *args):
+        future = Future()
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return # Cancelled before it started
+            try:
+                future.set_result(run_blocking(fn, *args))
+            except Exception as e:
+                future.set_exception(e)
+        socketio.start_background_task(run)
+        return future
+
+def make_bot_pool():
+    if ASYNC_MODE == "threading":
+        return ThreadPoolExecutor(max_workers=BOT_WORKERS, thread_name_prefix="bot")
+    return BlockingCallExecutor()
+
+def schedule_bot_turns():
+    """Starts a decision for each bot whose view changed since its last one. Runs on the command worker."""
+    global bot_pool
+    now = time.monotonic()
+    for sid, seat in list(bot_seats.items()):
+        pid = clients.get(sid)
+        if pid is None or pid not in game_state.players:
+            del bot_seats[sid] # Its player came back and took the seat over
+            continue
+        if seat["future"] is not None:
+            if now < seat["deadline"]:
+                continue
+            # Out of time: disown the decision and make the safe move instead.
+            seat["future"].cancel()
+            seat["future"] = None
+            seat["token"] += 1
+            view = build_bot_view(sid, seat, pid)
+            seat["view"] = view
+            print(f"[BOT] {seat['name']} ({sid}) ran out of thinking time; playing its fallback move.")
+            enqueue_command(run_bot_actions, sid, view, bots.fallback(view), sid=sid)
+            continue
+        view = build_bot_view(sid, seat, pid)
+        if view == seat["view"]:
+            continue
+        seat["view"] = view
+        seat["deadline"] = now + BOT_THINK_BUDGET_SECONDS
+        if bot_pool is None:
+            bot_pool = make_bot_pool()
+        future = bot_pool.submit(bots.decide, view, seat["deadline"])
+        seat["future"] = future
+        token = seat["token"]
+        future.add_done_callback(
+            lambda done, sid=sid, token=token: enqueue_command(apply_bot_decision, sid, token, done, sid=sid))
+
+def apply_bot_decision(sid, token, future):
+    """Runs a finished decision, unless it was disowned or the game moved on while the bot was thinking."""
+    seat = bot_seats.get(sid)
+    if seat is None or seat["token"] != token or future.cancelled():
+        return
+    seat["future"] = None
+    try:
+        actions = future.result()
+    except Exception:
+        print(f"[BOT] {seat['name']} ({sid}) failed to decide:")
+        traceback.print_exc()
+        actions = bots.fallback(seat["view"])
+    if clients.get(sid) is None or build_bot_view(sid, seat, clients[sid]) != seat["view"]:
+        seat["view"] = None # Stale; the next schedule_bot_turns() decides again
+        return
+    run_bot_actions(sid, seat["view"], actions)
+
+def run_bot_actions(sid, view, actions):
+    """Sends a bot's events through their handlers, as if its client had sent them."""
+    seat = bot_seats.get(sid)
+    if seat is None:
+        return
+    if view["messages"]:
+        seat["handled_seq"] = max(seat["handled_seq"], view["messages"][-1][0])
+    for event, data in actions:
+        if clients.get(sid) is None:
+            return # The seat's player came back midway
+        handler = BOT_HANDLERS.get(event)
+        if handler is None:
+            print(f"[BOT] {seat['name']} tried to send unknown event '{event}'.")
+            continue
+        handler.__wrapped__(data)
+
+@socketio.on('fill_with_bots')
+@game_command
+def handle_fill_with_bots(data=None):
+    """Seats bots in the Lobby's empty seats so the game can start without waiting for more people."""
+    sid = request.sid
+    if sid not in clients or game_state.current_phase != "Lobby" or game_state.game_setup_completed:
+        return
+    if not game_state.desired_players_count:
+        emit('error', {"message": "Set the player count first."}, room=sid)
+        return
+    empty_seats = game_state.desired_players_count - len(game_state.players)
+    for _ in range(empty_seats):
+        seat_bot()
+    print(f"[BOT] {game_state.players[clients[sid]].name} filled {max(empty_seats, 0)} empty seat(s) with bots.")
+    broadcast_game_state()
+
 # --- START: New Contract Helper ---
 def increment_contract_avoid(player_id):
     """Finds a player and increments their 'thick_skinned' avoid_count."""
@@ -1133,6 +1945,7 @@ def resolve_game_end_contracts(winner_role):
     Called at game over. Resolves all contracts and calculates scores.
     """
     print(f"[GAME_END] Resolving contracts and scores. Winner: {winner_role}")
+    print(f"[GAME_END] {game_state.build_victory_summary(winner_role)}")
     # --- START OF TWEAK ---
     # We will now store a dictionary to hold the score breakdown
     game_state.game_scores = {} # This will store {name: {'team': 0, 'contract': 0, 'total': 0}}
@@ -1219,6 +2032,8 @@ def resolve_game_end_contracts(winner_role):
         score_details['total'] = score_details['team'] + score_details['contract']
         game_state.game_scores[p.name] = score_details
         # --- END OF TWEAK ---
+        export_event('contract', player=p.name, role=p.role, contract=key, status=status,
+                     points=score_details['contract'])
 
     # 3. Add final score summary
     game_state.public_announcements.append("--- FINAL SCORES ---")
@@ -1244,19 +2059,57 @@ def resolve_game_end_contracts(winner_role):
         print(f"  {summary_line}")
     # --- END OF TWEAK ---
 
+    # Queued for the archive's writer thread; a later call for the same game replaces this one.
+    after_commit('archive', game_archive.submit, snapshot_game(game_id, game_state, winner_role))
+    export_event('game_end', winner=winner_role, scores=dict(game_state.game_scores))
+
 def assign_roles():
     """Assigns Cultist or Villager to each player."""
     pids = list(game_state.players.keys())
     random.shuffle(pids)
-    n = len(pids)
-    if n <= 4: ccount = 1
-    elif n <= 8: ccount = 1
-    elif n <= 13: ccount = 2
-    else: ccount = 3
+    ccount = cultist_count_for(len(pids))
     for i, pid in enumerate(pids):
         role = "Cultist" if i < ccount else "Villager"
-        game_state.players[pid].role = role
+        game_state.set_player_role(pid, role)
         print(f"[ROLE] {game_state.players[pid].name} -> {role}")
+    for sid in list(clients):
+        sync_sid_rooms(sid)
+
+def rooms_for_player(player):
+    """The role rooms a player's sockets belong in; the lobby room until roles are dealt."""
+    if player is None:
+        return set()
+    if player.role is None:
+        return {ROOM_LOBBY}
+    if not player.is_alive:
+        return {ROOM_DEAD}
+    return {ROOM_ALIVE, ROOM_CULTISTS if player.role == "Cultist" else ROOM_VILLAGERS}
+
+def sync_sid_rooms(sid):
+    """Moves sid into exactly the role rooms its player belongs in."""
+    if is_bot_sid(sid):
+        return # Rooms only route messages, and bots get none
+    wanted = rooms_for_player(game_state.get_player(clients.get(sid)))
+    current = sid_rooms.get(sid, set())
+    for room in current - wanted:
+        socketio.server.leave_room(sid, room, namespace='/')
+    for room in wanted - current:
+        socketio.server.enter_room(sid, room, namespace='/')
+    if wanted:
+        sid_rooms[sid] = wanted
+    else:
+        sid_rooms.pop(sid, None)
+
+def sync_player_rooms(pid):
+    """Call after a player's role or life changes (assign_roles, deaths, resurrections, Doppelgänger)."""
+    for sid, p_id in list(clients.items()):
+        if p_id == pid:
+            sync_sid_rooms(sid)
+
+def clear_sid_rooms(sid):
+    """Takes sid out of every role room, e.g. when it no longer controls a player."""
+    for room in sid_rooms.pop(sid, ()):
+        socketio.server.leave_room(sid, room, namespace='/')
 
 def deal_initial_hands():
     """Deals initial hand to all alive players."""
@@ -1277,31 +2130,156 @@ def deal_initial_hands():
 
 def broadcast_game_state():
     """Broadcasts public and private game state to all clients."""
-    public = game_state.get_public_game_state()
-    public["desired_players_count"] = game_state.desired_players_count
-    public["game_setup_completed"] = game_state.game_setup_completed
+    global spectator_feed_pending, broadcast_requested
+    if broadcast_deferred:
+        # Inside a command batch: run_command_batch broadcasts once when the batch is done.
+        broadcast_requested = True
+        return
+    refresh_public_state_cache()
+    # Each audience only gets the fields it needs, in one emit to its room, so each
+    # projection is serialized once however many sockets receive it.
+    occupied = set().union(*sid_rooms.values())
+    for room, audience in ROOM_AUDIENCES.items():
+        if room in occupied:
+            socketio.emit('game_state_update', get_public_projection(audience), room=room)
+    for sid, pid in list(clients.items()):
+        if pid in game_state.players and not is_bot_sid(sid):
+            # Only players whose own view changed since their last update get a new private state.
+            send_private_state(sid, pid)
+    spectator_feed_pending = True
+    send_spectator_feed()
+
+def refresh_public_state_cache():
+    """Drops the cached projections if anything in the game or the set of connected players changed."""
+    global public_state_cache
+    changed_fields, changed_players = game_state.flush_changes()
     connected_pids = set(clients.values())
-    public["alive_players"] = []
+    if public_state_cache is None or changed_fields or changed_players or public_state_cache[0] != connected_pids:
+        public_state_cache = (connected_pids, {})
+
+def get_public_projection(audience):
+    """The public state as `audience` sees it in the current phase, built at most once per state."""
+    connected_pids, projections = public_state_cache
+    fields = get_state_projection(audience, game_state.current_phase)
+    public = projections.get(fields)
+    if public is None:
+        player_lists = projections.get("player_lists")
+        if player_lists is None:
+            player_lists = projections["player_lists"] = build_player_lists(connected_pids)
+        public = game_state.get_public_game_state(fields)
+        public.update(player_lists)
+        projections[fields] = public
+    return public
+
+def get_spectator_view():
+    """
+    What the spectator room is sent: the "spectator" projection, whose player lists
+    carry only public status effects (see build_player_lists). Spectators have no
+    player, so nothing private is ever added to it.
+    """
+    refresh_public_state_cache()
+    return get_public_projection("spectator")
+
+def join_spectators(sid):
+    """Adds sid to the spectator room and sends it the current spectator view."""
+    spectators.add(sid)
+    join_room(SPECTATOR_ROOM)
+    socketio.emit('spectator_state', get_spectator_view(), room=sid)
+    print(f"[SPECTATOR] {sid} is now watching ({len(spectators)} spectator(s)).")
+
+def send_spectator_feed(force=False):
+    """
+    Emits the spectator projection to the whole spectator room in one call, at most once
+    per SPECTATOR_UPDATE_INTERVAL_SECONDS. Updates held back by the rate limit are sent
+    by game_loop once the interval has passed.
+    """
+    global spectator_feed_pending, spectator_feed_last_sent
+    if not spectator_feed_pending or not spectators:
+        return
+    now = time.time()
+    if not force and now - spectator_feed_last_sent < SPECTATOR_UPDATE_INTERVAL_SECONDS:
+        return
+    socketio.emit('spectator_state', get_spectator_view(), room=SPECTATOR_ROOM)
+    spectator_feed_pending = False
+    spectator_feed_last_sent = now
+
+def build_player_lists(connected_pids):
+    """
+    The alive/dead player lists every projection carries. Every audience gets the
+    same lists, so they hold only public status effects; each player's own
+    effects come with their private state.
+    """
+    alive_players = []
     for pid in game_state.alive_players:
         if pid in game_state.players and pid in connected_pids:
-            p_dict = game_state.players[pid].to_dict()
+            p_dict = game_state.players[pid].to_public_dict()
             p_dict['has_readied_morning'] = pid in game_state.morning_ready_players
             p_dict['has_readied_dusk'] = pid in game_state.dusk_ready_players
             p_dict['is_ready_for_execution'] = pid in game_state.voters_ready_for_execution
-            public["alive_players"].append(p_dict)
-    public["dead_players"] = [ p.to_dict() for pid, p in game_state.players.items() if not p.is_alive and pid in connected_pids ]
-    
-    for sid, pid in list(clients.items()):
-        if pid in game_state.players:
-            socketio.emit('game_state_update', public, room=sid)
-            private_state = game_state.get_player_private_state(pid)
-            private_state["is_asleep"] = game_state.players[pid].is_asleep  # <-- ADD THIS LINE BACK
-            socketio.emit('private_player_state', private_state, room=sid)
+            alive_players.append(p_dict)
+    dead_players = [ p.to_public_dict() for pid, p in game_state.players.items() if not p.is_alive and pid in connected_pids ]
+    return {"alive_players": alive_players, "dead_players": dead_players}
+
+def get_private_state_payload(pid):
+    """Returns the player's private state, rebuilding it only if it changed since it was last built."""
+    player = game_state.players[pid]
+    player.scan_changes()
+    payload = private_state_cache.get(pid)
+    if payload is None or player.private_dirty:
+        payload = game_state.get_player_private_state(pid)
+        payload["is_asleep"] = player.is_asleep
+        private_state_cache[pid] = payload
+        player.private_dirty = False
+    return payload
+
+def send_private_state(sid, pid, force=False):
+    """Emits the player's private state to sid unless that exact payload was already sent there."""
+    payload = get_private_state_payload(pid)
+    if force or private_state_sent.get(sid) is not payload:
+        socketio.emit('private_player_state', payload, room=sid)
+        private_state_sent[sid] = payload
+
+def send_to_player(pid, event, payload=None):
+    """
+    Emits a one-off private message (a prompt, vision or whisper) to pid. It is stamped with
+    the player's next sequence number and kept in their outbox, so it still reaches them if
+    they are disconnected right now and reconnect with the last sequence number they saw.
+    During a batch the whole delivery, outbox entry included, waits for the batch to commit,
+    so a rolled-back message can never be replayed by send_resume_state.
+    """
+    after_commit(event, deliver_to_player, pid, event, payload)
+
+def deliver_to_player(pid, event, payload):
+    box = player_outbox.setdefault(pid, deque(maxlen=PLAYER_OUTBOX_SIZE))
+    message = dict(payload or {}, seq=box[-1][0] + 1 if box else 1)
+    box.append((message["seq"], event, message))
+    sid = next((s for s, p_id in clients.items() if p_id == pid), None)
+    if sid:
+        socketio.emit(event, message, room=sid)
+
+def send_resume_state(sid, pid, last_seq):
+    """
+    Brings one reconnecting client up to date: its state projection, its private state, and
+    the outbox messages after last_seq. Returns how many messages were replayed.
+    """
+    refresh_public_state_cache()
+    socketio.emit('game_state_update', get_public_projection(audience_for(game_state.players[pid])), room=sid)
+    send_private_state(sid, pid, force=True)
+    box = player_outbox.get(pid)
+    if not isinstance(last_seq, int) or not box:
+        return 0 # A client with no history (new device) starts from the current state
+    missed = [entry for entry in box if entry[0] > last_seq]
+    if missed and missed[0][0] > last_seq + 1:
+        print(f"[RECONNECT] {pid} missed more than the last {PLAYER_OUTBOX_SIZE} messages; replaying what is left.")
+    for seq, event, message in missed:
+        socketio.emit(event, message, room=sid)
+    return len(missed)
 
 def start_game_logic():
     """Starts Evening 0, reveals roles and objectives."""
     game_state.current_phase = "Evening"
     game_state.last_phase_start_time = time.time()
+    game_state.started_at = game_state.last_phase_start_time
     game_state.public_announcements.append("The game begins! It is Evening. Play your cards or click 'Confirm Cards' when you are done.")
     assign_roles()
     deal_initial_hands()
@@ -1309,7 +2287,7 @@ def start_game_logic():
     for sid, pid in clients.items():
         pl = game_state.get_player(pid)
         objective = ("Objective: Find and eliminate all of the Cultists." if pl.role == "Villager" else "Objective: Kill the Villagers. Ensure the Cultists outnumber the Villagers.")
-        socketio.emit('reveal_role', {"role": pl.role, "objective": objective}, room=sid)
+        send_to_player(pid, 'reveal_role', {"role": pl.role, "objective": objective})
         # --- NEW CONTRACT LOGIC ---
         # Randomly select a contract to offer
         available_contracts = ["brothers_keeper", "lamb_of_god", "thick_skinned"]
@@ -1320,16 +2298,18 @@ def start_game_logic():
         contract_data['target_type'] = CONTRACT_DEFINITIONS[contract_key].get('target_type', 'other') 
         
         # Send the contract prompt *after* the role reveal
-        socketio.emit('prompt_for_contract', contract_data, room=sid)
+        send_to_player(pid, 'prompt_for_contract', contract_data)
         print(f"[CONTRACT] Sending '{contract_key}' to {pl.name}.")
 
 def check_night_sleep_progress():
-    """After everyone sleeps, run special night quests then wake Cultists."""
-    total = len(game_state.players)
-    if len(game_state.night_asleep_players) != total:
-        return
+    """Once everyone is asleep, tolls the bell after NIGHT_SLEEP_DELAY_SECONDS."""
+    if len(game_state.night_asleep_players) == len(game_state.players):
+        schedule_command(NIGHT_SLEEP_DELAY_SECONDS, toll_night_bell)
 
-    socketio.sleep(NIGHT_SLEEP_DELAY_SECONDS)
+def toll_night_bell():
+    """After everyone sleeps, run special night quests then wake Cultists."""
+    if len(game_state.night_asleep_players) != len(game_state.players):
+        return # Someone woke up during the pause; their next sleep schedules the bell again
 
     socketio.emit('play_tolling_bell')
 
@@ -1341,7 +2321,7 @@ def check_night_sleep_progress():
                 sid = next((s for s, p_id in clients.items() if p_id == pid), None)
                 if sid:
                     print(f"[QUEST] Prompting {player.name} for Compulsion resolution.")
-                    emit('prompt_compulsion_resolution', room=sid)
+                    send_to_player(pid, 'prompt_compulsion_resolution')
                     return
 
     for pid in game_state.alive_players:
@@ -1349,26 +2329,24 @@ def check_night_sleep_progress():
         if player and 'compelled' in player.status_effects:
             quest_data = player.status_effects['compelled']
             if game_state.round_number == quest_data['initiated_at_round']:
-                living_cultist_ids = [p_id for p_id in game_state.alive_players if game_state.players[p_id].role == "Cultist"]
-                for cultist_id in living_cultist_ids:
-                    is_the_one = (cultist_id == pid)
-                    sid = next((s for s, p_id in clients.items() if p_id == cultist_id), None)
-                    if sid:
-                        print(f"[QUEST] Sending Compulsion initial prompt to {game_state.players[cultist_id].name}, is_selected={is_the_one}")
-                        emit('prompt_compulsion_initial', {'is_selected': is_the_one}, room=sid)
+                # Each Cultist gets their own copy so it can be replayed after a reconnect.
+                print(f"[QUEST] Sending Compulsion initial prompt to the Cultists, selected={player.name}")
+                send_to_player(pid, 'prompt_compulsion_initial', {'is_selected': True})
+                for cultist_pid in game_state.alive_players:
+                    if cultist_pid != pid and game_state.players[cultist_pid].role == "Cultist":
+                        send_to_player(cultist_pid, 'prompt_compulsion_initial', {'is_selected': False})
                 break
 
     wake_cultists_for_kill_vote()
 
 def wake_cultists_for_kill_vote():
     """Sends the wake-up call to living cultists."""
+    global cultists_woken
     print("[NIGHT] Waking cultists for kill vote.")
-    for sid, pid in clients.items():
-        pl = game_state.get_player(pid)
-        if pl.role == "Cultist" and pl.is_alive:
-            socketio.emit('cultist_wake_up', {"message": "Cultists, open your eyes!"}, room=sid)
-        else:
-            socketio.emit('sleep_prompt', {"message": "Stay asleep."}, room=sid)
+    cultists_woken = (game_id, game_state.round_number)
+    socketio.emit('cultist_wake_up', {"message": "Cultists, open your eyes!"}, room=ROOM_CULTISTS)
+    for room in (ROOM_VILLAGERS, ROOM_DEAD):
+        socketio.emit('sleep_prompt', {"message": "Stay asleep."}, room=room)
     broadcast_game_state()
 
 def execute_doppelganger_transform(action):
@@ -1385,7 +2363,8 @@ def execute_doppelganger_transform(action):
         print(f"[DOPPELGANGER] Executing {dop_player.name}'s transformation from {old_role} to {new_role}.")
         
         # 1. Change Role
-        dop_player.role = new_role
+        game_state.set_player_role(dop_player.player_id, new_role)
+        sync_player_rooms(dop_player.player_id)
         
         # 2. Swap Hand
         dop_player.hand.clear()
@@ -1395,13 +2374,11 @@ def execute_doppelganger_transform(action):
             dop_player.add_card(card)
             
         # 3. Send private "Role Reveal" popup
-        sid = next((s for s, p_id in clients.items() if p_id == dop_player.player_id), None)
-        if sid:
-            objective = ("Objective: Find and eliminate all of the Cultists." if new_role == "Villager" else "Objective: Kill the Villagers. Ensure the Cultists outnumber the Villagers.")
-            socketio.emit('reveal_role', {
-                "role": new_role, 
-                "objective": f"You have taken {target_name}'s role! {objective}"
-            }, room=sid)
+        objective = ("Objective: Find and eliminate all of the Cultists." if new_role == "Villager" else "Objective: Kill the Villagers. Ensure the Cultists outnumber the Villagers.")
+        send_to_player(dop_player.player_id, 'reveal_role', {
+            "role": new_role, 
+            "objective": f"You have taken {target_name}'s role! {objective}"
+        })
         
         # 4. Add subtle public announcement
         game_state.public_announcements.append(f"{dop_player.name} seems... different this morning. Perhaps a Doppelgänger walks among you!") 
@@ -1423,7 +2400,7 @@ def check_cultist_kill_consensus():
         game_state.cultist_kill_target = None
 
 def apply_card_effect(player_id, card_obj, target_list=None, sid=None):
-    """Applies the effect of a played card."""
+    """Applies the effect of a played card by dispatching to its registered handler."""
     player = game_state.get_player(player_id)
 
     # --- START: Lamb of God Failure Check (REMOVED) ---
@@ -1439,397 +2416,414 @@ def apply_card_effect(player_id, card_obj, target_list=None, sid=None):
     # --- END OF FIX ---
     t1_obj = game_state.get_player_by_name(t1_name) if t1_name else None
 
+    print(f"[CARD_EFFECT] {player.name} playing {card_obj.name} with effect {card_obj.effect_type}")
+    game_state.card_play_log.append({
+        'round': game_state.round_number,
+        'phase': game_state.current_phase,
+        'player': player.name,
+        'card': card_obj.name,
+        'effect_type': card_obj.effect_type,
+        'targets': copy.deepcopy(target_list),
+    })
+    export_event('card_play', phase=game_state.current_phase, player=player.name, role=player.role,
+                 card=card_obj.name, effect_type=card_obj.effect_type, targets=game_state.card_play_log[-1]['targets'])
+    ctx = EffectContext(game_state, player_id, player, card_obj, t1_obj, target_list, sid)
+    dispatch_card_effect(ctx)
+
+# --- CARD EFFECT PRE-HOOKS ---
+# These run before every card effect, in registration order.
+
+def _is_attack_on_immolated_player(ctx):
     # FIX: Only living players can catch fire from immolation
+    return (ctx.target and 'immolated' in ctx.target.status_effects and
+            ctx.player_id != ctx.target.player_id and
+            ctx.player.is_alive)
+
+@register_effect_pre_hook
+def _immolation_ignites_attacker(ctx):
+    """Anyone who plays a card against an immolated player catches fire."""
+    if _is_attack_on_immolated_player(ctx) and 'burning' not in ctx.player.status_effects:
+        ctx.player.apply_status_effect('burning', 3)
+        game_state.public_announcements.append(f"{ctx.player.name} caught fire! They will die in two rounds unless saved.")
+        print(f"[EFFECT] {ctx.player.name} caught fire from attacking {ctx.target.name}.")
+
+@register_effect_pre_hook
+def _immolation_fails_lamb_of_god(ctx):
+    """The immolated player breaks 'Lamb of God' by setting their attacker on fire."""
+    if not _is_attack_on_immolated_player(ctx):
+        return
+    immolated_player = ctx.target # The one with the 'immolated' effect
+    if (immolated_player.contract and
+        immolated_player.contract.get('key') == 'lamb_of_god' and
+        not immolated_player.contract.get('failed')):
+
+        immolated_player.contract['failed'] = True
+        print(f"[CONTRACT] {immolated_player.name} failed 'Lamb of God' by burning {ctx.player.name} with Immolation.")
+
+# --- CARD EFFECT HANDLERS ---
+# Hand-written handlers for effects that need more than an "effect" spec in
+# CARD_DEFINITIONS can express (private emits, random picks, rituals...).
+# Simple cards are compiled from their spec in card_game.py instead.
+
+@register_effect("compulsion")
+def _effect_compulsion(ctx):
+    player = ctx.player
+    living_cultist_ids = [pid for pid in game_state.alive_players if game_state.get_player(pid).role == "Cultist"]
+    if living_cultist_ids:
+        compelled_id = random.choice(living_cultist_ids)
+        compelled_player = game_state.get_player(compelled_id)
+        compelled_player.apply_status_effect("compelled", {
+            "caster_id": ctx.player_id,
+            "initiated_at_round": game_state.round_number,
+            "resolve_at_round": game_state.round_number + 1
+        })
+        game_state.public_announcements.append("One of the Cultists has been compelled to say the word \"Cultist\" at least once before the next sundown. if they fail, they will be killed!")
+        print(f"[QUEST] {player.name} played Compulsion. {compelled_player.name} was selected.")
+    else:
+        game_state.public_announcements.append(f"{player.name} played Compulsion, but no Cultists could be found.")
+        print(f"[QUEST] {player.name} played Compulsion, but no living cultists exist.")
+
+@register_effect("third_eye")
+def _effect_third_eye(ctx):
+    player, t1_obj = ctx.player, ctx.target
+    if t1_obj:
+        # --- START: Third Eye Tweak ---
+
+        # 1. Show the full hand to the player who cast the card
+        target_hand = [card.to_ref() for card in t1_obj.hand]
+        # We reuse the 'show_player_hand' event, which index.html
+        # already knows how to display using showRevealedHandDialog.
+        send_to_player(ctx.player_id, 'show_player_hand', {'player_name': t1_obj.name, 'hand': target_hand})
+
+        # 2. Notify the target *if* they are a Cultist
+        if t1_obj.role == "Cultist":
+            notification_msg = f"{player.name} has just seen your cards!"
+            send_to_player(t1_obj.player_id, 'private_announcement', {"message": notification_msg})
+
+        # 3. No public announcement, just a server log
+        print(f"[CARD] {player.name} played Third Eye on {t1_obj.name}.")
+
+        # --- END: Third Eye Tweak ---
+    else:
+        print(f"[CARD] {player.name} played Third Eye but target was invalid.")
+
+@register_effect("protect")
+def _effect_protect(ctx):
+    t1_obj = ctx.target
+    if t1_obj:
+        game_state.pending_night_actions.append({ "target_id": t1_obj.player_id, "effect_type": "protect", "source_id": ctx.player_id, "is_counterable": False, "is_countered": False, "effect_data": {"duration": ctx.card.duration_rounds} })
+        print(f"[CARD] {ctx.player.name} played Protection Charm on {t1_obj.name}")
+
+@register_effect("apocalypse_vote")
+def _effect_apocalypse_vote(ctx):
+    t1_obj = ctx.target
+    if t1_obj and t1_obj.is_alive:
+        game_state.apocalypse_vote_target = t1_obj.player_id
+        # --- START: Lamb of God (Apocalypse) Tweak ---
+        # Store the ID of the player who cast this
+        game_state.global_status_effects['apocalypse_caster_id'] = ctx.player_id
+        # --- END: Lamb of God (Apocalypse) Tweak ---
+        game_state.public_announcements.append(f"{ctx.player.name} played The Apocalypse! All players must now vote on whether to reveal {t1_obj.name}'s role.")
+
+@register_effect("extra_vote")
+def _effect_extra_vote(ctx):
+    player = ctx.player
+    player.apply_status_effect("extra_vote", 1)
+    if 'vote_block' in player.status_effects or 'vote_restriction' in player.status_effects:
+        game_state.public_announcements.append(f"{player.name} played Silver Tongue, allowing them to vote despite their voting restriction!")
+    else:
+        game_state.public_announcements.append(f"{player.name} played Silver Tongue, allowing them to cast two votes for the same player!")
 
-    if (t1_obj and 'immolated' in t1_obj.status_effects and 
-        player_id != t1_obj.player_id and 
-        player.is_alive):  # ADD THIS CHECK
+@register_effect("false_idol")
+def _effect_false_idol(ctx):
+    player, player_id = ctx.player, ctx.player_id
+    player_sid = next((sid for sid, p_id in clients.items() if p_id == player_id), None)
+    if not player_sid: return
 
-        if t1_obj and 'immolated' in t1_obj.status_effects and player_id != t1_obj.player_id:
-            if not 'burning' in player.status_effects:
-                player.apply_status_effect('burning', 3)
-                game_state.public_announcements.append(f"{player.name} caught fire! They will die in two rounds unless saved.")
-                print(f"[EFFECT] {player.name} caught fire from attacking {t1_obj.name}.")
-                # --- END OF FIX ---
-            
-            # --- START: NEW Lamb of God (Immolation) Failure Check ---
-            # Check if the IMMOLATED player (t1_obj) has the contract.
-            immolated_player = t1_obj # t1_obj is the one with the 'immolated' effect
-            if (immolated_player.contract and 
-                immolated_player.contract.get('key') == 'lamb_of_god' and 
-                not immolated_player.contract.get('failed')):
-                
-                immolated_player.contract['failed'] = True
-                print(f"[CONTRACT] {immolated_player.name} failed 'Lamb of God' by burning {player.name} with Immolation.")
-            # --- END: NEW Lamb of God (Immolation) Failure Check ---
+    cultist_found = any(game_state.get_player(dead_pid).role == "Cultist" for dead_pid in game_state.dead_players)
 
-    print(f"[CARD_EFFECT] {player.name} playing {card_obj.name} with effect {card_obj.effect_type}")
-    #... rest of the function continues    if target_list: print(f"[CARD_EFFECT] Targets: {target_list}")
-    
-    # --- ADD THIS NEW ELIF BLOCK ---
-    if card_obj.effect_type == "hand_of_glory":
-        # Apply a secret status effect. 
-        # We don't add this to STATUS_UI_MAP in index.html, so it stays hidden.
-        player.apply_status_effect("hand_of_glory_protection", 2)
-        print(f"[EFFECT] {player.name} secretly used Hand of Glory.")
-
-    if card_obj.effect_type == "mark_of_the_beast":
-        player.apply_status_effect("mark_of_the_beast", card_obj.duration_rounds)
-        game_state.public_announcements.append(f"{player.name} was marked by the Beast, causing those who kill them to be publicly announced the Morning after their death!")
-        print(f"[CARD] {player.name} is now Marked by the Beast for {card_obj.duration_rounds} rounds.")
-    elif card_obj.effect_type == "eternal_winter":
-        if t1_obj and t1_obj.is_alive:
-            t1_obj.apply_status_effect("eternal_winter", card_obj.duration_rounds)
-            game_state.public_announcements.append(f"{player.name} has cursed {t1_obj.name}, who must now sing 'All I Want for Christmas Is You' until sundown!")
-    elif card_obj.effect_type == "compulsion":
-        living_cultist_ids = [pid for pid in game_state.alive_players if game_state.get_player(pid).role == "Cultist"]
-        if living_cultist_ids:
-            compelled_id = random.choice(living_cultist_ids)
-            compelled_player = game_state.get_player(compelled_id)
-            compelled_player.apply_status_effect("compelled", {
-                "caster_id": player_id,
-                "initiated_at_round": game_state.round_number,
-                "resolve_at_round": game_state.round_number + 1
-            })
-            game_state.public_announcements.append("One of the Cultists has been compelled to say the word \"Cultist\" at least once before the next sundown. if they fail, they will be killed!")
-            print(f"[QUEST] {player.name} played Compulsion. {compelled_player.name} was selected.")
-        else:
-            game_state.public_announcements.append(f"{player.name} played Compulsion, but no Cultists could be found.")
-            print(f"[QUEST] {player.name} played Compulsion, but no living cultists exist.")
-    elif card_obj.effect_type == "third_eye":
-        # t1_obj is the target player, defined at the top of the function
-        if t1_obj:
-            # --- START: Third Eye Tweak ---
-
-            # 1. Show the full hand to the player who cast the card
-            player_sid = next((sid for sid, p_id in clients.items() if p_id == player_id), None)
-            if player_sid:
-                target_hand = [card.to_dict() for card in t1_obj.hand]
-                # We reuse the 'show_player_hand' event, which index.html
-                # already knows how to display using showRevealedHandDialog.
-                socketio.emit('show_player_hand', {'player_name': t1_obj.name, 'hand': target_hand}, room=player_sid)
-
-            # 2. Notify the target *if* they are a Cultist
-            if t1_obj.role == "Cultist":
-                target_sid = next((sid for sid, p_id in clients.items() if p_id == t1_obj.player_id), None)
-                if target_sid:
-                    notification_msg = f"{player.name} has just seen your cards!"
-                    socketio.emit('private_announcement', {"message": notification_msg}, room=target_sid)
-            
-            # 3. No public announcement, just a server log
-            print(f"[CARD] {player.name} played Third Eye on {t1_obj.name}.")
-            
-            # --- END: Third Eye Tweak ---
-        else:
-            print(f"[CARD] {player.name} played Third Eye but target was invalid.")
-    elif card_obj.effect_type == "protect":
-        if t1_obj:
-            game_state.pending_night_actions.append({ "target_id": t1_obj.player_id, "effect_type": "protect", "source_id": player_id, "is_counterable": False, "is_countered": False, "effect_data": {"duration": card_obj.duration_rounds} })
-            print(f"[CARD] {player.name} played Protection Charm on {t1_obj.name}")
-    elif card_obj.effect_type == "silence":
-        if t1_obj:
-            effect_data = { "duration": card_obj.duration_rounds, "source_name": player.name, "target_name": t1_obj.name }
-            action = { "target_id": t1_obj.player_id, "effect_type": "silence", "source_id": player_id, "is_counterable": True, "is_countered": False, "effect_data": effect_data }
-            game_state.pending_night_actions.append(action)
-            print(f"[CARD] {player.name} played Silence on {t1_obj.name}")
-    elif card_obj.effect_type == "apocalypse_vote":
-        if t1_obj and t1_obj.is_alive:
-            game_state.apocalypse_vote_target = t1_obj.player_id
-            # --- START: Lamb of God (Apocalypse) Tweak ---
-            # Store the ID of the player who cast this
-            game_state.global_status_effects['apocalypse_caster_id'] = player_id
-            # --- END: Lamb of God (Apocalypse) Tweak ---
-            game_state.public_announcements.append(f"{player.name} played The Apocalypse! All players must now vote on whether to reveal {t1_obj.name}'s role.")
-    elif card_obj.effect_type == "delirium":
-        if t1_obj:
-            effect_data = { "duration": card_obj.duration_rounds, "target_name": t1_obj.name }
-            game_state.pending_night_actions.append({ "target_id": t1_obj.player_id, "effect_type": "delirium", "source_id": player_id, "is_counterable": True, "is_countered": False, "effect_data": effect_data })
-            print(f"[CARD] {player.name} played Delirium on {t1_obj.name}")
-    elif card_obj.effect_type == "extra_vote":
-        player.apply_status_effect("extra_vote", 1)
-        if 'vote_block' in player.status_effects or 'vote_restriction' in player.status_effects:
-            game_state.public_announcements.append(f"{player.name} played Silver Tongue, allowing them to vote despite their voting restriction!")
-        else:
-            game_state.public_announcements.append(f"{player.name} played Silver Tongue, allowing them to cast two votes for the same player!")
-    elif card_obj.effect_type == "false_idol":
-        player_sid = next((sid for sid, p_id in clients.items() if p_id == player_id), None)
-        if not player_sid: return
+    if cultist_found:
+        message = "The Dark God reveals to you that one of the Dead IS a Cultist!"
+    else:
+        message = "The Dark God reveals to you that none of the Dead is a Cultist."
+    send_to_player(player_id, 'private_announcement', {"message": message})
+
+    # Defer the status effects until the start of Morning.
+    action = {
+        "target_id": player_id,
+        "effect_type": "apply_false_idol_debuffs",
+        "source_id": player_id,
+        "is_counterable": True,
+        "is_countered": False,
+        "effect_data": {"duration": ctx.card.duration_rounds}
+    }
+    game_state.pending_night_actions.append(action)
+    print(f"[CARD] {player.name} played False Idol. Effects are pending for Morning.")
+
+    game_state.public_announcements.append(f"{player.name} has prayed to a False Idol!")
+
+@register_effect("screams_from_the_void")
+def _effect_screams_from_the_void(ctx):
+    player, player_id = ctx.player, ctx.player_id
+    player_sid = next((sid for sid, p_id in clients.items() if p_id == player_id), None)
+    if not player_sid: return
+
+    non_cultist_ids = [pid for pid, p in game_state.players.items() if p.role != 'Cultist' and pid != player_id]
+    if non_cultist_ids:
+        revealed_id = random.choice(non_cultist_ids)
+        revealed_name = game_state.players[revealed_id].name
+        message = f"You have had a revelation...{revealed_name} is not a Cultist."
+        send_to_player(player_id, 'private_announcement', {"message": message})
+    else:
+        message = "The Dark God finds no one worthy of its whispers."
+        send_to_player(player_id, 'private_announcement', {"message": message})
+
+    # Defer the status effects until the start of Morning.
+    action = {
+        "target_id": player_id,
+        "effect_type": "apply_screams_from_the_void_debuffs",
+        "source_id": player_id,
+        "is_counterable": True,
+        "is_countered": False,
+        "effect_data": {"duration": ctx.card.duration_rounds}
+    }
+    game_state.pending_night_actions.append(action)
+    print(f"[CARD] {player.name} played Screams from the Void. Effects are pending for Morning.")
+
+    game_state.public_announcements.append(f"{player.name} prays to the Dark God, and is driven mad by what they hear. They have learned the name of one player who is not a Cultist.")
+
+@register_effect("feed_the_beast")
+def _effect_feed_the_beast(ctx):
+    player = ctx.player
+    game_state.public_announcements.append(f"After dying, {player.name} decided to Feed the Maggots, causing all players to lose their cards!")
+    for alive_pid in game_state.alive_players:
+        alive_player = game_state.get_player(alive_pid)
+        if alive_player:
+            alive_player.hand.clear()
+            new_cards = game_state.deck.deal(2)
+            for new_card in new_cards:
+                alive_player.add_card(new_card)
+    print(f"[CARD] {player.name} played Feed the Maggots. All hands reset.")
+
+@register_effect("steal_card")
+def _effect_steal_card(ctx):
+    player, t1_obj = ctx.player, ctx.target
+    game_state.public_announcements.append(f"There are reports of a covetous thief in the area...")
+    if t1_obj:
+        game_state.add_delayed_action({
+            'type': 'steal_card_transfer',
+            'thief_id': ctx.player_id,
+            'victim_id': t1_obj.player_id,
+            'execute_at_round': game_state.round_number + 1
+        })
+        game_state.add_delayed_action({
+            'type': 'reveal_thief',
+            'thief_name': player.name,
+            'victim_name': t1_obj.name,
+            'execute_at_round': game_state.round_number + 2
+        })
+        print(f"[CARD] {player.name} played Covet on {t1_obj.name}. Effects are scheduled.")
+
+@register_effect("violent_delights")
+def _effect_violent_delights(ctx):
+    quest_data = {
+        'expires_at_round': game_state.round_number + 2,
+        'completed': False
+    }
+    ctx.player.apply_status_effect("violent_delights_quest", quest_data)
+    print(f"[QUEST] {ctx.player.name} started Violent Delights quest, expires at round {quest_data['expires_at_round']}.")
+
+@register_effect("i_saw_the_light")
+def _effect_i_saw_the_light(ctx):
+    t1_obj = ctx.target
+    if t1_obj:
+        # --- START: Thick Skinned Check ---
+        # Check *before* cleansing if the player is burning
+        was_burning = 'burning' in t1_obj.status_effects
+        # --- END: Thick Skinned Check ---
+
+        effects_to_cleanse = ['silence', 'delirium', 'burning', 'vote_restriction', 'violent_delights_quest']
+        cleansed_an_effect = False
+
+        for effect in effects_to_cleanse:
+            if effect in t1_obj.status_effects:
+                t1_obj.status_effects.pop(effect, None)
+                cleansed_an_effect = True
+                print(f"[EFFECT] Cleansed {effect} from {t1_obj.name}")
 
-        cultist_found = any(game_state.get_player(dead_pid).role == "Cultist" for dead_pid in game_state.dead_players)
+        # --- START: Thick Skinned Increment ---
+        # If they *were* burning and we cleansed *something* (which must include burning)
+        if was_burning and cleansed_an_effect:
+            increment_contract_avoid(t1_obj.player_id)
+        # --- END: Thick Skinned Increment ---
 
-        if cultist_found:
-            message = "The Dark God reveals to you that one of the Dead IS a Cultist!"
-        else:
-            message = "The Dark God reveals to you that none of the Dead is a Cultist."
-        socketio.emit('private_announcement', {"message": message}, room=player_sid)
-
-        # Defer the status effects until the start of Morning.
-        action = {
-            "target_id": player_id,
-            "effect_type": "apply_false_idol_debuffs",
-            "source_id": player_id,
-            "is_counterable": True,
-            "is_countered": False,
-            "effect_data": {"duration": card_obj.duration_rounds}
-        }
-        game_state.pending_night_actions.append(action)
-        print(f"[CARD] {player.name} played False Idol. Effects are pending for Morning.")
-
-        game_state.public_announcements.append(f"{player.name} has prayed to a False Idol!")
-    elif card_obj.effect_type == "screams_from_the_void":
-        player_sid = next((sid for sid, p_id in clients.items() if p_id == player_id), None)
-        if not player_sid: return
-
-        non_cultist_ids = [pid for pid, p in game_state.players.items() if p.role != 'Cultist' and pid != player_id]
-        if non_cultist_ids:
-            revealed_id = random.choice(non_cultist_ids)
-            revealed_name = game_state.players[revealed_id].name
-            message = f"You have had a revelation...{revealed_name} is not a Cultist."
-            socketio.emit('private_announcement', {"message": message}, room=player_sid)
-        else:
-            message = "The Dark God finds no one worthy of its whispers."
-            socketio.emit('private_announcement', {"message": message}, room=player_sid)
-
-        # Defer the status effects until the start of Morning.
-        action = {
-            "target_id": player_id,
-            "effect_type": "apply_screams_from_the_void_debuffs",
-            "source_id": player_id,
-            "is_counterable": True,
-            "is_countered": False,
-            "effect_data": {"duration": card_obj.duration_rounds}
-        }
-        game_state.pending_night_actions.append(action)
-        print(f"[CARD] {player.name} played Screams from the Void. Effects are pending for Morning.")
-
-        game_state.public_announcements.append(f"{player.name} prays to the Dark God, and is driven mad by what they hear. They have learned the name of one player who is not a Cultist.")
-    elif card_obj.effect_type == "feed_the_beast":
-        game_state.public_announcements.append(f"After dying, {player.name} decided to Feed the Maggots, causing all players to lose their cards!")
-        for alive_pid in game_state.alive_players:
-            alive_player = game_state.get_player(alive_pid)
-            if alive_player:
-                alive_player.hand.clear()
-                new_cards = game_state.deck.deal(2)
-                for new_card in new_cards:
-                    alive_player.add_card(new_card)
-        print(f"[CARD] {player.name} played Feed the Maggots. All hands reset.")
-    elif card_obj.effect_type == "lose_all_cards":
-        if t1_obj:
-            action = {
-                "target_id": t1_obj.player_id,
-                "effect_type": "lose_all_cards",
-                "source_id": player_id,
-                "is_counterable": True,
-                "is_countered": False,
-                "effect_data": {"target_name": t1_obj.name}
-            }
-            game_state.pending_night_actions.append(action)
-            print(f"[CARD] {player.name} played Act of God on {t1_obj.name}. Effect is pending for Morning.")
-    elif card_obj.effect_type == "immolation":
-        player.apply_status_effect("immolated", card_obj.duration_rounds)
-        game_state.public_announcements.append(f"{player.name} burns with a holy fire! Anyone who plays a card against them will burst into flames, killing them within two rounds!")
-        print(f"[CARD] {player.name} is now immolated for {card_obj.duration_rounds} rounds.")
-    elif card_obj.effect_type == "steal_card":
-        game_state.public_announcements.append(f"There are reports of a covetous thief in the area...")
-        if t1_obj:
-            game_state.delayed_actions.append({
-                'type': 'steal_card_transfer',
-                'thief_id': player_id,
-                'victim_id': t1_obj.player_id,
-                'execute_at_round': game_state.round_number + 1
-            })
-            game_state.delayed_actions.append({
-                'type': 'reveal_thief',
-                'thief_name': player.name,
-                'victim_name': t1_obj.name,
-                'execute_at_round': game_state.round_number + 2
-            })
-            print(f"[CARD] {player.name} played Covet on {t1_obj.name}. Effects are scheduled.")
-    elif card_obj.effect_type == "violent_delights":
-        quest_data = {
-            'expires_at_round': game_state.round_number + 2,
-            'completed': False
-        }
-        player.apply_status_effect("violent_delights_quest", quest_data)
-        print(f"[QUEST] {player.name} started Violent Delights quest, expires at round {quest_data['expires_at_round']}.")
-    elif card_obj.effect_type == "i_saw_the_light":
-        if t1_obj:
-            # --- START: Thick Skinned Check ---
-            # Check *before* cleansing if the player is burning
-            was_burning = 'burning' in t1_obj.status_effects
-            # --- END: Thick Skinned Check ---
-
-            effects_to_cleanse = ['silence', 'delirium', 'burning', 'vote_restriction', 'violent_delights_quest']
-            cleansed_an_effect = False
-
-            for effect in effects_to_cleanse:
-                if effect in t1_obj.status_effects:
-                    t1_obj.status_effects.pop(effect, None)
-                    cleansed_an_effect = True
-                    print(f"[EFFECT] Cleansed {effect} from {t1_obj.name}")
-
-            # --- START: Thick Skinned Increment ---
-            # If they *were* burning and we cleansed *something* (which must include burning)
-            if was_burning and cleansed_an_effect:
-                increment_contract_avoid(t1_obj.player_id)
-            # --- END: Thick Skinned Increment ---
-
-            if 'burning' in effects_to_cleanse and cleansed_an_effect:
-                game_state.delayed_actions = [
-                    action for action in game_state.delayed_actions
-                    if not (action['type'] == 'burn_death' and action['target_id'] == t1_obj.player_id)
-                ]
+        if 'burning' in effects_to_cleanse and cleansed_an_effect:
+            game_state.delayed_actions = [
+                action for action in game_state.delayed_actions
+                if not (action['type'] == 'burn_death' and action['target_id'] == t1_obj.player_id)
+            ]
 
-            t1_obj.apply_status_effect("divine_protection", {'applied_in_round': game_state.round_number})
+        # Fades at the first sundown of a later round (see GameState.advance_phase)
+        t1_obj.apply_status_effect("divine_protection", {'applied_in_round': game_state.round_number},
+                                   expires_at_round=game_state.round_number + 1)
 
-            if cleansed_an_effect:
-                 game_state.public_announcements.append(f"{t1_obj.name} has been cleansed by a holy light!")
-            else:
-                 game_state.public_announcements.append(f"{t1_obj.name} is now divinely protected!")
-            print(f"[CARD] {player.name} played I Saw the Light on {t1_obj.name}.")
-    elif card_obj.effect_type == "peeping_tom":
-        if t1_obj:
-            player_sid = next((sid for sid, p_id in clients.items() if p_id == player_id), None)
-            if player_sid:
-                target_hand = [card.to_dict() for card in t1_obj.hand]
-                socketio.emit('show_player_hand', {'player_name': t1_obj.name, 'hand': target_hand}, room=player_sid)
-
-            game_state.delayed_actions.append({
-                'type': 'peeping_tom_reveal',
-                'peeper_name': player.name,
-                'victim_name': t1_obj.name,
-                'execute_at_round': game_state.round_number + 1
-            })
-            print(f"[CARD] {player.name} played Peeping Tom on {t1_obj.name}.")
-    elif card_obj.effect_type == "lazarus":
-        player.is_alive = True
-        if player_id in game_state.dead_players:
-            game_state.dead_players.remove(player_id)
-        if player_id not in game_state.alive_players:
-            game_state.alive_players.append(player_id)
-
-        player.apply_status_effect("silence", 1)
-        player.apply_status_effect("delirium", 1)
-        player.apply_status_effect("lazarus_effect", {'expires_at_round': game_state.round_number})
-
-        game_state.public_announcements.append(f"{player.name} was resurrected by the Dark God to participate in voting for one more round, but cannot speak or play any cards.")
-        print(f"[CARD] {player.name} played Lazarus and is temporarily resurrected.")
-    # --- START OF NEW DOPPELGANGER BLOCK ---
-    elif card_obj.effect_type == "doppelganger":
-        if t1_obj and t1_obj.is_alive:
-            # This handles the "most recent target" logic by simply overwriting
-            player.apply_status_effect('doppelganger_pending', {
-                'target_id': t1_obj.player_id,
-                'target_name': t1_obj.name
-            })
-            game_state.public_announcements.append(f"{player.name} has cast a dark ritual on {t1_obj.name}...")
-            print(f"[DOPPELGANGER] {player.name} played Doppelgänger, targeting {t1_obj.name}.")
+        if cleansed_an_effect:
+             game_state.public_announcements.append(f"{t1_obj.name} has been cleansed by a holy light!")
         else:
-            # Safely send an error message if we can
-            if sid:
-                socketio.emit('error', {"message": "Invalid target for Doppelgänger."}, room=sid)
-            # Return the card if the target was invalid
-            player.add_card(card_obj)
-            return # Must return to stop card from being consumed
-    # --- END OF NEW DOPPELGANGER BLOCK ---
-    elif card_obj.effect_type == "harbinger_of_doom":
-        quest_data = {
-            'execute_at_round': game_state.round_number + 3
-        }
-        player.apply_status_effect("harbinger_quest", quest_data)
-        game_state.global_status_effects["harbinger_quest"] = True
-        game_state.public_announcements.append(f"{player.name} has performed a dark ritual, becoming a Harbinger of Doom! In three rounds, they will choose a victim to be sacrificed.")
-        print(f"[QUEST] {player.name} started Harbinger of Doom. Kill will be available in round {quest_data['execute_at_round']}.")
-    # --- START OF NEW RITUAL BLOCK ---
-    elif card_obj.effect_type == "resurrection_ritual_start":
-        # The client sends targets in a custom object: {card.id: {'target': 'DeadName', 'assistants': ['Live1', 'Live2', 'Live3']}}
-        targets = target_list
-        target_name = targets.get('target')
-        assistant_names = targets.get('assistants', [])
-
-        # --- 1. Validate all targets ---
-        target_player = game_state.get_player_by_name(target_name)
-        assistants = [game_state.get_player_by_name(name) for name in assistant_names]
-
-        valid = True
-        error_msg = ""
-
-        if not target_player or target_player.is_alive:
-            valid = False
-            error_msg = "You must select one dead player to resurrect."
-        elif len(assistants) != 3 or any(p is None or not p.is_alive for p in assistants):
-            valid = False
-            error_msg = "You must select three different living players to assist."
-        elif player_id in [p.player_id for p in assistants]:
-            valid = False
-            error_msg = "You cannot select yourself as an assistant."
-        elif target_player.player_id in [p.player_id for p in assistants]:
-            valid = False
-            error_msg = "The dead player cannot be an assistant."
-
-        if not valid:
-            if sid:
-                socketio.emit('error', {"message": error_msg}, room=sid)
-            player.add_card(card_obj) # Return the caster's card
-            # Caster's sacrifice card is returned by the 'handle_submit_evening_cards' logic
-            return
-            
-        # --- 2. All targets are valid, start the ritual ---
-        ritual_id = f"ritual_{uuid.uuid4()}"
-        ritual = {
-            'caster_id': player_id,
-            'caster_name': player.name,
-            'target_id': target_player.player_id,
-            'target_name': target_player.name,
-            'assistants': {}
-        }
-        
-        assistant_names_str = []
-        for p in assistants:
-            ritual['assistants'][p.player_id] = {'name': p.name, 'responded': False, 'sacrificed': False, 'cards': []}
-            assistant_names_str.append(p.name)
+             game_state.public_announcements.append(f"{t1_obj.name} is now divinely protected!")
+        print(f"[CARD] {ctx.player.name} played I Saw the Light on {t1_obj.name}.")
+
+@register_effect("peeping_tom")
+def _effect_peeping_tom(ctx):
+    player, t1_obj = ctx.player, ctx.target
+    if t1_obj:
+        target_hand = [card.to_ref() for card in t1_obj.hand]
+        send_to_player(ctx.player_id, 'show_player_hand', {'player_name': t1_obj.name, 'hand': target_hand})
+
+        game_state.add_delayed_action({
+            'type': 'peeping_tom_reveal',
+            'peeper_name': player.name,
+            'victim_name': t1_obj.name,
+            'execute_at_round': game_state.round_number + 1
+        })
+        print(f"[CARD] {player.name} played Peeping Tom on {t1_obj.name}.")
+
+@register_effect("lazarus")
+def _effect_lazarus(ctx):
+    player, player_id = ctx.player, ctx.player_id
+    game_state.mark_player_alive(player_id)
+    sync_player_rooms(player_id)
+
+    player.apply_status_effect("silence", 1)
+    player.apply_status_effect("delirium", 1)
+    player.apply_status_effect("lazarus_effect", {'expires_at_round': game_state.round_number})
+
+    game_state.public_announcements.append(f"{player.name} was resurrected by the Dark God to participate in voting for one more round, but cannot speak or play any cards.")
+    print(f"[CARD] {player.name} played Lazarus and is temporarily resurrected.")
+
+# --- START OF NEW DOPPELGANGER BLOCK ---
+@register_effect("doppelganger")
+def _effect_doppelganger(ctx):
+    player, t1_obj = ctx.player, ctx.target
+    if t1_obj and t1_obj.is_alive:
+        # This handles the "most recent target" logic by simply overwriting
+        player.apply_status_effect('doppelganger_pending', {
+            'target_id': t1_obj.player_id,
+            'target_name': t1_obj.name
+        })
+        game_state.public_announcements.append(f"{player.name} has cast a dark ritual on {t1_obj.name}...")
+        print(f"[DOPPELGANGER] {player.name} played Doppelgänger, targeting {t1_obj.name}.")
+    else:
+        # Safely send an error message if we can
+        if ctx.sid:
+            socketio.emit('error', {"message": "Invalid target for Doppelgänger."}, room=ctx.sid)
+        # Return the card if the target was invalid
+        player.add_card(ctx.card)
+        return # Must return to stop card from being consumed
+# --- END OF NEW DOPPELGANGER BLOCK ---
+
+@register_effect("harbinger_of_doom")
+def _effect_harbinger_of_doom(ctx):
+    player = ctx.player
+    quest_data = {
+        'execute_at_round': game_state.round_number + 3
+    }
+    player.apply_status_effect("harbinger_quest", quest_data)
+    game_state.global_status_effects["harbinger_quest"] = True
+    game_state.public_announcements.append(f"{player.name} has performed a dark ritual, becoming a Harbinger of Doom! In three rounds, they will choose a victim to be sacrificed.")
+    print(f"[QUEST] {player.name} started Harbinger of Doom. Kill will be available in round {quest_data['execute_at_round']}.")
+
+# --- START OF NEW RITUAL BLOCK ---
+@register_effect("resurrection_ritual_start")
+def _effect_resurrection_ritual_start(ctx):
+    player, player_id, sid = ctx.player, ctx.player_id, ctx.sid
+    # The client sends targets in a custom object: {card.id: {'target': 'DeadName', 'assistants': ['Live1', 'Live2', 'Live3']}}
+    targets = ctx.targets
+    target_name = targets.get('target')
+    assistant_names = targets.get('assistants', [])
+
+    # --- 1. Validate all targets ---
+    target_player = game_state.get_player_by_name(target_name)
+    assistants = [game_state.get_player_by_name(name) for name in assistant_names]
+
+    valid = True
+    error_msg = ""
+
+    if not target_player or target_player.is_alive:
+        valid = False
+        error_msg = "You must select one dead player to resurrect."
+    elif len(assistants) != 3 or any(p is None or not p.is_alive for p in assistants):
+        valid = False
+        error_msg = "You must select three different living players to assist."
+    elif player_id in [p.player_id for p in assistants]:
+        valid = False
+        error_msg = "You cannot select yourself as an assistant."
+    elif target_player.player_id in [p.player_id for p in assistants]:
+        valid = False
+        error_msg = "The dead player cannot be an assistant."
+
+    if not valid:
+        if sid:
+            socketio.emit('error', {"message": error_msg}, room=sid)
+        player.add_card(ctx.card) # Return the caster's card
+        # Caster's sacrifice card is returned by the 'handle_submit_evening_cards' logic
+        return
 
-        game_state.active_rituals[ritual_id] = ritual
-        
-        # --- 3. Send prompts ---
-        game_state.public_announcements.append(f"{player.name} is using black magic to resurrect {target_player.name}! This will require sacrifices from {', '.join(assistant_names_str)}.")
-        print(f"[RITUAL] {player.name} started ritual {ritual_id} to resurrect {target_player.name}.")
-        
-        prompt_data = {
-            'ritual_id': ritual_id,
-            'caster_name': player.name,
-            'target_name': target_player.name
-        }
-        
-        for p_id in ritual['assistants']:
-            assistant_sid = next((s for s, pid in clients.items() if pid == p_id), None)
-            if assistant_sid:
-                socketio.emit('prompt_resurrection_assist', prompt_data, room=assistant_sid)
-                print(f"[RITUAL] Sent assist prompt to {ritual['assistants'][p_id]['name']}.")
-    # --- END OF NEW RITUAL BLOCK ---
+    # --- 2. All targets are valid, start the ritual ---
+    ritual_id = f"ritual_{uuid.uuid4()}"
+    ritual = {
+        'caster_id': player_id,
+        'caster_name': player.name,
+        'target_id': target_player.player_id,
+        'target_name': target_player.name,
+        'assistants': {}
+    }
+
+    assistant_names_str = []
+    for p in assistants:
+        ritual['assistants'][p.player_id] = {'name': p.name, 'responded': False, 'sacrificed': False, 'cards': []}
+        assistant_names_str.append(p.name)
+
+    game_state.active_rituals[ritual_id] = ritual
+
+    # --- 3. Send prompts ---
+    game_state.public_announcements.append(f"{player.name} is using black magic to resurrect {target_player.name}! This will require sacrifices from {', '.join(assistant_names_str)}.")
+    print(f"[RITUAL] {player.name} started ritual {ritual_id} to resurrect {target_player.name}.")
+
+    prompt_data = {
+        'ritual_id': ritual_id,
+        'caster_name': player.name,
+        'target_name': target_player.name
+    }
+
+    for p_id in ritual['assistants']:
+        send_to_player(p_id, 'prompt_resurrection_assist', prompt_data)
+        print(f"[RITUAL] Sent assist prompt to {ritual['assistants'][p_id]['name']}.")
+# --- END OF NEW RITUAL BLOCK ---
 
 
 def resolve_dawn_actions():
     """Resolves pending night actions immediately - called by server before phase transition."""
     print("[DAWN] Processing pending night actions...")
 
-    for action in list(game_state.pending_night_actions):
+    # Only kills resolve before the delayed actions, so look them up by type
+    # instead of walking every pending action.
+    for action in game_state.pending_night_actions.of_type("kill"):
+        if action.get("is_countered", False): continue
         target_player = game_state.get_player(action['target_id'])
         if not target_player: continue
-        if not action.get("is_countered", False):
-            if action["effect_type"] == "kill":
-                if "hand_of_glory_protection" in target_player.status_effects:
-                    # Show your specific message
-                    game_state.public_announcements.append(f"Cultists attempted to kill {target_player.name} last night, but {target_player.name} was saved by the glow of the Hand of Glory!")
-                    # Remove the effect so it's one-time use
-                    target_player.status_effects.pop("hand_of_glory_protection", None)
-                    print(f"[EFFECT] {target_player.name} was saved by Hand of Glory.")
-                    increment_contract_avoid(target_player.player_id)
-                elif "protected" in target_player.status_effects or "divine_protection" in target_player.status_effects:
-                    game_state.public_announcements.append(f"{target_player.name} was protected from death!")
-                else:
-                    game_state.public_announcements.append(f"{target_player.name} was killed last night!");
-                    kill_player(action['target_id'], "Cultists", action['effect_data'].get("killers", []))
+        if "hand_of_glory_protection" in target_player.status_effects:
+            # Show your specific message
+            game_state.public_announcements.append(f"Cultists attempted to kill {target_player.name} last night, but {target_player.name} was saved by the glow of the Hand of Glory!")
+            # Remove the effect so it's one-time use
+            target_player.status_effects.pop("hand_of_glory_protection", None)
+            print(f"[EFFECT] {target_player.name} was saved by Hand of Glory.")
+            increment_contract_avoid(target_player.player_id)
+        elif "protected" in target_player.status_effects or "divine_protection" in target_player.status_effects:
+            game_state.public_announcements.append(f"{target_player.name} was protected from death!")
+        else:
+            game_state.public_announcements.append(f"{target_player.name} was killed last night!");
+            kill_player(action['target_id'], "Cultists", action['effect_data'].get("killers", []))
 
     actions_to_remove = []
     for action in game_state.delayed_actions:
@@ -1857,7 +2851,7 @@ def resolve_dawn_actions():
                 actions_to_remove.append(action)
 
     for action in actions_to_remove:
-        game_state.delayed_actions.remove(action)
+        game_state.remove_delayed_action(action)
 
     for player_id in list(game_state.players.keys()):
         player = game_state.get_player(player_id)
@@ -1883,7 +2877,7 @@ def resolve_dawn_actions():
 
     for player in game_state.players.values(): player.is_asleep = False
     game_state.night_asleep_players.clear()
-    for action in list(game_state.pending_night_actions):
+    for action in game_state.pending_night_actions:
         target_player = game_state.get_player(action['target_id'])
         if not target_player: continue
         if not action.get("is_countered", False):
@@ -1930,6 +2924,8 @@ def kill_player(player_id, source, killers=[]):
             'round': game_state.round_number
         }
         game_state.death_log.append(death_record)
+        export_event('death', player=pl.name, role=pl.role, source=source,
+                     killers=[game_state.players[kid].name for kid in killers if kid in game_state.players])
         # --- END OF FIX ---
         if 'mark_of_the_beast' in pl.status_effects:
             killer_names = [game_state.players[kid].name for kid in killers if kid in game_state.players]
@@ -1988,13 +2984,10 @@ def kill_player(player_id, source, killers=[]):
         for card in cards_to_keep:
             pl.add_card(card)
 
-        pl.is_alive = False
-        if player_id in game_state.alive_players: game_state.alive_players.remove(player_id)
-        
         # --- START OF LAZARUS FIX (PART 1) ---
-        # Only add to dead_players list if they aren't already in it (from Lazarus)
-        if player_id not in game_state.dead_players: 
-            game_state.dead_players.append(player_id)
+        # mark_player_dead only adds to dead_players if they aren't already in it (from Lazarus)
+        game_state.mark_player_dead(player_id)
+        sync_player_rooms(player_id)
 
         # Only deal dead cards if this isn't a Lazarus re-death
         if source != "Lazarus":
@@ -2165,6 +3158,7 @@ def resolve_execution_vote():
                     quest_data = voter_player.status_effects['violent_delights_quest']
                     if not quest_data.get('completed'):
                         quest_data['completed'] = True
+                        voter_player.mark_changed('status_effects')
                         print(f"[QUEST] {voter_player.name} completed Violent Delights via execution vote.")
 
             game_state.public_announcements.append(f"By popular vote, {executed_name} has been executed!")
@@ -2205,61 +3199,193 @@ def resolve_execution_vote():
     # --- END of Vote Totals Edit ---
 
 def game_loop():
-    """Background loop for timers & auto transitions."""
+    """Background timer: queues a game_tick every half second."""
+    global game_tick_pending
     while True:
         socketio.sleep(0.5)
-        if not game_state or not game_state.game_setup_completed: continue
-
-        if game_state.current_phase == "Dusk":
-            for player_id in list(game_state.alive_players):
-                player = game_state.get_player(player_id)
-                if player and 'lazarus_effect' in player.status_effects:
-                    quest_data = player.status_effects['lazarus_effect']
-                    if game_state.round_number >= quest_data['expires_at_round']:
-                        game_state.public_announcements.append(f"{player.name} returned to the grave following the vote.")
-                        kill_player(player_id, "Lazarus")
-                        player.status_effects.pop('lazarus_effect', None)
-                        broadcast_game_state()
-
-
-        now = time.time(); phase = game_state.current_phase; sub_phase = game_state.voting_sub_phase; start_time = game_state.last_phase_start_time
-        # REMOVED: The automatic advancement from Evening phase based on a timer.
-        if (phase == "Voting" and sub_phase == "Nomination" and now - start_time >= VOTING_NOMINATION_TIMER_SECONDS):
-            process_nominations()
-        elif (phase == "Voting" and sub_phase == "Speaking" and game_state.current_speaker_index != -1 and now - start_time >= VOTING_SPEAKER_TIMER_SECONDS):
-            game_state.current_speaker_index += 1
-            start_next_speaker_turn()
-        elif (phase == "ApocalypseVote" and now - start_time >= VOTING_EXECUTION_TIMER_SECONDS):
-            print("[TIMER] Apocalypse vote is up.")
-            # resolve_apocalypse_vote() already advances the phase,
-            # so we just need to call it and broadcast.
-            resolve_apocalypse_vote()
-            broadcast_game_state()
-        elif (phase == "Voting" and sub_phase == "Execution" and now - start_time >= VOTING_EXECUTION_TIMER_SECONDS):
-            print("[TIMER] Execution vote is up.")
-            resolve_execution_vote()
-            game_state.advance_phase()
-            broadcast_game_state()
+        if not game_tick_pending: # Don't pile ticks up behind a busy queue
+            game_tick_pending = True
+            enqueue_command(game_tick)
+
+def game_tick():
+    """Timers & auto transitions, run on the command worker."""
+    global game_tick_pending
+    game_tick_pending = False
+    send_spectator_feed() # Flush any update the rate limit held back
+    evict_stale_game()
+    if bot_seats:
+        schedule_bot_turns() # Also catches decisions that ran past their budget
+    if not game_state or not game_state.game_setup_completed: return
+    seat_bots_for_absent_players()
+
+    if game_state.current_phase == "Dusk":
+        for player_id in list(game_state.alive_players):
+            player = game_state.get_player(player_id)
+            if player and 'lazarus_effect' in player.status_effects:
+                quest_data = player.status_effects['lazarus_effect']
+                if game_state.round_number >= quest_data['expires_at_round']:
+                    game_state.public_announcements.append(f"{player.name} returned to the grave following the vote.")
+                    kill_player(player_id, "Lazarus")
+                    player.status_effects.pop('lazarus_effect', None)
+                    broadcast_game_state()
+
+
+    now = time.time(); phase = game_state.current_phase; sub_phase = game_state.voting_sub_phase; start_time = game_state.last_phase_start_time
+    start_time -= (now - start_time) * (game_speed() - 1) # Timers run game_speed() times faster
+    # REMOVED: The automatic advancement from Evening phase based on a timer.
+    if (phase == "Voting" and sub_phase == "Nomination" and now - start_time >= VOTING_NOMINATION_TIMER_SECONDS):
+        process_nominations()
+    elif (phase == "Voting" and sub_phase == "Speaking" and game_state.current_speaker_index != -1 and now - start_time >= VOTING_SPEAKER_TIMER_SECONDS):
+        game_state.current_speaker_index += 1
+        start_next_speaker_turn()
+    elif (phase == "ApocalypseVote" and now - start_time >= VOTING_EXECUTION_TIMER_SECONDS):
+        print("[TIMER] Apocalypse vote is up.")
+        # resolve_apocalypse_vote() already advances the phase,
+        # so we just need to call it and broadcast.
+        resolve_apocalypse_vote()
+        broadcast_game_state()
+    elif (phase == "Voting" and sub_phase == "Execution" and now - start_time >= VOTING_EXECUTION_TIMER_SECONDS):
+        print("[TIMER] Execution vote is up.")
+        resolve_execution_vote()
+        game_state.advance_phase()
+        broadcast_game_state()
+
+# --- Static Assets ---
+# build_assets.py splits the client into content-hashed, precompressed files under
+# static/dist. They are loaded into memory once and served with strong ETags, one
+# per encoding; the hashed CSS/JS never change under the same name, so browsers may
+# cache them forever.
+ASSET_DIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dist')
+ASSET_ENCODINGS = (("br", ".br"), ("gzip", ".gz")) # Preferred first
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+static_assets = {}          # Maps file name -> {"etag", "mimetype", "identity", "gzip", "br"}
+rendered_index_html = None  # The rendered template, when there is no build to serve
+
+def load_static_assets():
+    """Loads the build_assets.py output into memory, if there is one."""
+    manifest_path = os.path.join(ASSET_DIST_DIR, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        print("[ASSETS] No asset build found; serving templates/index.html directly. Run build_assets.py to enable it.")
+        return
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    for name in (manifest['css'], manifest['js'], manifest['html']):
+        with open(os.path.join(ASSET_DIST_DIR, name), 'rb') as f:
+            data = f.read()
+        entry = {"etag": hashlib.sha256(data).hexdigest()[:16], "mimetype": mimetypes.guess_type(name)[0], "identity": data}
+        for encoding, suffix in ASSET_ENCODINGS:
+            path = os.path.join(ASSET_DIST_DIR, name + suffix)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    entry[encoding] = f.read()
+        static_assets[name] = entry
+    print(f"[ASSETS] Serving built assets: {', '.join(static_assets)}")
+
+def asset_response(entry, cache_control):
+    """
+    Serves a loaded asset, picking a precompressed copy and answering conditional
+    requests with 304. Each encoding is a different representation, so each gets its
+    own strong ETag: the content hash, suffixed with the encoding unless identity.
+    """
+    encoding = next((e for e, _ in ASSET_ENCODINGS if e in entry and request.accept_encodings[e]), "identity")
+    etag = entry["etag"] if encoding == "identity" else f"{entry['etag']}-{encoding}"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(entry[encoding], mimetype=entry["mimetype"])
+        if encoding != "identity":
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 @app.route('/')
 def index():
     """Serve the main client page."""
-    return render_template('index.html')
+    global rendered_index_html
+    shell = static_assets.get('index.html')
+    if shell:
+        # Always revalidate the shell (it names the current asset versions); unchanged ones get a 304.
+        return asset_response(shell, "no-cache")
+    if rendered_index_html is None:
+        rendered_index_html = render_template('index.html')
+    return rendered_index_html
+
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    entry = static_assets.get(filename)
+    if entry is None or filename == 'index.html':
+        abort(404)
+    return asset_response(entry, IMMUTABLE_CACHE_CONTROL)
+
+# --- Player Statistics ---
+# Served from the archive's statistics tables. A response is rebuilt only once the archive
+# has committed another batch of games (game_archive.version), so repeated lobby loads
+# cost a dictionary lookup.
+stats_cache = OrderedDict() # Maps request key -> (archive version, JSON body, etag), oldest first
+
+def stats_response(key, build):
+    """Serves build()'s result as JSON, from stats_cache while the archive has not changed."""
+    version = game_archive.version
+    cached = stats_cache.get(key)
+    if cached is None or cached[0] != version:
+        body = json.dumps(build())
+        cached = (version, body, hashlib.sha256(body.encode('utf-8')).hexdigest()[:16])
+        stats_cache[key] = cached
+        while len(stats_cache) > STATS_CACHE_SIZE:
+            stats_cache.popitem(last=False)
+    _, body, etag = cached
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = STATS_CACHE_CONTROL
+    return response
+
+@app.route('/api/leaderboard')
+def leaderboard():
+    return stats_response(('leaderboard',), lambda: {"players": game_archive.read_leaderboard(LEADERBOARD_SIZE)})
+
+@app.route('/api/players/<path:player_name>/stats')
+def player_stats(player_name):
+    return stats_response(('player', player_name), lambda: {"stats": game_archive.read_player_stats(player_name)})
+
+# --- Card Effect Timings ---
+# dispatch_card_effect() times every card effect for the life of the process. The totals are
+# only read on demand, here, slowest first.
+@app.route('/api/effect-timings')
+def effect_timings():
+    effects = [{
+        "effect_type": effect_type,
+        "calls": stats['calls'],
+        "avg_ms": round(stats['total_seconds'] / stats['calls'] * 1000, 3),
+        "max_ms": round(stats['max_seconds'] * 1000, 3),
+    } for effect_type, stats in sorted(list(EFFECT_TIMINGS.items()), key=lambda item: item[1]['total_seconds'], reverse=True)]
+    response = Response(json.dumps({"since": server_started_at, "effects": effects}), mimetype='application/json')
+    response.headers['Cache-Control'] = "no-store"
+    return response
 
 def heartbeat_checker():
     """Periodically checks if clients are still connected."""
     while True:
         socketio.sleep(30)  # Check every 30 seconds
-        
-        for sid, pid in list(clients.items()):
-            try:
-                socketio.emit('ping', room=sid)
-            except:
-                # Client is truly disconnected
-                print(f"[HEARTBEAT] Lost connection to {sid}")
-                # Don't remove player from game_state, just from clients
-                clients.pop(sid, None)
-                broadcast_game_state()
+        enqueue_command(ping_clients)
+
+def ping_clients():
+    """Pings every client, dropping the ones that can no longer be reached. Runs on the command worker."""
+    report_dropped_events()
+    for sid, pid in list(clients.items()):
+        try:
+            socketio.emit('ping', room=sid)
+        except:
+            # Client is truly disconnected
+            print(f"[HEARTBEAT] Lost connection to {sid}")
+            # Don't remove player from game_state, just from clients
+            clients.pop(sid, None)
+            clear_sid_rooms(sid)
+            broadcast_game_state()
 
 @socketio.on('pong')
 def handle_pong():
@@ -2268,8 +3394,24 @@ def handle_pong():
 
 if __name__ == '__main__':
     reset_game()
+    load_evicted_games()
+    load_static_assets()
+    unhandled_effects = missing_effect_handlers()
+    if unhandled_effects:
+        print(f"[STARTUP] Card effects with no registered handler: {', '.join(unhandled_effects)}")
+    game_archive.start()
+    if event_exporter is not None:
+        event_exporter.start()
+    socketio.start_background_task(command_worker)
     socketio.start_background_task(game_loop)
     socketio.start_background_task(heartbeat_checker)  # ADD THIS LINE
     port = int(os.environ.get('PORT', 5000))
-    print(f"Starting Flask-SocketIO server on port {port}")
-    socketio.run(app, host='0.0.0.0', port=port, debug=False, allow_unsafe_werkzeug=True)
+    print(f"Starting Flask-SocketIO server on port {port} (async mode: {ASYNC_MODE})")
+    if ASYNC_MODE == "threading":
+        socketio.run(app, host='0.0.0.0', port=port, debug=False, allow_unsafe_werkzeug=True)
+    elif ASYNC_MODE == "eventlet":
+        # eventlet's WSGI server caps concurrent connections at 1024 by default.
+        max_connections = int(os.environ.get('MAX_CONNECTIONS', 10000))
+        socketio.run(app, host='0.0.0.0', port=port, debug=False, max_size=max_connections)
+    else:
+        socketio.run(app, host='0.0.0.0', port=port, debug=False)